@@ -0,0 +1,104 @@
+"""
+Dynamic micro-batching for query embeddings.
+Concurrent `embed()` calls are queued for up to `max_wait_ms`, run through the
+model as one padded batch, and each caller gets its own vector back.
+Texts queued with different keys (e.g. the embedder of the index being searched)
+are dispatched as separate batches; `embed_batch(texts, key)` runs each one.
+"""
+
+import asyncio
+import time
+from metrics import Histogram
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+QUEUE_WAIT_MS_BUCKETS = [0.5, 1, 2, 5, 10, 20, 50, 100, 250]
+
+
+class EmbeddingBatcher:
+    def __init__(self, embed_batch, executor, max_batch_size=16, max_wait_ms=5.0, max_inflight=1):
+        self.embed_batch = embed_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._queue = None
+        self._task = None
+        # The event loop only keeps weak references to tasks, so in-flight batches are held here.
+        self._tasks = set()
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        """Stops collecting new batches and waits for the ones already running, so their callers get a vector."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def embed(self, text, key=None):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, key, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+            for key, group in groups.items():
+                await self._inflight.acquire()
+                task = asyncio.create_task(self._dispatch(group, key))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch, key):
+        try:
+            started = time.perf_counter()
+            for _, _, _, enqueued in batch:
+                self.queue_wait_ms.observe((started - enqueued) * 1000)
+            self.batch_sizes.observe(len(batch))
+
+            texts = [text for text, _, _, _ in batch]
+            try:
+                vectors = await asyncio.get_running_loop().run_in_executor(self.executor, self.embed_batch, texts, key)
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, _, future, _), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        finally:
+            self._inflight.release()
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
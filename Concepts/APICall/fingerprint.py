@@ -0,0 +1,50 @@
+"""
+Stable fingerprints for `stackoverfix.extract_stack_trace` output.
+Two traces of the same error share a fingerprint even when the numbers,
+file paths, memory addresses, quoted names or auto-numbered identifiers
+(Keras's `dense_12`, `conv2d_3`) in the message differ.
+"""
+
+import hashlib
+import json
+import re
+
+_MASKS = [
+    (re.compile(r"0x[0-9a-fA-F]+"), "<addr>"),
+    (re.compile(r"(?:[A-Za-z]:)?(?:[\\/][\w.\-<>]+){2,}"), "<path>"),
+    (re.compile(r"'[^']*'|\"[^\"]*\""), "<name>"),
+    (re.compile(r"\b([A-Za-z]\w*?)_\d+\b"), r"\1_<num>"),
+    (re.compile(r"\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b"), "<num>"),
+]
+
+
+def normalize_message(message):
+    """Masks addresses, paths, quoted identifiers, identifier number suffixes and numbers in an exception message."""
+    message = message or ""
+    for pattern, mask in _MASKS:
+        message = pattern.sub(mask, message)
+    return re.sub(r"\s+", " ", message).strip()
+
+
+def _frame_signature(frame):
+    if not frame:
+        return None
+    return [frame.get("function"), re.sub(r"\s+", " ", frame.get("code") or "").strip()]
+
+
+def fingerprint_stack_trace(stack_trace):
+    """Hashes exception type, normalized message and the function/code of the user and site-package frames."""
+    signature = [
+        stack_trace.get("exception"),
+        normalize_message(stack_trace.get("message")),
+        [_frame_signature(frame) for frame in stack_trace.get("filtered_trace") or []],
+        _frame_signature(stack_trace.get("first_site_package_error")),
+    ]
+    return hashlib.sha256(json.dumps(signature).encode("utf-8")).hexdigest()
+
+
+def answer_key(stack_trace, code_snippet, user_prompt):
+    """The final answer also depends on the user's code and prompt, so they are part of its cache key."""
+    normalized = [re.sub(r"\s+", " ", text or "").strip() for text in (code_snippet, user_prompt)]
+    raw = json.dumps([fingerprint_stack_trace(stack_trace)] + normalized)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
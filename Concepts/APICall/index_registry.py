@@ -0,0 +1,107 @@
+"""
+Process-wide registry of per-library FAISS indexes and metadata.
+Each library is loaded from disk once and kept resident; when the total
+resident size exceeds the memory budget, the least recently used library
+is evicted. Entries are tied to a version of the files on disk, and a
+library is reloaded as soon as it is asked for with a different version.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class IndexRegistry:
+    """Library-keyed LRU cache of (index, metadata) pairs with hit/miss/load-time counters."""
+
+    def __init__(self, loader, max_bytes=None, sizeof=None):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda library, entry: 0)
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+        self.load_seconds = {}
+
+    def _cached(self, library, version):
+        if library in self._entries and self._versions[library] == version:
+            self._entries.move_to_end(library)
+            return self._entries[library]
+        return None
+
+    def get(self, library, version=None):
+        """Returns the cached (index, metadata) for `library`, loading it on first use or when `version` changed."""
+        with self._lock:
+            entry = self._cached(library, version)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            load_lock = self._load_locks.setdefault(library, threading.Lock())
+
+        # Only one thread loads a given library; the others wait and reuse its result.
+        with load_lock:
+            with self._lock:
+                entry = self._cached(library, version)
+                if entry is not None:
+                    return entry
+
+            start = time.perf_counter()
+            entry = self.loader(library)
+            elapsed = time.perf_counter() - start
+            size = self.sizeof(library, entry)
+
+            with self._lock:
+                if library in self._entries:
+                    self.reloads += 1
+                self._entries[library] = entry
+                self._entries.move_to_end(library)
+                self._sizes[library] = size
+                self._versions[library] = version
+                self.load_seconds[library] = elapsed
+                self._evict(keep=library)
+            print(f"📦 Loaded index for {library} in {elapsed:.2f}s ({size / 1e6:.1f} MB)")
+            return entry
+
+    def evict(self, library):
+        with self._lock:
+            self._entries.pop(library, None)
+            self._sizes.pop(library, None)
+            self._versions.pop(library, None)
+
+    def resident_bytes(self):
+        return sum(self._sizes.values())
+
+    def _evict(self, keep):
+        if self.max_bytes is None:
+            return
+        while self.resident_bytes() > self.max_bytes and len(self._entries) > 1:
+            library = next(iter(self._entries))
+            if library == keep:
+                break
+            self._entries.pop(library)
+            self._sizes.pop(library)
+            self._versions.pop(library)
+            self.evictions += 1
+            print(f"♻️ Evicted index for {library} from the registry")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "resident": list(self._entries.keys()),
+                "resident_bytes": self.resident_bytes(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+                "load_seconds": dict(self.load_seconds),
+            }
@@ -1,26 +1,58 @@
+import time
+
+PROCESS_START = time.perf_counter()
+
 import asyncio
-from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 import os
+import sys
 import json
-import faiss
+import re
+import math
 import numpy as np
-import torch
-import requests
+import httpx
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from bisect import bisect_right
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from transformers import AutoTokenizer, AutoModel
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from google import genai
-from google.genai import types
+from index_registry import IndexRegistry
+from embedding_batcher import EmbeddingBatcher
+from query_cache import QueryCache
+from session_store import create_session_store
+from rerankers import create_reranker
+from cache import TTLCache
+from fingerprint import answer_key, fingerprint_stack_trace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DocRetrieval", "scripts"))
+from metadata_store import load_metadata
+from bm25_index import BM25_DIRNAME, BM25Index, reciprocal_rank_fusion
+from embedder import MANIFEST_KEYS, Embedder, check_manifest, read_manifest
+from rescore import RESCORE_FILENAME, rescore
 
 load_dotenv()
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = "0"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    asyncio.create_task(load_models())
+    global http_client, startup_task
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(RERANK_TIMEOUT),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+    )
+    embedding_batcher.start()
+    startup_task = asyncio.create_task(load_models())
+    startup_task.add_done_callback(check_startup)
     yield
+    startup_task.cancel()
+    await asyncio.gather(startup_task, return_exceptions=True)
+    await embedding_batcher.stop()
+    await http_client.aclose()
+    query_cache.close()
+    session_store.close()
+    embed_executor.shutdown(wait=False)
     print("🛑 Shutting down")
 
 app = FastAPI(lifespan=lifespan)
@@ -38,12 +70,62 @@ app.add_middleware(
 def root():
     return {"message": "✅ Backend is working"}
 
-tokenizer = None
-embed_model = None
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once models are loaded and warmed up, 503 before that or on failure."""
+    body = {
+        "ready": models_ready.is_set(),
+        "phase": startup_state["phase"],
+        "error": startup_state["error"],
+        "unavailable": {name: error for name, (_, error) in unavailable_indexes.items()},
+        "timings": startup_timings,
+    }
+    return JSONResponse(body, status_code=200 if models_ready.is_set() else 503)
+
+
+async def require_ready():
+    """Holds requests until startup finishes, rejecting them after READY_TIMEOUT seconds."""
+    if models_ready.is_set():
+        return
+    if startup_state["error"] is None and READY_TIMEOUT > 0:
+        try:
+            await asyncio.wait_for(models_ready.wait(), READY_TIMEOUT)
+            return
+        except asyncio.TimeoutError:
+            pass
+    detail = startup_state["error"] or f"Models are still loading ({startup_state['phase']})."
+    raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "startup": startup_timings,
+        "index_registry": index_registry.stats(),
+        "embedding_batcher": embedding_batcher.stats(),
+        "query_cache": query_cache.stats(),
+        "session_store": session_store.stats(),
+        "reranker": reranker.stats(),
+        "classification_cache": classification_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+    }
+
 client = None
+http_client = None
+startup_task = None
+
+models_ready = asyncio.Event()
+startup_state = {"phase": "starting", "error": None}
+startup_timings = {}
 
 EMBED_MODEL = "nomic-ai/nomic-embed-text-v1"
 RERANK_MODEL = "nvidia/nv-rerankqa-mistral-4b-v3"
+# Default embedder, loaded at startup and used for indexes built before manifests existed.
+# Every other index is queried with the embedder its manifest.json describes; see DocRetrieval/scripts/embedder.py
+embedder = Embedder(EMBED_MODEL, pooling=os.getenv("EMBED_POOLING", "mean"), normalize=True)
+# Embedder id → Embedder, so indexes with the same manifest settings share one instance (and one batch queue).
+embedders = {embedder.id: embedder}
 LIB_PATH = {
     "Python": "py",
     "Numpy": "np",
@@ -52,30 +134,454 @@ LIB_PATH = {
     "Scikit-Learn": "sklearn",
     "TensorFlow Keras": "tfkeras"
 }
+DATA_DIR = "../DocRetrieval/data_2"
+# Serve every library from the single DATA_DIR/unified index built by DocRetrieval/scripts/unified_index.py
+UNIFIED_INDEX = os.getenv("UNIFIED_INDEX", "0") == "1"
+UNIFIED = "Unified"
+# Fuse BM25 hits with the vector hits (reciprocal-rank fusion) when an index has a bm25/ directory
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+RRF_K = int(os.getenv("RRF_K", "60"))
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "25"))
+INDEX_CACHE_MB = os.getenv("INDEX_CACHE_MB")
+GEMINI_MODEL = "gemini-2.0-flash-lite"
+RERANK_URL = os.getenv("RERANK_URL", f"https://ai.api.nvidia.com/v1/retrieval/{RERANK_MODEL}/reranking")
+RERANK_BUDGET_MS = os.getenv("RERANK_BUDGET_MS")
+RERANK_TIMEOUT = float(os.getenv("RERANK_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "30"))
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+# torch releases the GIL inside its kernels, so a small thread pool runs embeddings
+# in parallel with the event loop without copying the model into other processes.
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "2"))
+embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+
+SESSION_MAX_MB = os.getenv("SESSION_MAX_MB")
+session_store = create_session_store(
+    backend=os.getenv("SESSION_BACKEND", "memory"),
+    path=os.getenv("SESSION_DB_PATH"),
+    ttl=float(os.getenv("SESSION_TTL", "3600")),
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "10000")),
+    max_bytes=int(float(SESSION_MAX_MB) * 1024 * 1024) if SESSION_MAX_MB else None,
+)
+
+@contextmanager
+def startup_phase(name):
+    startup_state["phase"] = name
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        startup_state["error"] = startup_state["error"] or f"Startup failed during {name}: {e}"
+        raise
+    startup_timings[name] = round(time.perf_counter() - start, 3)
+
+
+def load_embedder():
+    with startup_phase("import_torch"):
+        import torch  # noqa: F401
+        import transformers  # noqa: F401
+    with startup_phase("load_embedder"):
+        embedder.load()
+
+
+def load_gemini_client():
+    global client
+    with startup_phase("load_gemini_client"):
+        from google import genai
+        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+def warmup():
+    """
+    Runs dummy embeddings and a search on every index so the first request pays no lazy-init cost.
+    An index that fails to load is left out of available_libraries() instead of failing startup.
+    """
+    with startup_phase("warmup_embeddings"):
+        vectors = {embedder: generate_embeddings(["warmup"] * 4)}
+    with startup_phase("warmup_indexes"):
+        for name in dict.fromkeys(index_name(library) for library in LIB_PATH):
+            if not os.path.exists(os.path.join(index_dir(name), "faiss_index.bin")):
+                continue
+            try:
+                index, metadata = load_faiss_index(name)
+            except Exception:
+                continue
+            # Also loads the model of an index built with a different embedder than the default one.
+            index_embedder = index_embedders[name]
+            if index_embedder not in vectors:
+                vectors[index_embedder] = generate_embeddings(["warmup"] * 4, index_embedder)
+            D, I = index.search(vectors[index_embedder][0].reshape(1, -1), 1)
+            if len(I[0]) and I[0][0] >= 0:
+                metadata[I[0][0]]
+
+
+def check_startup(task):
+    """Done callback of the startup task: records an error that escaped load_models() so /ready reports it."""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        startup_state["error"] = startup_state["error"] or f"Startup failed: {error!r}"
+        print(f"❌ {startup_state['error']}")
 
-session_store = {}
 
 async def load_models():
-    global tokenizer, embed_model, client
-    tokenizer = AutoTokenizer.from_pretrained(EMBED_MODEL, trust_remote_code=True)
-    embed_model = AutoModel.from_pretrained(EMBED_MODEL, trust_remote_code=True)
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    """Loads the embedder and Gemini client off the event loop, warms up, then opens the readiness gate."""
+    try:
+        await asyncio.gather(asyncio.to_thread(load_embedder), asyncio.to_thread(load_gemini_client))
+        if WARMUP:
+            await asyncio.to_thread(warmup)
+    except Exception as e:
+        startup_state["error"] = startup_state["error"] or f"Startup failed: {e}"
+        print(f"❌ {startup_state['error']}")
+        return
+
+    startup_timings["total"] = round(time.perf_counter() - PROCESS_START, 3)
+    startup_state["phase"] = "ready"
+    models_ready.set()
     print("✅ Models and Gemini client loaded.")
+    print("⏱️ Startup timings: " + ", ".join(f"{phase}={seconds}s" for phase, seconds in startup_timings.items()))
+
+
+def index_dir(name):
+    return os.path.join(DATA_DIR, "unified" if name == UNIFIED else LIB_PATH[name])
+
+
+def index_name(library):
+    """Registry entry that holds `library`: the unified index, or the library's own one."""
+    return UNIFIED if UNIFIED_INDEX else library
+
 
+# Library → [start, end) id range in the unified index, refreshed whenever that index is (re)loaded.
+library_ranges = {}
+# Index name → (memory-mapped float32 vectors, over-fetch factor, metric) for quantized indexes.
+rescoring = {}
+# Index name → (index_version, error) of indexes that failed to load; retried once the index is rebuilt.
+unavailable_indexes = {}
+# Index name → the Embedder its queries are embedded with, refreshed whenever the index is (re)loaded.
+index_embedders = {}
 
-def load_faiss_index(library):
-    base_path = os.path.join("../DocRetrieval/data_2", LIB_PATH[library])
+
+def is_unavailable(name):
+    failed = unavailable_indexes.get(name)
+    return failed is not None and failed[0] == index_version(name)
+
+
+def available_libraries():
+    if UNIFIED_INDEX:
+        if not os.path.exists(os.path.join(index_dir(UNIFIED), "faiss_index.bin")) or is_unavailable(UNIFIED):
+            return []
+        if not library_ranges:
+            try:
+                load_faiss_index(UNIFIED)
+            except Exception:
+                return []
+        return list(library_ranges)
+    return [library for library in LIB_PATH
+            if os.path.exists(os.path.join(index_dir(library), "faiss_index.bin")) and not is_unavailable(library)]
+
+
+def library_of(i):
+    """Library owning a unified index id; ranges are contiguous and in build order."""
+    libraries = list(library_ranges)
+    starts = [library_ranges[library][0] for library in libraries]
+    return libraries[bisect_right(starts, i) - 1]
+
+
+def read_faiss_index(name):
+    import faiss
+    base_path = index_dir(name)
     index = faiss.read_index(os.path.join(base_path, "faiss_index.bin"))
-    metadata = np.load(os.path.join(base_path, "faiss_metadata.npy"), allow_pickle=True)
-    return index, metadata
+    manifest = read_manifest(base_path)
+    if manifest is None:
+        print(f"⚠️ {name} index has no manifest.json; cannot verify it was embedded with {embedder.id}")
+        index_embedder = embedder
+    else:
+        index_embedder = manifest_embedder(manifest)
+        # Refuse indexes from another embedder version, or whose manifest is incomplete or disagrees with the index.
+        check_manifest(manifest, index_embedder, index.d)
+    config_path = os.path.join(base_path, "index_config.json")
+    index_config = {}
+    if os.path.exists(config_path):
+        # Search-time params chosen at build time (DocRetrieval/scripts/index_builder.py)
+        with open(config_path) as f:
+            index_config = json.load(f)
+        space = faiss.ParameterSpace()
+        for param in ("nprobe", "efSearch"):
+            if index_config.get(param) is not None:
+                space.set_index_parameter(index, param, index_config[param])
+    rescore_path = os.path.join(base_path, RESCORE_FILENAME)
+    if index_config.get("rescore") and os.path.exists(rescore_path):
+        # Quantized index (DocRetrieval/scripts/quantize_index.py): float32 vectors stay on disk for re-scoring
+        rescoring[name] = (np.load(rescore_path, mmap_mode="r"), index_config["rescore"], index_config["metric"])
+    else:
+        rescoring.pop(name, None)
+    if name == UNIFIED:
+        with open(os.path.join(base_path, "library_ranges.json")) as f:
+            ranges = json.load(f)
+        library_ranges.clear()
+        library_ranges.update({library: tuple(bounds) for library, bounds in ranges.items()})
+    index_embedders[name] = index_embedder
+    return index, load_metadata(base_path)
+
+
+def manifest_embedder(manifest):
+    """The embedder an index was built with, shared by every index with the same settings; the default one for an incomplete manifest."""
+    if any(key not in manifest for key in MANIFEST_KEYS):
+        return embedder
+    built_with = Embedder.from_manifest(manifest)
+    return embedders.setdefault(built_with.id, built_with)
+
+
+def index_footprint(name, entry):
+    """Resident bytes of a loaded index; a memory-mapped metadata store is paged in by the OS."""
+    base_path = index_dir(name)
+    size = os.path.getsize(os.path.join(base_path, "faiss_index.bin"))
+    if isinstance(entry[1], np.ndarray):
+        size += os.path.getsize(os.path.join(base_path, "faiss_metadata.npy"))
+    return size
+
+
+index_registry = IndexRegistry(
+    read_faiss_index,
+    max_bytes=int(INDEX_CACHE_MB) * 1024 * 1024 if INDEX_CACHE_MB else None,
+    sizeof=index_footprint,
+)
+
 
+def load_faiss_index(name):
+    """
+    The resident (index, metadata) of `name`, reloaded once the index is rebuilt, like its BM25 side and query cache entries.
+    A failure (e.g. a manifest mismatch) marks the index unavailable until it is rebuilt.
+    """
+    version = index_version(name)
+    try:
+        entry = index_registry.get(name, version)
+    except Exception as e:
+        unavailable_indexes[name] = (version, str(e))
+        print(f"❌ {name} index unavailable: {e}")
+        raise
+    unavailable_indexes.pop(name, None)
+    return entry
+
+
+def generate_embeddings(texts, index_embedder=None):
+    """Embeds a batch of texts in one padded forward pass with `index_embedder` (default: the startup one), exactly as its indexes were built."""
+    return list((index_embedder or embedder).embed(texts))
+
+
+embedding_batcher = EmbeddingBatcher(
+    generate_embeddings,
+    embed_executor,
+    max_batch_size=int(os.getenv("EMBED_MAX_BATCH", "16")),
+    max_wait_ms=float(os.getenv("EMBED_MAX_WAIT_MS", "5")),
+    max_inflight=EMBED_WORKERS,
+)
 
-def generate_embedding(text):
-    inputs = tokenizer(text, return_tensors="pt", add_special_tokens=True, truncation=True, max_length=512)
-    with torch.no_grad():
-        outputs = embed_model(**inputs)
-        embeddings = outputs.last_hidden_state.mean(dim=1)
-    return embeddings[0].numpy().astype('float32')
+
+query_cache = QueryCache(
+    max_entries=int(os.getenv("QUERY_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "86400")),
+    path=os.getenv("QUERY_CACHE_PATH"),
+)
+
+
+async def embed_async(text, index_embedder=None):
+    """Queues the text on the micro-batcher, which runs `index_embedder`'s model on the embedding pool."""
+    return await embedding_batcher.embed(text, index_embedder)
+
+
+def index_version(name):
+    """Changes whenever the index file is rebuilt."""
+    return str(os.stat(os.path.join(index_dir(name), "faiss_index.bin")).st_mtime_ns)
+
+
+def search_scope(library, stack_trace, available=None):
+    """
+    Libraries a search covers. With the unified index this adds the libraries the stack trace
+    points at, so a pandas error raised inside numpy also searches the NumPy docs.
+    Pass `available` when it is already known; computing it touches the disk.
+    Empty when no library has a usable index, in which case the answer goes without documents.
+    """
+    available = available if available is not None else available_libraries()
+    if not UNIFIED_INDEX:
+        return (library,) if library in available else ()
+    scope = tuple(sorted({library, *infer_libraries(stack_trace)} & set(available)))
+    return scope or tuple(sorted(available))
+
+
+def scope_ranges(libraries):
+    """Unified index id ranges of `libraries`, or None when the search covers the whole index."""
+    if not UNIFIED_INDEX or set(libraries) >= set(library_ranges):
+        return None
+    return [library_ranges[library] for library in libraries]
+
+
+def accepts_search_params(index):
+    """Whether `index.search` takes an IDSelector; PQ, fast-scan and LSH indexes reject SearchParameters."""
+    import faiss
+    return (faiss.try_extract_index_ivf(index) is not None or hasattr(index, "hnsw")
+            or isinstance(index, (faiss.IndexFlat, faiss.IndexScalarQuantizer)))
+
+
+def in_ranges(ids, ranges):
+    keep = np.zeros(ids.shape, dtype=bool)
+    for start, end in ranges:
+        keep |= (ids >= start) & (ids < end)
+    return keep
+
+
+def library_search_params(index, ranges):
+    """SearchParameters restricting a unified index search to the id `ranges` of scope_ranges()."""
+    import faiss
+    selector = None
+    for bounds in ranges:
+        current = faiss.IDSelectorRange(*bounds)
+        if selector is not None:
+            previous, current = current, faiss.IDSelectorOr(selector, current)
+            # The C++ selector keeps raw pointers, so the Python objects must outlive it.
+            current.referenced_objects = [selector, previous]
+        selector = current
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def search_index(libraries, query_embedding, k, entry=None):
+    """Top-k (ids, scores) within `libraries`; `entry` is the request's (index, metadata), loaded here when not given."""
+    name = index_name(libraries[0])
+    index, _ = entry or load_faiss_index(name)
+    ranges = scope_ranges(libraries)
+    query = query_embedding.reshape(1, -1)
+    fetch = k * rescoring[name][1] if name in rescoring else k
+    params = None
+    if ranges is not None and accepts_search_params(index):
+        params = library_search_params(index, ranges)
+    elif ranges is not None:
+        # No selector support: over-fetch in proportion to the scope's share of the index, then filter.
+        scope_size = sum(end - start for start, end in ranges)
+        fetch = min(index.ntotal, math.ceil(fetch * index.ntotal / max(scope_size, 1)))
+    D, I = index.search(query, fetch, params=params)
+    if ranges is not None and params is None:
+        keep = in_ranges(I[0], ranges)
+        D, I = D[:, keep], I[:, keep]
+    if name in rescoring:
+        vectors, _, metric = rescoring[name]
+        D, I = rescore(query, I, vectors, metric, k)
+    return I[0][:k], D[0][:k]
+
+
+def candidate_rows(libraries, ids, scores, entry=None):
+    _, metadata = entry or load_faiss_index(index_name(libraries[0]))
+    if UNIFIED_INDEX:
+        return [{"score": float(score), "library": library_of(i), **metadata[i]} for i, score in zip(ids, scores)]
+    return [{"score": float(score), **metadata[i]} for i, score in zip(ids, scores)]
+
+
+def candidate_vectors(libraries, ids):
+    """Stored vectors of the candidates, or None when the index cannot reconstruct them."""
+    index, _ = load_faiss_index(index_name(libraries[0]))
+    try:
+        return index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+    except RuntimeError:
+        return None
+
+
+bm25_indexes = {}
+
+
+def load_bm25(name):
+    """Memory-mapped BM25 index next to the FAISS index, or None; reopened when the index is rebuilt."""
+    version = index_version(name)
+    cached = bm25_indexes.get(name)
+    if cached is None or cached[0] != version:
+        path = os.path.join(index_dir(name), BM25_DIRNAME)
+        bm25 = BM25Index(path) if HYBRID_SEARCH and os.path.exists(os.path.join(path, "bm25.json")) else None
+        cached = bm25_indexes[name] = (version, bm25)
+    return cached[1]
+
+
+def lexical_search(libraries, query, k):
+    """BM25 hit ids for `query` within `libraries`, or None when the index has no BM25 side."""
+    bm25 = load_bm25(index_name(libraries[0]))
+    if bm25 is None:
+        return None
+    ids, _ = bm25.search(query, k, scope_ranges(libraries))
+    return ids
+
+
+async def vector_search(libraries, query, k, entry=None):
+    # Loading the entry also records which embedder the index was built with.
+    entry = entry or await asyncio.to_thread(load_faiss_index, index_name(libraries[0]))
+    query_embedding = await embed_async(query, index_embedders[index_name(libraries[0])])
+    ids, scores = await asyncio.to_thread(search_index, libraries, query_embedding, k, entry)
+    return query_embedding, ids, scores
+
+
+async def search_candidates(libraries, query, k=25):
+    """
+    Top-k candidates for `query` within the `libraries` tuple, as (candidates, query_vector, ids).
+    Vector and BM25 search run concurrently and are fused with reciprocal-rank fusion.
+    The query vector and hit ids are cached per (libraries, phrase).
+    The registry entry is looked up once, so the search and its rows come from the same index.
+    """
+    version = f"{index_version(index_name(libraries[0]))}:{k}:{'hybrid' if HYBRID_SEARCH else 'vector'}"
+    entry = await asyncio.to_thread(load_faiss_index, index_name(libraries[0]))
+    key = query_cache.make_key(",".join(libraries), query, version)
+    cached = await asyncio.to_thread(query_cache.get, key)
+    if cached is None:
+        (query_embedding, ids, scores), lexical_ids = await asyncio.gather(
+            vector_search(libraries, query, k, entry),
+            asyncio.to_thread(lexical_search, libraries, query, k),
+        )
+        if lexical_ids is not None:
+            ids, scores = reciprocal_rank_fusion([ids, lexical_ids], k, RRF_K)
+        await asyncio.to_thread(query_cache.put, key, query_embedding, ids, scores)
+    else:
+        query_embedding, ids, scores = cached
+    found = ids >= 0
+    ids, scores = ids[found], scores[found]
+    candidates = await asyncio.to_thread(candidate_rows, libraries, ids, scores, entry)
+    return candidates, query_embedding, ids
+
+
+async def gemini_stream(contents, config):
+    """Yields Gemini response chunks from the async client without blocking other requests."""
+    async for chunk in await client.aio.models.generate_content_stream(model=GEMINI_MODEL, contents=contents, config=config):
+        if chunk.text:
+            yield chunk.text
+
+
+async def gemini_generate(contents, config):
+    return "".join([text async for text in gemini_stream(contents, config)])
+
+
+reranker = create_reranker(
+    os.getenv("RERANKER", "nvidia"),
+    budget_ms=float(RERANK_BUDGET_MS) if RERANK_BUDGET_MS else None,
+    get_client=lambda: http_client,
+    url=RERANK_URL,
+    model=RERANK_MODEL,
+    api_key=os.getenv("NVIDIA_API_KEY"),
+)
+
+
+async def rerank_candidates(libraries, query, candidates, query_vector, ids, top_n=2):
+    """Reranks the candidates with the configured reranker and keeps the best `top_n`."""
+    async def vectors():
+        # Only the local reranker reads them, e.g. when the remote one misses its budget
+        return await asyncio.to_thread(candidate_vectors, libraries, ids)
+
+    try:
+        rankings = await reranker.rank(query, candidates, query_vector, vectors)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{reranker.name} rerank failed: {str(e)}")
+    return [candidates[i] | {"rerank_score": score} for i, score in rankings[:top_n]]
 
 
 class AnalyzeErrorRequest(BaseModel):
@@ -85,9 +591,8 @@ class AnalyzeErrorRequest(BaseModel):
     stack_trace: dict
 
 
-@app.post("/analyze_error")
-async def analyze_error(request: AnalyzeErrorRequest):
-    session_id = request.session_id
+def build_classification_request(request):
+    from google.genai import types
     contents = [
         types.Content(
             role="user",
@@ -105,14 +610,14 @@ async def analyze_error(request: AnalyzeErrorRequest):
         top_k=40,
         max_output_tokens=8192,
         response_mime_type="application/json",
-        response_schema=genai.types.Schema(
-            type=genai.types.Type.OBJECT,
+        response_schema=types.Schema(
+            type=types.Type.OBJECT,
             required=["DocReq", "SearchPhrase", "Library"],
             properties={
-                "DocReq": genai.types.Schema(type=genai.types.Type.BOOLEAN),
-                "SearchPhrase": genai.types.Schema(type=genai.types.Type.STRING),
-                "Library": genai.types.Schema(
-                    type=genai.types.Type.STRING,
+                "DocReq": types.Schema(type=types.Type.BOOLEAN),
+                "SearchPhrase": types.Schema(type=types.Type.STRING),
+                "Library": types.Schema(
+                    type=types.Type.STRING,
                     enum=list(LIB_PATH.keys()),
                 ),
             },
@@ -128,72 +633,83 @@ async def analyze_error(request: AnalyzeErrorRequest):
         ],
     )
 
-    response_text = ""
-    for chunk in client.models.generate_content_stream(model="gemini-2.0-flash-lite", contents=contents, config=config):
-        response_text += chunk.text
+    return contents, config
+
+
+FINGERPRINT_CACHE_SIZE = int(os.getenv("FINGERPRINT_CACHE_SIZE", "4096"))
+FINGERPRINT_CACHE_TTL = float(os.getenv("FINGERPRINT_CACHE_TTL", "86400"))
+classification_cache = TTLCache(max_entries=FINGERPRINT_CACHE_SIZE, ttl=FINGERPRINT_CACHE_TTL)
+answer_cache = TTLCache(max_entries=FINGERPRINT_CACHE_SIZE, ttl=FINGERPRINT_CACHE_TTL)
+
+
+async def classify_error(request):
+    """
+    Asks Gemini whether documentation is needed, and for which library and search phrase; stores the session.
+    Classifications are cached by stack trace fingerprint, so a repeated error skips the Gemini call.
+    """
+    fingerprint = fingerprint_stack_trace(request.stack_trace)
+    response_text = classification_cache.get(fingerprint)
+    cached = response_text is not None
+    if not cached:
+        contents, config = build_classification_request(request)
+        response_text = await gemini_generate(contents, config)
 
     try:
         gemini_response = json.loads(response_text)
-        session_store[session_id] = {
-            "user_prompt": request.user_prompt,
-            "code_snippet": request.code_snippet,
-            "stack_trace": request.stack_trace,
-            "doc_req": gemini_response.get("DocReq", False),
-            "search_phrase": gemini_response.get("SearchPhrase", ""),
-            "library": gemini_response.get("Library", ""),
-            "gemini_response": gemini_response
-        }
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Error parsing Gemini response.")
+    if not cached:
+        # Only a fresh classification is written, so a hot entry still expires after its TTL.
+        classification_cache.put(fingerprint, response_text)
+
+    ctx = {
+        "user_prompt": request.user_prompt,
+        "code_snippet": request.code_snippet,
+        "stack_trace": request.stack_trace,
+        "doc_req": gemini_response.get("DocReq", False),
+        "search_phrase": gemini_response.get("SearchPhrase", ""),
+        "library": gemini_response.get("Library", ""),
+        "gemini_response": gemini_response
+    }
+    if not await asyncio.to_thread(session_store.set, request.session_id, ctx):
+        print(f"⚠️ Session {request.session_id} is over the SESSION_MAX_MB budget and was not stored")
+    return response_text, ctx
+
 
-    return {"session_id": session_id, "response": response_text}
+@app.post("/analyze_error", dependencies=[Depends(require_ready)])
+async def analyze_error(request: AnalyzeErrorRequest):
+    response_text, _ = await classify_error(request)
+    return {"session_id": request.session_id, "response": response_text}
 
 
 class SubmitDocumentsRequest(BaseModel):
     session_id: str
 
 
-@app.post("/submit_documents")
-async def submit_documents(request: SubmitDocumentsRequest):
-    if request.session_id not in session_store:
-        raise HTTPException(status_code=400, detail="Session ID not found.")
-
-    ctx = session_store[request.session_id]
+async def retrieve_documents(ctx, prefetched=None):
+    """
+    Embeds the search phrase, searches the library index and keeps the top reranked passages.
+    `prefetched` is an already computed search_candidates() result for the search scope of ctx["library"].
+    """
     top_k_docs, used_urls = [], []
 
     if ctx["doc_req"]:
-        index, metadata = load_faiss_index(ctx["library"])
-        query_embedding = generate_embedding(ctx["search_phrase"])
-        D, I = index.search(query_embedding.reshape(1, -1), 25)
-        candidates = [{"score": float(D[0][i]), **metadata[I[0][i]]} for i in range(len(I[0]))]
-
-        payload = {
-            "model": RERANK_MODEL,
-            "query": {"text": ctx["search_phrase"]},
-            "passages": [{"text": doc["text"]} for doc in candidates]
-        }
-
-        try:
-            response = requests.post(
-                f"https://ai.api.nvidia.com/v1/retrieval/{RERANK_MODEL}/reranking",
-                headers={
-                    "Authorization": f"Bearer {os.getenv('NVIDIA_API_KEY')}",
-                    "Accept": "application/json"
-                },
-                json=payload
-            )
-            response.raise_for_status()
-            rankings = response.json().get("rankings", [])
-            reranked_docs = [candidates[r["index"]] | {"rerank_score": r["logit"]}
-                             for r in rankings if r["logit"] >= 0]
-
-            if reranked_docs:
-                top_k_docs = sorted(reranked_docs, key=lambda x: x["rerank_score"], reverse=True)[:2]
-                used_urls = [doc["url"] for doc in top_k_docs]
-
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"NVIDIA Rerank API failed: {str(e)}")
-
+        libraries = await asyncio.to_thread(search_scope, ctx["library"], ctx["stack_trace"])
+        if not libraries:
+            return top_k_docs, used_urls
+        if prefetched is None:
+            prefetched = await search_candidates(libraries, ctx["search_phrase"], 25)
+        candidates, query_vector, ids = prefetched
+        # Only the best fused candidates go to the (remote, per-passage priced) reranker.
+        candidates, ids = candidates[:RERANK_CANDIDATES], ids[:RERANK_CANDIDATES]
+        top_k_docs = await rerank_candidates(libraries, ctx["search_phrase"], candidates, query_vector, ids)
+        used_urls = [doc["url"] for doc in top_k_docs]
+
+    return top_k_docs, used_urls
+
+
+def build_answer_request(ctx, top_k_docs):
+    from google.genai import types
     full_convo = {
         "user_prompt": ctx["user_prompt"],
         "code_snippet": ctx["code_snippet"],
@@ -215,15 +731,44 @@ async def submit_documents(request: SubmitDocumentsRequest):
         response_mime_type="text/plain",
         system_instruction=[types.Part.from_text(text=system_instruction)]
     )
+    return contents, config
 
-    response_text = ""
-    for chunk in client.models.generate_content_stream(model="gemini-2.0-flash-lite", contents=contents, config=config):
-        response_text += chunk.text
 
-    if ctx["doc_req"]:
-        response_text += f"\n\n📌 **Sources Used:** {', '.join(used_urls)}"
+def sources_footer(ctx, used_urls):
+    return f"\n\n📌 **Sources Used:** {', '.join(used_urls)}" if ctx["doc_req"] else ""
+
+
+async def answer_error(session_id, ctx, prefetched=None):
+    """
+    Retrieves documentation, generates the fix and stores it in the session.
+    Answers are cached by stack trace fingerprint plus the user's code and prompt.
+    Returns (used_urls, response_text).
+    """
+    key = answer_key(ctx["stack_trace"], ctx["code_snippet"], ctx["user_prompt"])
+    cached = answer_cache.get(key)
+    if cached is None:
+        top_k_docs, used_urls = await retrieve_documents(ctx, prefetched)
+        contents, config = build_answer_request(ctx, top_k_docs)
+        response_text = await gemini_generate(contents, config)
+        response_text += sources_footer(ctx, used_urls)
+        cached = {"retrieved_documents": used_urls, "updated_response": response_text}
+        answer_cache.put(key, cached)
+
+    await asyncio.to_thread(session_store.update, session_id, gemini_response=cached["updated_response"])
+    return cached["retrieved_documents"], cached["updated_response"]
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    session_store[request.session_id]["gemini_response"] = response_text
+
+@app.post("/submit_documents", dependencies=[Depends(require_ready)])
+async def submit_documents(request: SubmitDocumentsRequest):
+    ctx = await asyncio.to_thread(session_store.get, request.session_id)
+    if ctx is None:
+        raise HTTPException(status_code=400, detail="Session ID not found.")
+
+    used_urls, response_text = await answer_error(request.session_id, ctx)
     return {
         "session_id": request.session_id,
         "user_prompt": ctx["user_prompt"],
@@ -232,3 +777,143 @@ async def submit_documents(request: SubmitDocumentsRequest):
         "retrieved_documents": used_urls,
         "updated_response": response_text
     }
+
+
+@app.post("/submit_documents/stream", dependencies=[Depends(require_ready)])
+async def submit_documents_stream(request: SubmitDocumentsRequest):
+    """
+    Server-Sent Events variant of /submit_documents.
+    Emits `status` immediately, `sources` once retrieval finishes, one `chunk` per
+    Gemini chunk as it arrives, then `done` with the assembled answer (or `error`).
+    """
+    ctx = await asyncio.to_thread(session_store.get, request.session_id)
+    if ctx is None:
+        raise HTTPException(status_code=400, detail="Session ID not found.")
+
+    async def event_stream():
+        cached = answer_cache.get(answer_key(ctx["stack_trace"], ctx["code_snippet"], ctx["user_prompt"]))
+        if cached is not None:
+            await asyncio.to_thread(session_store.update, request.session_id,
+                                    gemini_response=cached["updated_response"])
+            yield sse_event("sources", {"retrieved_documents": cached["retrieved_documents"]})
+            yield sse_event("chunk", {"text": cached["updated_response"]})
+            yield sse_event("done", {"session_id": request.session_id, **cached})
+            return
+
+        yield sse_event("status", {"session_id": request.session_id, "stage": "retrieving"})
+        try:
+            top_k_docs, used_urls = await retrieve_documents(ctx)
+            yield sse_event("sources", {"retrieved_documents": used_urls})
+
+            contents, config = build_answer_request(ctx, top_k_docs)
+            parts = []
+            async for text in gemini_stream(contents, config):
+                parts.append(text)
+                yield sse_event("chunk", {"text": text})
+
+            footer = sources_footer(ctx, used_urls)
+            if footer:
+                yield sse_event("chunk", {"text": footer})
+            response_text = "".join(parts) + footer
+            answer_cache.put(answer_key(ctx["stack_trace"], ctx["code_snippet"], ctx["user_prompt"]),
+                             {"retrieved_documents": used_urls, "updated_response": response_text})
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+            return
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Streaming failed: {str(e)}"})
+            return
+
+        await asyncio.to_thread(session_store.update, request.session_id, gemini_response=response_text)
+        yield sse_event("done", {
+            "session_id": request.session_id,
+            "retrieved_documents": used_urls,
+            "updated_response": response_text
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Top-level package directories under site-packages mapped to the documentation we index.
+SITE_PACKAGE_LIBRARIES = {
+    "numpy": "Numpy",
+    "pandas": "Pandas",
+    "torch": "PyTorch",
+    "sklearn": "Scikit-Learn",
+    "tensorflow": "TensorFlow Keras",
+    "keras": "TensorFlow Keras",
+    "tf_keras": "TensorFlow Keras",
+}
+
+
+def infer_libraries(stack_trace):
+    """Guesses the documentation libraries an error comes from using the stack trace's file paths."""
+    libraries = []
+    for key in ("first_site_package_error", "error_point"):
+        frame = stack_trace.get(key) or {}
+        path = (frame.get("file") or "").replace("\\", "/")
+        parts = path.split("/")
+        library = None
+        for marker in ("site-packages", "dist-packages"):
+            if marker in parts and parts.index(marker) + 1 < len(parts):
+                library = SITE_PACKAGE_LIBRARIES.get(parts[parts.index(marker) + 1])
+                break
+        else:
+            if re.search(r"/(lib/python3\.\d+|Lib)/", path):
+                library = "Python"
+        if library and library not in libraries:
+            libraries.append(library)
+    return libraries
+
+
+def speculative_query(stack_trace):
+    exception = stack_trace.get("exception") or ""
+    message = (stack_trace.get("message") or "")[:300]
+    return f"{exception}: {message}".strip(": ")
+
+
+@app.post("/fix", dependencies=[Depends(require_ready)])
+async def fix(request: AnalyzeErrorRequest):
+    """
+    Single-call pipeline: classification and retrieval overlap instead of running back to back.
+    While Gemini classifies the error, the exception and message are embedded and searched in the
+    libraries inferred from the stack trace; if Gemini picks one of them, that result is reused.
+    With the unified index all inferred libraries share one search scope, so one search is started.
+    """
+    query = speculative_query(request.stack_trace)
+    available = await asyncio.to_thread(available_libraries)
+    libraries = [library for library in infer_libraries(request.stack_trace) if library in available]
+    if answer_key(request.stack_trace, request.code_snippet, request.user_prompt) in answer_cache:
+        libraries = []
+    scopes = dict.fromkeys(search_scope(library, request.stack_trace, available) for library in libraries)
+    speculative = {scope: asyncio.create_task(search_candidates(scope, query, 25))
+                   for scope in scopes} if query else {}
+
+    try:
+        response_text, ctx = await classify_error(request)
+
+        prefetched = None
+        task = speculative.pop(search_scope(ctx["library"], ctx["stack_trace"], available), None) if ctx["doc_req"] else None
+        if task is not None:
+            try:
+                prefetched = await task
+            except Exception as e:
+                print(f"⚠️ Speculative search for {ctx['library']} failed: {e}")
+    finally:
+        for task in speculative.values():
+            task.cancel()
+        # Retrieve the outcome of every unused search, so a failed one is not reported as never retrieved.
+        await asyncio.gather(*speculative.values(), return_exceptions=True)
+
+    used_urls, answer = await answer_error(request.session_id, ctx, prefetched)
+    return {
+        "session_id": request.session_id,
+        "response": response_text,
+        "speculative_hit": prefetched is not None,
+        "retrieved_documents": used_urls,
+        "updated_response": answer
+    }
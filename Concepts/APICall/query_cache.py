@@ -0,0 +1,115 @@
+"""
+Cache of query embeddings and FAISS candidate lists keyed by normalized
+(library, search phrase). An in-memory LRU+TTL tier sits in front of an
+optional SQLite tier that survives restarts.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from cache import TTLCache
+
+# The SQLite tier is trimmed back to max_disk_entries once every PRUNE_EVERY writes, not on every write.
+PRUNE_EVERY = 1000
+
+
+def normalize_phrase(phrase):
+    return re.sub(r"\s+", " ", phrase.strip().lower()).strip(" .:;,'\"")
+
+
+class QueryCache:
+    def __init__(self, max_entries=2048, ttl=None, path=None, max_disk_entries=100000):
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache "
+                "(key TEXT PRIMARY KEY, vector BLOB, ids BLOB, scores BLOB, created REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS query_cache_created ON query_cache (created)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(library, phrase, version=""):
+        """`version` identifies the index build so stale candidate ids are never served."""
+        raw = f"{library}\x00{version}\x00{normalize_phrase(phrase)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns (vector, ids, scores) or None."""
+        value = self.memory.get(key)
+        if value is not None or self._db is None:
+            return value
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT vector, ids, scores, created FROM query_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (self.ttl and row[3] + self.ttl < time.time()):
+            self.disk_misses += 1
+            return None
+
+        self.disk_hits += 1
+        value = (
+            np.frombuffer(row[0], dtype=np.float32),
+            np.frombuffer(row[1], dtype=np.int64),
+            np.frombuffer(row[2], dtype=np.float32),
+        )
+        self.memory.put(key, value)
+        return value
+
+    def put(self, key, vector, ids, scores):
+        value = (
+            np.asarray(vector, dtype=np.float32),
+            np.asarray(ids, dtype=np.int64),
+            np.asarray(scores, dtype=np.float32),
+        )
+        self.memory.put(key, value)
+        if self._db is None:
+            return
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?)",
+                (key, value[0].tobytes(), value[1].tobytes(), value[2].tobytes(), time.time()),
+            )
+            self._puts += 1
+            if self._puts % PRUNE_EVERY == 0:
+                self._prune()
+            self._db.commit()
+
+    def _prune(self):
+        """Drops the oldest rows beyond max_disk_entries; the index on `created` finds the cutoff without a sort."""
+        row = self._db.execute(
+            "SELECT created FROM query_cache ORDER BY created DESC LIMIT 1 OFFSET ?", (self.max_disk_entries,)
+        ).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM query_cache WHERE created <= ?", (row[0],))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self):
+        stats = {"memory": self.memory.stats()}
+        if self._db is not None:
+            lookups = self.disk_hits + self.disk_misses
+            stats["disk"] = {
+                "path": self.path,
+                "hits": self.disk_hits,
+                "misses": self.disk_misses,
+                "hit_rate": self.disk_hits / lookups if lookups else 0.0,
+            }
+        return stats
@@ -0,0 +1,30 @@
+"""
+Local stand-in for the NVIDIA rerank API, for development and load tests
+without an NVIDIA_API_KEY. Scores passages by query-term overlap and answers
+in the same `{"rankings": [{"index", "logit"}]}` shape.
+
+Run:  uvicorn rerank_stub:app --port 8001
+Then: RERANK_URL=http://127.0.0.1:8001/v1/retrieval/nvidia/nv-rerankqa-mistral-4b-v3/reranking
+Set STUB_DELAY_MS to simulate a slow remote reranker.
+tests/test_rerankers.py serves it in-process to exercise the latency-budget fallback.
+"""
+
+import asyncio
+import os
+from fastapi import FastAPI
+from rerankers import lexical_overlap
+
+app = FastAPI()
+
+STUB_DELAY_MS = float(os.getenv("STUB_DELAY_MS", "0"))
+
+
+@app.post("/v1/retrieval/{org}/{model}/reranking")
+async def reranking(org: str, model: str, payload: dict):
+    if STUB_DELAY_MS:
+        await asyncio.sleep(STUB_DELAY_MS / 1000)
+    query = payload["query"]["text"]
+    # Map overlap in [0, 1] onto logits around 0 so the server's logit >= 0 filter behaves as with the real API.
+    rankings = [{"index": i, "logit": lexical_overlap(query, passage["text"]) * 10 - 2}
+                for i, passage in enumerate(payload.get("passages", []))]
+    return {"rankings": sorted(rankings, key=lambda r: r["logit"], reverse=True)}
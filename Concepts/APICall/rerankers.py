@@ -0,0 +1,151 @@
+"""
+Pluggable rerankers for the retrieved FAISS candidates.
+Every reranker implements `rank(query, candidates, query_vector, candidate_vectors)`
+and returns `(candidate_position, score)` pairs, best first, already filtered by
+its own relevance threshold. `candidate_vectors` is an array or an async callable
+returning one, so the vectors are only read from the index by a reranker that uses them.
+"""
+
+import asyncio
+import re
+import time
+import numpy as np
+from metrics import Histogram
+
+RERANK_LATENCY_MS_BUCKETS = [50, 100, 250, 500, 1000, 2000, 5000, 10000]
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9_]+", text.lower())
+
+
+def lexical_overlap(query, text):
+    """Fraction of distinct query terms that appear in the passage."""
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return 0.0
+    return len(query_terms & set(tokenize(text))) / len(query_terms)
+
+
+class PassthroughReranker:
+    """Keeps the FAISS order unchanged."""
+    name = "passthrough"
+
+    async def rank(self, query, candidates, query_vector=None, candidate_vectors=None):
+        return [(i, doc["score"]) for i, doc in enumerate(candidates)]
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class LocalReranker:
+    """
+    CPU reranker that blends cosine similarity between the query vector and the
+    candidate vectors already held in the index with query-term overlap.
+    Falls back to lexical overlap alone when vectors are unavailable.
+    """
+    name = "local"
+
+    def __init__(self, vector_weight=0.7, min_score=0.0):
+        self.vector_weight = vector_weight
+        self.min_score = min_score
+
+    async def rank(self, query, candidates, query_vector=None, candidate_vectors=None):
+        if callable(candidate_vectors):
+            candidate_vectors = await candidate_vectors()
+        lexical = np.array([lexical_overlap(query, doc["text"]) for doc in candidates], dtype=np.float32)
+        scores = lexical
+        if query_vector is not None and candidate_vectors is not None and len(candidate_vectors):
+            q = query_vector / (np.linalg.norm(query_vector) + 1e-10)
+            v = candidate_vectors / (np.linalg.norm(candidate_vectors, axis=1, keepdims=True) + 1e-10)
+            scores = self.vector_weight * (v @ q) + (1 - self.vector_weight) * lexical
+
+        order = np.argsort(-scores, kind="stable")
+        return [(int(i), float(scores[i])) for i in order if scores[i] >= self.min_score]
+
+    def stats(self):
+        return {"backend": self.name, "vector_weight": self.vector_weight}
+
+
+class NvidiaReranker:
+    """Remote `nv-rerankqa-mistral-4b-v3` reranker; keeps passages with a non-negative logit."""
+    name = "nvidia"
+
+    def __init__(self, get_client, url, model, api_key):
+        self.get_client = get_client
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.latency_ms = Histogram(RERANK_LATENCY_MS_BUCKETS)
+
+    async def rank(self, query, candidates, query_vector=None, candidate_vectors=None):
+        payload = {
+            "model": self.model,
+            "query": {"text": query},
+            "passages": [{"text": doc["text"]} for doc in candidates]
+        }
+        start = time.perf_counter()
+        response = await self.get_client().post(
+            self.url,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Accept": "application/json"
+            },
+            json=payload
+        )
+        self.latency_ms.observe((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        rankings = response.json().get("rankings", [])
+        return [(r["index"], r["logit"])
+                for r in sorted(rankings, key=lambda r: r["logit"], reverse=True) if r["logit"] >= 0]
+
+    def stats(self):
+        return {"backend": self.name, "url": self.url, "latency_ms": self.latency_ms.snapshot()}
+
+
+class FallbackReranker:
+    """Gives the primary reranker a latency budget and answers with the fallback when it is slow or fails."""
+
+    def __init__(self, primary, fallback, budget_ms):
+        self.primary = primary
+        self.fallback = fallback
+        self.budget = budget_ms / 1000
+        self.name = f"{primary.name}->{fallback.name}"
+        self.timeouts = 0
+        self.errors = 0
+
+    async def rank(self, query, candidates, query_vector=None, candidate_vectors=None):
+        try:
+            return await asyncio.wait_for(
+                self.primary.rank(query, candidates, query_vector, candidate_vectors), self.budget
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f"⏱️ {self.primary.name} reranker exceeded {self.budget * 1000:.0f} ms, using {self.fallback.name}")
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ {self.primary.name} reranker failed ({e}), using {self.fallback.name}")
+        return await self.fallback.rank(query, candidates, query_vector, candidate_vectors)
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "budget_ms": self.budget * 1000,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "primary": self.primary.stats(),
+            "fallback": self.fallback.stats(),
+        }
+
+
+def create_reranker(backend, budget_ms=None, get_client=None, url=None, model=None, api_key=None):
+    if backend == "passthrough":
+        return PassthroughReranker()
+    if backend == "local":
+        return LocalReranker()
+    if backend == "nvidia":
+        reranker = NvidiaReranker(get_client, url, model, api_key)
+        if budget_ms:
+            reranker = FallbackReranker(reranker, LocalReranker(), budget_ms)
+        return reranker
+    raise ValueError(f"Unknown reranker backend: {backend}")
@@ -0,0 +1,170 @@
+"""
+Session stores for the two-step /analyze_error → /submit_documents flow.
+Both implementations expire sessions that have been idle (neither read nor
+written) for a TTL and evict the least recently used ones beyond an entry
+count or byte budget. A session larger than the whole byte budget is refused:
+`set` and `update` return False. The SQLite store lets several uvicorn workers
+share sessions; it trims itself back to its limits once every PRUNE_EVERY
+writes, so between prunes it may hold up to that many sessions over them.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from cache import TTLCache
+
+PRUNE_EVERY = 100
+
+
+def session_size(ctx):
+    return len(json.dumps(ctx, default=str))
+
+
+class MemorySessionStore:
+    def __init__(self, ttl=3600, max_entries=10000, max_bytes=None):
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes, sizeof=session_size, sliding=True)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        return self._cache.get(session_id)
+
+    def set(self, session_id, ctx):
+        return self._cache.put(session_id, ctx)
+
+    def update(self, session_id, **fields):
+        with self._lock:
+            ctx = self._cache.get(session_id)
+            if ctx is None:
+                return False
+            return self._cache.put(session_id, {**ctx, **fields})
+
+    def delete(self, session_id):
+        self._cache.pop(session_id)
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {"backend": "memory", **self._cache.stats()}
+
+
+class SQLiteSessionStore:
+    def __init__(self, path, ttl=3600, max_entries=10000, max_bytes=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(id TEXT PRIMARY KEY, data TEXT, size INTEGER, expires REAL, accessed REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+        self._db.commit()
+        self._sets = 0
+
+    def _expires(self, now):
+        return now + self.ttl if self.ttl else None
+
+    def _read(self, session_id, now):
+        """The live session row's data, or None; an expired row is deleted. Runs inside the caller's transaction."""
+        row = self._db.execute("SELECT data, expires FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] < now:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            return None
+        return row[0]
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            data = self._read(session_id, now)
+            if data is not None:
+                # Reading a session keeps it alive, like writing it.
+                self._db.execute("UPDATE sessions SET accessed = ?, expires = ? WHERE id = ?",
+                                 (now, self._expires(now), session_id))
+            self._db.commit()
+        return json.loads(data) if data is not None else None
+
+    def _write(self, session_id, data, now):
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return False
+        self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                         (session_id, data, len(data), self._expires(now), now))
+        self._sets += 1
+        if self._sets % PRUNE_EVERY == 0:
+            self._evict(now)
+        return True
+
+    def set(self, session_id, ctx):
+        now = time.time()
+        with self._lock:
+            stored = self._write(session_id, json.dumps(ctx, default=str), now)
+            self._db.commit()
+        return stored
+
+    def update(self, session_id, **fields):
+        """Merges `fields` into the session in one write transaction, so concurrent workers never lose an update."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                data = self._read(session_id, now)
+                stored = data is not None and self._write(
+                    session_id, json.dumps({**json.loads(data), **fields}, default=str), now)
+            except BaseException:
+                self._db.rollback()
+                raise
+            self._db.commit()
+        return stored
+
+    def delete(self, session_id):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+
+    def _evict(self, now):
+        """Drops expired sessions, then the least recently used beyond the limits; the indexes find every cutoff."""
+        self._db.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+        row = self._db.execute(
+            "SELECT accessed FROM sessions ORDER BY accessed DESC LIMIT 1 OFFSET ?", (self.max_entries,)
+        ).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM sessions WHERE accessed <= ?", (row[0],))
+        if self.max_bytes is not None:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM sessions").fetchone()[0]
+            if total > self.max_bytes:
+                # Drop the least recently used sessions whose running total exceeds the budget.
+                self._db.execute(
+                    "DELETE FROM sessions WHERE id IN (SELECT id FROM (SELECT id, SUM(size) OVER "
+                    "(ORDER BY accessed DESC) AS running FROM sessions) WHERE running > ?)",
+                    (self.max_bytes,),
+                )
+
+    def close(self):
+        self._db.close()
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def create_session_store(backend="memory", path=None, ttl=3600, max_entries=10000, max_bytes=None):
+    if backend == "sqlite":
+        return SQLiteSessionStore(path or "sessions.db", ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+    if backend == "memory":
+        return MemorySessionStore(ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+    raise ValueError(f"Unknown session backend: {backend}")
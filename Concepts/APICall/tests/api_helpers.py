@@ -0,0 +1,118 @@
+"""
+Helpers shared by the API tests: a fake embedding, a small on-disk index, stand-ins
+for Gemini and the embedder, an in-process client and example requests.
+Kept out of conftest.py so tests can import them by a name no other test directory uses.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402,F401  (puts DocRetrieval/scripts on sys.path)
+from metadata_store import STORE_DIRNAME, write_metadata_store  # noqa: E402
+
+DIM = 16
+LIBRARY = "TensorFlow Keras"
+DOCS = [
+    ("https://www.tensorflow.org/api_docs/python/tf/keras/layers/Dense", "Dense layer units activation kernel shape"),
+    ("https://www.tensorflow.org/api_docs/python/tf/keras/Model", "Model fit compile optimizer loss metrics"),
+    ("https://www.tensorflow.org/api_docs/python/tf/keras/layers/Conv2D", "Conv2D filters kernel_size input shape"),
+    ("https://www.tensorflow.org/api_docs/python/tf/keras/losses", "losses categorical crossentropy logits labels"),
+]
+
+
+def fake_vector(text):
+    """A deterministic unit vector per text, standing in for the nomic embedding."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(DIM).astype("float32")
+    return vector / np.linalg.norm(vector)
+
+
+def build_index_dir(path, texts, urls=None, factory="Flat"):
+    """Writes faiss_index.bin and a metadata store for `texts` into `path`; returns the vectors."""
+    import faiss
+    os.makedirs(path, exist_ok=True)
+    vectors = np.stack([fake_vector(text) for text in texts])
+    index = faiss.index_factory(DIM, factory)
+    index.train(vectors)
+    index.add(vectors)
+    faiss.write_index(index, os.path.join(path, "faiss_index.bin"))
+    urls = urls or [f"https://docs.example/{i}" for i in range(len(texts))]
+    write_metadata_store(os.path.join(path, STORE_DIRNAME), [
+        {"doc_id": i, "url": url, "chunk_index": 0, "text": text} for i, (url, text) in enumerate(zip(urls, texts))
+    ])
+    return vectors
+
+
+class FakeGemini:
+    """Stands in for `genai.Client`: `client.aio.models.generate_content_stream` answers after `delay` seconds."""
+
+    def __init__(self, delay=0.0, library=LIBRARY, doc_req=True):
+        self.delay = delay
+        self.library = library
+        self.doc_req = doc_req
+        self.calls = 0
+        self.aio = self
+        self.models = self
+
+    async def generate_content_stream(self, model, contents, config):
+        self.calls += 1
+        if config.response_mime_type == "application/json":
+            # A new phrase per call, so every retrieval embeds its own query
+            text = json.dumps({"DocReq": self.doc_req, "SearchPhrase": f"Dense layer input shape {self.calls}",
+                               "Library": self.library})
+        else:
+            text = "Reshape the input before the Dense layer."
+
+        async def stream():
+            await asyncio.sleep(self.delay)
+            for part in (text[:10], text[10:]):
+                yield type("Chunk", (), {"text": part})
+
+        return stream()
+
+
+class FakeEmbedder:
+    """Replaces `main.embedder.embed`; blocks its thread for `delay` seconds per batch like a CPU-bound model."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(len(texts))
+        time.sleep(self.delay)
+        return np.stack([fake_vector(text) for text in texts])
+
+
+@asynccontextmanager
+async def serve(app_module):
+    """An httpx client talking to the app in-process; starts the embedding batcher the lifespan would start."""
+    app_module.embedding_batcher.start()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_module.app), base_url="http://test") as client:
+            yield client
+    finally:
+        await app_module.embedding_batcher.stop()
+
+
+def stack_trace(n=0):
+    return {
+        "exception": f"ValueError{n}",
+        "message": "Input 0 of layer dense is incompatible with the layer",
+        "error_point": {"file": "train.py", "line": 12, "function": "<module>", "code": "model.fit(x, y)"},
+        "filtered_trace": [{"file": "train.py", "line": 12, "function": "<module>", "code": "model.fit(x, y)"}],
+    }
+
+
+def error_request(n=0):
+    return {"session_id": f"session-{n}", "user_prompt": "Why does fit fail?", "code_snippet": "model.fit(x, y)",
+            "stack_trace": stack_trace(n)}
@@ -0,0 +1,33 @@
+import pytest
+from api_helpers import DOCS, LIBRARY, FakeEmbedder, FakeGemini, build_index_dir
+import main
+from cache import TTLCache
+from embedding_batcher import EmbeddingBatcher
+from index_registry import IndexRegistry
+from query_cache import QueryCache
+from rerankers import PassthroughReranker
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """`main` serving a small TensorFlow Keras index from tmp_path, with the embedder, Gemini and caches replaced."""
+    build_index_dir(tmp_path / main.LIB_PATH[LIBRARY], [text for _, text in DOCS], [url for url, _ in DOCS])
+    monkeypatch.setattr(main, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "UNIFIED_INDEX", False)
+    monkeypatch.setattr(main, "HYBRID_SEARCH", False)
+    monkeypatch.setattr(main.embedder, "embed", FakeEmbedder())
+    monkeypatch.setattr(main, "client", FakeGemini())
+    monkeypatch.setattr(main, "reranker", PassthroughReranker())
+    monkeypatch.setattr(main, "index_registry", IndexRegistry(main.read_faiss_index))
+    monkeypatch.setattr(main, "embedding_batcher", EmbeddingBatcher(
+        main.generate_embeddings, main.embed_executor, max_wait_ms=1, max_inflight=main.EMBED_WORKERS))
+    monkeypatch.setattr(main, "query_cache", QueryCache())
+    monkeypatch.setattr(main, "classification_cache", TTLCache())
+    monkeypatch.setattr(main, "answer_cache", TTLCache())
+    monkeypatch.setattr(main, "bm25_indexes", {})
+    monkeypatch.setattr(main, "rescoring", {})
+    monkeypatch.setattr(main, "index_embedders", {})
+    monkeypatch.setattr(main, "library_ranges", {})
+    main.models_ready.set()
+    yield main
+    main.models_ready.clear()
@@ -0,0 +1,16 @@
+from cache import TTLCache
+
+
+def test_membership_does_not_count_or_reorder():
+    cache = TTLCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert "a" in cache
+    assert "missing" not in cache
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+    # Probing "a" did not make it recently used, so it is still the one evicted.
+    cache.put("c", 3)
+    assert cache.peek("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,50 @@
+"""
+Parallel requests must overlap on the event loop: N of them should take about as
+long as the slowest one, not the sum, while Gemini and the embedder are slow.
+"""
+
+import asyncio
+import time
+from api_helpers import FakeEmbedder, FakeGemini, error_request, serve
+
+N = 8
+GEMINI_DELAY = 0.3
+EMBED_DELAY = 0.05
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    response = await coro
+    assert response.status_code == 200, response.text
+    return time.perf_counter() - start
+
+
+def test_parallel_requests_take_as_long_as_the_slowest(api, monkeypatch):
+    monkeypatch.setattr(api, "client", FakeGemini(delay=GEMINI_DELAY))
+    monkeypatch.setattr(api.embedder, "embed", FakeEmbedder(delay=EMBED_DELAY))
+
+    async def scenario():
+        async with serve(api) as client:
+            # One session end to end first, so the index is loaded before anything is timed.
+            await client.post("/analyze_error", json=error_request(-1))
+            await client.post("/submit_documents", json={"session_id": "session--1"})
+
+            single_analyze = await timed(client.post("/analyze_error", json=error_request(0)))
+            single_submit = await timed(client.post("/submit_documents", json={"session_id": "session-0"}))
+
+            start = time.perf_counter()
+            await asyncio.gather(*(timed(client.post("/analyze_error", json=error_request(n))) for n in range(1, N + 1)))
+            parallel_analyze = time.perf_counter() - start
+
+            start = time.perf_counter()
+            await asyncio.gather(*(timed(client.post("/submit_documents", json={"session_id": f"session-{n}"}))
+                                   for n in range(1, N + 1)))
+            parallel_submit = time.perf_counter() - start
+        return single_analyze, single_submit, parallel_analyze, parallel_submit
+
+    single_analyze, single_submit, parallel_analyze, parallel_submit = asyncio.run(scenario())
+
+    # Run back to back, N requests would take N times as long as one.
+    assert parallel_analyze < 2 * single_analyze, (parallel_analyze, single_analyze)
+    assert parallel_submit < 2 * single_submit, (parallel_submit, single_submit)
+    assert parallel_submit < N * GEMINI_DELAY / 2
@@ -0,0 +1,30 @@
+from fingerprint import fingerprint_stack_trace, normalize_message
+from api_helpers import stack_trace
+
+
+def trace_with_message(message):
+    trace = stack_trace()
+    trace["message"] = message
+    return trace
+
+
+def test_messages_differing_only_in_volatile_parts_share_a_fingerprint():
+    same_error = [
+        "Input 0 of layer \"dense_12\" is incompatible: expected shape=(None, 784), found shape=(None, 28, 28)",
+        "Input 0 of layer \"dense_3\" is incompatible: expected shape=(None, 10), found shape=(None, 5, 5)",
+        "Input 1 of layer dense_7 is incompatible: expected shape=(None, 784), found shape=(None, 28, 28)",
+    ]
+    assert len({fingerprint_stack_trace(trace_with_message(message)) for message in same_error[:2]}) == 1
+    assert normalize_message(same_error[2]) == normalize_message(same_error[2].replace("dense_7", "dense_41"))
+    assert normalize_message("Tensor at 0x7f3a2c1b90d0 in /home/a/venv/lib/x.py") == \
+        normalize_message("Tensor at 0x55d1e0a4 in /opt/conda/lib/y.py")
+
+
+def test_fingerprints_keep_apart_different_errors():
+    # The path mask stops at the path; the prose after it still tells errors apart.
+    assert normalize_message("File /tmp/data.csv does not exist") == "File <path> does not exist"
+    assert fingerprint_stack_trace(trace_with_message("File /tmp/data.csv does not exist")) != \
+        fingerprint_stack_trace(trace_with_message("File /tmp/data.csv is not readable"))
+    # Only the number suffix of an identifier is masked, not the layer type.
+    assert normalize_message("layer dense_12 failed") != normalize_message("layer conv2d_12 failed")
+    assert normalize_message("layer conv2d_3 failed") == "layer conv2d_<num> failed"
@@ -0,0 +1,72 @@
+import asyncio
+import gc
+from api_helpers import FakeGemini, error_request, serve
+
+
+def keras_error_request(n=0):
+    request = error_request(n)
+    request["stack_trace"]["first_site_package_error"] = {
+        "file": "/venv/lib/python3.11/site-packages/keras/src/layers/core/dense.py",
+        "line": 143, "function": "build", "code": "raise ValueError(message)",
+    }
+    return request
+
+
+def test_fix_reuses_the_speculative_search(api):
+    async def scenario():
+        async with serve(api) as client:
+            first = await client.post("/fix", json=keras_error_request())
+            second = await client.post("/fix", json=keras_error_request())
+        return first.json(), second.json()
+
+    first, second = asyncio.run(scenario())
+    assert first["speculative_hit"] is True
+    assert first["retrieved_documents"]
+    # The repeated error is answered from the answer cache without a speculative search.
+    assert second["speculative_hit"] is False
+    assert second["updated_response"] == first["updated_response"]
+    # Probing the answer cache before the search counted nothing; answer_error's own lookups did.
+    stats = api.answer_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_unused_speculative_searches_are_retrieved(api, monkeypatch):
+    async def search_failing_on_cancel(*args):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            raise RuntimeError("search failed while being cancelled")
+
+    monkeypatch.setattr(api, "search_candidates", search_failing_on_cancel)
+    # Gemini needs no documents, so the speculative search goes unused and is cancelled.
+    monkeypatch.setattr(api, "client", FakeGemini(doc_req=False))
+    unhandled = []
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        async with serve(api) as client:
+            response = await client.post("/fix", json=keras_error_request())
+        gc.collect()
+        return response
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200, response.text
+    assert response.json()["speculative_hit"] is False
+    assert unhandled == []
+
+
+def test_classification_cache_hits_do_not_rewrite_the_entry(api, monkeypatch):
+    puts = []
+    put = api.classification_cache.put
+    monkeypatch.setattr(api.classification_cache, "put", lambda *args: puts.append(args) or put(*args))
+
+    async def scenario():
+        async with serve(api) as client:
+            for n in range(3):
+                response = await client.post("/analyze_error", json={**error_request(), "session_id": f"session-{n}"})
+                assert response.status_code == 200, response.text
+
+    asyncio.run(scenario())
+    # Rewriting the entry on every hit would restart its TTL, so a hot entry would never expire.
+    assert len(puts) == 1
+    assert api.classification_cache.stats()["hits"] == 2
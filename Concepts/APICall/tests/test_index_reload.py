@@ -0,0 +1,58 @@
+import asyncio
+import os
+from bm25_index import build_from_store
+from api_helpers import DOCS, LIBRARY, build_index_dir, serve
+
+REBUILT = [
+    "Dense layer input shape mismatch reshape flatten",
+    "Sequential model add layers input shape",
+    "Embedding layer input_dim output_dim mask_zero",
+    "Dropout rate noise_shape seed training",
+    "BatchNormalization axis momentum epsilon",
+    "optimizers Adam learning_rate beta_1 beta_2",
+]
+
+
+def test_rebuilt_index_is_served_with_its_own_metadata_and_bm25(api, monkeypatch):
+    monkeypatch.setattr(api, "HYBRID_SEARCH", True)
+    path = os.path.join(api.DATA_DIR, api.LIB_PATH[LIBRARY])
+    build_from_store(path)
+
+    async def search():
+        async with serve(api) as client:
+            return await api.search_candidates((LIBRARY,), "Dense layer input shape", k=len(REBUILT))
+
+    candidates, _, _ = asyncio.run(search())
+    assert {doc["text"] for doc in candidates} <= {text for _, text in DOCS}
+    _, old_metadata = api.load_faiss_index(api.index_name(LIBRARY))
+    old_bm25 = api.load_bm25(api.index_name(LIBRARY))
+
+    # Rebuild in place with more chunks; the FAISS index, metadata and BM25 index must all switch together.
+    version = api.index_version(api.index_name(LIBRARY))
+    build_index_dir(path, REBUILT)
+    build_from_store(path)
+    stat = os.stat(os.path.join(path, "faiss_index.bin"))
+    os.utime(os.path.join(path, "faiss_index.bin"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert api.index_version(api.index_name(LIBRARY)) != version
+    # Requests still holding the previous build read it intact: the files were swapped, not rewritten.
+    assert [row["text"] for row in old_metadata] == [text for _, text in DOCS]
+    assert set(old_bm25.search("Dense layer", 10)[0]) <= set(range(len(DOCS)))
+
+    candidates, _, ids = asyncio.run(search())
+    assert len(candidates) == len(REBUILT)
+    assert {doc["text"] for doc in candidates} == set(REBUILT)
+    assert api.index_registry.stats()["reloads"] == 1
+
+
+def test_search_looks_up_the_index_once(api):
+    async def search(query):
+        async with serve(api) as client:
+            return await api.search_candidates((LIBRARY,), query, k=3)
+
+    asyncio.run(search("Dense layer input shape"))
+    stats = api.index_registry.stats()
+    lookups = stats["hits"] + stats["misses"]
+    # A new phrase misses the query cache, so both the search and the rows need the index.
+    asyncio.run(search("Sequential model add layers"))
+    stats = api.index_registry.stats()
+    assert stats["hits"] + stats["misses"] == lookups + 1
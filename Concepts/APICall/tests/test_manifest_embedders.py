@@ -0,0 +1,41 @@
+"""
+Indexes built with different pooling are served side by side: each query is embedded
+with the embedder its index's manifest.json describes, in its own batches.
+"""
+
+import asyncio
+import os
+from embedder import Embedder, write_manifest
+from api_helpers import DIM, LIBRARY, build_index_dir, fake_vector, serve
+
+
+def test_each_index_is_queried_with_its_manifest_embedder(api, monkeypatch):
+    numpy_path = os.path.join(api.DATA_DIR, api.LIB_PATH["Numpy"])
+    build_index_dir(numpy_path, ["numpy reshape array dimensions", "numpy broadcast shapes"])
+    write_manifest(numpy_path, Embedder(api.EMBED_MODEL, pooling="mean").manifest(DIM, "ip"))
+    write_manifest(os.path.join(api.DATA_DIR, api.LIB_PATH[LIBRARY]),
+                   Embedder(api.EMBED_MODEL, pooling="cls").manifest(DIM, "ip"))
+    batches = []
+
+    # Only instances without their own `embed` (not the fixture's default embedder) end up here.
+    def embed(self, texts):
+        batches.append((self.pooling, list(texts)))
+        return [fake_vector(text) for text in texts]
+
+    monkeypatch.setattr(Embedder, "embed", embed)
+
+    async def search():
+        async with serve(api) as client:
+            return await asyncio.gather(
+                api.search_candidates((LIBRARY,), "Dense layer input shape"),
+                api.search_candidates(("Numpy",), "numpy reshape array dimensions"),
+            )
+
+    (keras, _, _), (numpy, _, _) = asyncio.run(search())
+    # The CLS-pooled index gets its own embedder and batch; the mean-pooled one shares the default embedder.
+    assert batches == [("cls", ["Dense layer input shape"])]
+    assert api.index_embedders[LIBRARY].pooling == "cls"
+    assert api.index_embedders["Numpy"] is api.embedder
+    assert api.embedder.embed.batches == [1]
+    assert numpy[0]["text"] == "numpy reshape array dimensions"
+    assert keras
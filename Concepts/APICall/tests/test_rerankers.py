@@ -0,0 +1,97 @@
+"""
+The NVIDIA reranker and its latency-budget fallback, against rerank_stub.py
+standing in for the remote API.
+"""
+
+import asyncio
+import httpx
+import numpy as np
+import rerank_stub
+from rerankers import FallbackReranker, LocalReranker, NvidiaReranker
+from api_helpers import error_request, fake_vector, serve
+
+STUB_URL = "http://stub/v1/retrieval/nvidia/nv-rerankqa-mistral-4b-v3/reranking"
+CANDIDATES = [
+    {"score": 0.1, "text": "Model fit compile optimizer loss metrics"},
+    {"score": 0.2, "text": "Dense layer units activation kernel input shape"},
+    {"score": 0.3, "text": "losses categorical crossentropy logits labels"},
+]
+QUERY = "Dense layer input shape"
+
+
+def stub_reranker(url=STUB_URL):
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=rerank_stub.app))
+    return NvidiaReranker(lambda: client, url, "nvidia/nv-rerankqa-mistral-4b-v3", api_key="test")
+
+
+class LazyVectors:
+    """Async callable handed to rank() as `candidate_vectors`; records whether a reranker asked for them."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return np.stack([fake_vector(doc["text"]) for doc in CANDIDATES])
+
+
+def local_rankings():
+    return asyncio.run(LocalReranker().rank(QUERY, CANDIDATES, fake_vector(QUERY), LazyVectors()))
+
+
+def test_nvidia_reranker_against_stub():
+    rankings = asyncio.run(stub_reranker().rank(QUERY, CANDIDATES))
+    assert rankings[0][0] == 1
+    # The stub maps no query-term overlap to a negative logit, which the reranker filters out like the real API's.
+    assert 0 not in [i for i, _ in rankings]
+
+
+def test_fallback_keeps_a_fast_primary_and_never_reads_vectors(monkeypatch):
+    monkeypatch.setattr(rerank_stub, "STUB_DELAY_MS", 0)
+    reranker = FallbackReranker(stub_reranker(), LocalReranker(), budget_ms=1000)
+    vectors = LazyVectors()
+    rankings = asyncio.run(reranker.rank(QUERY, CANDIDATES, fake_vector(QUERY), vectors))
+    assert rankings[0][0] == 1
+    assert vectors.calls == 0
+    assert reranker.timeouts == reranker.errors == 0
+
+
+def test_fallback_to_local_when_primary_exceeds_budget(monkeypatch):
+    monkeypatch.setattr(rerank_stub, "STUB_DELAY_MS", 500)
+    reranker = FallbackReranker(stub_reranker(), LocalReranker(), budget_ms=50)
+    vectors = LazyVectors()
+    rankings = asyncio.run(reranker.rank(QUERY, CANDIDATES, fake_vector(QUERY), vectors))
+    assert reranker.timeouts == 1
+    assert vectors.calls == 1
+    assert rankings == local_rankings()
+
+
+def test_fallback_to_local_when_primary_fails():
+    reranker = FallbackReranker(stub_reranker("http://stub/v1/missing"), LocalReranker(), budget_ms=1000)
+    rankings = asyncio.run(reranker.rank(QUERY, CANDIDATES, fake_vector(QUERY), LazyVectors()))
+    assert reranker.errors == 1
+    assert rankings == local_rankings()
+
+
+def test_submit_documents_reconstructs_vectors_only_on_fallback(api, monkeypatch):
+    reconstructed = []
+    candidate_vectors = api.candidate_vectors
+    monkeypatch.setattr(api, "candidate_vectors", lambda *args: reconstructed.append(args) or candidate_vectors(*args))
+    monkeypatch.setattr(api, "reranker", FallbackReranker(stub_reranker(), LocalReranker(), budget_ms=50))
+
+    async def submit(n):
+        async with serve(api) as client:
+            await client.post("/analyze_error", json=error_request(n))
+            response = await client.post("/submit_documents", json={"session_id": f"session-{n}"})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    monkeypatch.setattr(rerank_stub, "STUB_DELAY_MS", 0)
+    asyncio.run(submit(0))
+    assert reconstructed == []
+
+    monkeypatch.setattr(rerank_stub, "STUB_DELAY_MS", 500)
+    body = asyncio.run(submit(1))
+    assert len(reconstructed) == 1
+    assert api.reranker.timeouts == 1
+    assert body["retrieved_documents"]
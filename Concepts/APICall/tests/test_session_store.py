@@ -0,0 +1,76 @@
+import threading
+import time
+import pytest
+import session_store
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path, monkeypatch):
+    """Builds stores of the parametrized backend; SQLite stores share one file and prune on every write."""
+    monkeypatch.setattr(session_store, "PRUNE_EVERY", 1)
+    stores = []
+
+    def make(**kwargs):
+        if request.param == "memory":
+            store = MemorySessionStore(**kwargs)
+        else:
+            store = SQLiteSessionStore(str(tmp_path / "sessions.db"), **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_least_recently_used_sessions_are_evicted(make_store):
+    store = make_store(max_entries=2)
+    store.set("a", {"n": 1})
+    store.set("b", {"n": 2})
+    time.sleep(0.01)
+    assert store.get("a") == {"n": 1}
+    store.set("c", {"n": 3})
+    assert store.get("b") is None
+    assert store.get("a") == {"n": 1} and store.get("c") == {"n": 3}
+
+
+def test_sessions_over_the_byte_budget_are_refused(make_store):
+    store = make_store(max_bytes=100)
+    assert store.set("small", {"text": "x"})
+    assert not store.set("large", {"text": "x" * 200})
+    assert store.get("large") is None
+    # An update that would push the session over the budget is reported, not silently dropped.
+    assert not store.update("small", text="x" * 200)
+    assert store.update("small", extra=1)
+    assert store.get("small") == {"text": "x", "extra": 1}
+
+
+def test_sessions_expire_when_idle(make_store):
+    store = make_store(ttl=0.4)
+    store.set("a", {"n": 1})
+    for _ in range(3):
+        # Each read restarts the TTL, so a session in use outlives it.
+        time.sleep(0.25)
+        assert store.get("a") == {"n": 1}
+    time.sleep(0.5)
+    assert store.get("a") is None
+    assert not store.update("a", n=2)
+
+
+def test_concurrent_updates_are_not_lost(make_store):
+    first = make_store()
+    # Two workers: separate stores over one SQLite file, or threads sharing one memory store.
+    stores = [first, make_store() if isinstance(first, SQLiteSessionStore) else first]
+    first.set("a", {})
+
+    def work(store, worker):
+        for i in range(25):
+            assert store.update("a", **{f"w{worker}_{i}": i})
+
+    threads = [threading.Thread(target=work, args=(stores[n % 2], n)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(stores[0].get("a")) == 100
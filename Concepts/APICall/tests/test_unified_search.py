@@ -0,0 +1,52 @@
+import json
+import os
+import faiss
+import pytest
+from quantize_index import quantize
+from api_helpers import build_index_dir, fake_vector
+
+LIBRARIES = ["Numpy", "Pandas", "TensorFlow Keras"]
+PER_LIBRARY = 300
+K = 10
+
+
+@pytest.fixture
+def unified(api, monkeypatch):
+    """`api` serving a unified index of three libraries laid out as unified_index.py does."""
+    path = os.path.join(api.DATA_DIR, "unified")
+    build_index_dir(path, [f"{library} page {i}" for library in LIBRARIES for i in range(PER_LIBRARY)])
+    with open(os.path.join(path, "library_ranges.json"), "w") as f:
+        json.dump({library: [n * PER_LIBRARY, (n + 1) * PER_LIBRARY] for n, library in enumerate(LIBRARIES)}, f)
+    monkeypatch.setattr(api, "UNIFIED_INDEX", True)
+    return path
+
+
+# "pq" builds a plain IndexPQ, which rejects SearchParameters; its hits are filtered after the search instead.
+@pytest.mark.parametrize("mode", [None, "fp16", "sq8", "pq", "IVF8,PQ2"])
+def test_filtered_search_stays_in_scope_for_every_quantization(api, unified, mode):
+    if mode is not None:
+        quantize(unified, mode, apply=True)
+    query = fake_vector("Pandas page 7")
+    for scope in [("Pandas",), ("Numpy", "TensorFlow Keras"), tuple(LIBRARIES)]:
+        ids, _ = api.search_index(scope, query, K)
+        allowed = [i for n, library in enumerate(LIBRARIES) if library in scope
+                   for i in range(n * PER_LIBRARY, (n + 1) * PER_LIBRARY)]
+        assert len(ids) == K and set(ids) <= set(allowed), (mode, scope, ids)
+    # An exact or re-scored index still finds the query's own page first.
+    if mode in (None, "fp16", "pq"):
+        assert api.search_index(("Pandas",), query, K)[0][0] == PER_LIBRARY + 7
+
+
+def test_quantizing_keeps_the_configured_search_params(api, unified):
+    with open(os.path.join(unified, "index_config.json"), "w") as f:
+        json.dump({"factory": "IVF8,Flat", "metric": "l2", "nprobe": 3, "efSearch": None}, f)
+    quantize(unified, "IVF8,PQ2", apply=True)
+    with open(os.path.join(unified, "index_config.json")) as f:
+        assert json.load(f)["nprobe"] == 3
+    index, _ = api.load_faiss_index(api.UNIFIED)
+    assert faiss.extract_index_ivf(index).nprobe == 3
+
+    # A flat SQ8 index has no nprobe to carry over.
+    quantize(unified, "sq8", apply=True)
+    with open(os.path.join(unified, "index_config.json")) as f:
+        assert json.load(f)["nprobe"] is None
@@ -0,0 +1,38 @@
+import asyncio
+import json
+import os
+from api_helpers import FakeGemini, LIBRARY, build_index_dir, error_request, serve
+
+
+def test_warmup_leaves_out_an_index_it_cannot_load(api, monkeypatch):
+    # The Keras index claims another embedding model; NumPy's is fine.
+    with open(os.path.join(api.DATA_DIR, api.LIB_PATH[LIBRARY], "manifest.json"), "w") as f:
+        json.dump({"model": "another/model", "dim": 16}, f)
+    build_index_dir(os.path.join(api.DATA_DIR, api.LIB_PATH["Numpy"]), ["numpy reshape array dimensions"])
+    monkeypatch.setattr(api, "unavailable_indexes", {})
+    monkeypatch.setattr(api, "WARMUP", True)
+    monkeypatch.setattr(api, "load_embedder", lambda: None)
+    monkeypatch.setattr(api, "load_gemini_client", lambda: None)
+    api.models_ready.clear()
+
+    asyncio.run(api.load_models())
+    assert api.models_ready.is_set()
+    assert api.available_libraries() == ["Numpy"]
+
+    async def scenario():
+        async with serve(api) as client:
+            ready = await client.get("/ready")
+            await client.post("/analyze_error", json=error_request(0))
+            submitted = await client.post("/submit_documents", json={"session_id": "session-0"})
+            api.client = FakeGemini(doc_req=False)
+            await client.post("/analyze_error", json=error_request(1))
+            without_docs = await client.post("/submit_documents", json={"session_id": "session-1"})
+        return ready, submitted, without_docs
+
+    ready, submitted, without_docs = asyncio.run(scenario())
+    assert ready.status_code == 200
+    assert "mismatch" in ready.json()["unavailable"][LIBRARY]
+    # Asking for the unavailable library's docs answers without them instead of failing.
+    assert submitted.status_code == 200, submitted.text
+    assert submitted.json()["retrieved_documents"] == []
+    assert without_docs.status_code == 200, without_docs.text
@@ -0,0 +1,313 @@
+"""
+Concurrent crawler for the SITE_CONFIG documentation sites.
+
+One pooled `httpx.AsyncClient` is shared by CRAWL_CONCURRENCY workers. Each host
+is limited to that many requests in flight and CRAWL_RATE requests per second,
+and a SITE_CONFIG entry may set its own "concurrency" / "rate". Every page is
+downloaded once and parsed once (`html_extract.extract_page`) for both its
+content and its links, with parsing done off the event loop.
+
+URLs are normalized and deduplicated when they are queued, in an on-disk
+frontier (crawl_frontier.py), and pages are streamed to JSONL as they finish.
+Every CHECKPOINT_PAGES pages the output length and the frontier are committed
+together; re-running an interrupted crawl resumes from that checkpoint. All
+SQLite and output writes, and the checkpoint fsync, run on one I/O thread, a
+page at a time, so they neither block the event loop nor split a checkpoint.
+
+Re-crawls go through the site's HttpCache (http_cache.py) and send conditional
+requests. A 304, or an identical body, reuses the cached content and links
+without parsing. Next to the output, `<out>.manifest.json` lists the URLs whose
+content was added, changed or removed since the previous crawl; `python
+ingest.py --update` applies it to a library's scraped_docs.jsonl.
+
+Usage: python async_scraper.py <site number> [out.jsonl] [--no-cache] [--restart]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import httpx
+from config import SITE_CONFIG, CRAWL_CONCURRENCY, CRAWL_RATE, CRAWL_BLOOM_CAPACITY
+from scraper import site_options
+from html_extract import extract_page
+from http_cache import HttpCache, cache_path, body_hash
+from crawl_frontier import Frontier
+
+MAX_RETRIES = 3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses that mean a page is really gone, rather than temporarily unreachable
+GONE_STATUSES = {404, 410}
+USER_AGENT = "StackOverFix-DocCrawler/1.0"
+# Longest Retry-After honoured, in seconds; a larger value would stall the worker for the rest of the crawl.
+MAX_RETRY_AFTER = 60
+CHECKPOINT_PAGES = 50
+
+
+class HostLimiter:
+    """Per-host cap on requests in flight plus a minimum spacing between request starts."""
+
+    def __init__(self, concurrency, rate):
+        self.concurrency = concurrency
+        self.interval = 1 / rate if rate else 0
+        self.hosts = {}
+
+    def _host(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = {"semaphore": asyncio.Semaphore(self.concurrency), "lock": asyncio.Lock(), "next": 0.0}
+        return self.hosts[host]
+
+    async def wait_turn(self, host):
+        async with host["lock"]:
+            now = time.monotonic()
+            delay = host["next"] - now
+            host["next"] = max(now, host["next"]) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def fetch(self, client, url, headers=None):
+        host = self._host(url)
+        async with host["semaphore"]:
+            await self.wait_turn(host)
+            return await client.get(url, headers=headers)
+
+
+async def fetch_page(client, limiter, url, headers=None):
+    """
+    GETs a page, retrying timeouts, 429 and 5xx with backoff, or after the server's
+    Retry-After up to MAX_RETRY_AFTER. Returns the last response (200 and 304 are
+    successes), or None when no response arrived.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = await limiter.fetch(client, url, headers)
+        except httpx.HTTPError as e:
+            if attempt == MAX_RETRIES:
+                print(f"[❌] Error fetching {url}: {e}")
+                return None
+        else:
+            if response.status_code in (200, 304):
+                return response
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                print(f"[❌] Failed to fetch {url} ({response.status_code})")
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                await asyncio.sleep(min(int(retry_after), MAX_RETRY_AFTER))
+                continue
+        await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+def is_html(response):
+    content_type = response.headers.get("Content-Type", "")
+    return not content_type or "html" in content_type
+
+
+def manifest_path(out_path):
+    return os.path.splitext(out_path)[0] + ".manifest.json"
+
+
+def page_change(entry, content):
+    """How a page's content moved relative to its cache entry: added, changed, removed, unchanged or None."""
+    previous = entry["content"] if entry else ""
+    if content == previous:
+        return "unchanged" if content else None
+    if not previous:
+        return "added"
+    return "changed" if content else "removed"
+
+
+def frontier_path(out_path):
+    return os.path.splitext(out_path)[0] + ".frontier.sqlite"
+
+
+def remove_frontier(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+async def crawl(site_config, out_path="py_scraped_data.jsonl", concurrency=None, rate=None, max_pages=None,
+                use_cache=True, restart=False, bloom_capacity=CRAWL_BLOOM_CAPACITY):
+    """
+    Crawls one SITE_CONFIG entry breadth-first, streaming `{"url", "content"}` lines to `out_path`.
+    An interrupted crawl resumes from `<out>.frontier.sqlite` unless `restart`.
+    With the cache, also writes the change manifest; pages are only reported
+    removed after a full crawl, i.e. without `max_pages`.
+    """
+    options = site_options(site_config)
+    concurrency = concurrency or site_config.get("concurrency", CRAWL_CONCURRENCY)
+    rate = rate or site_config.get("rate", CRAWL_RATE)
+    limiter = HostLimiter(concurrency, rate)
+
+    if restart or not os.path.exists(out_path):
+        remove_frontier(frontier_path(out_path))
+    frontier = Frontier(frontier_path(out_path), bloom_capacity)
+    resuming = frontier.meta("output_bytes") is not None
+    cache = HttpCache(cache_path(site_config)) if use_cache else None
+    if cache is not None:
+        # A resumed crawl keeps its crawl id, so pages finished before the interruption are not reported removed
+        frontier.set_meta("crawl", cache.start_crawl(int(frontier.meta("crawl")) if resuming and frontier.meta("crawl") else None))
+
+    out = open(out_path, "r+b" if resuming else "wb")
+    if resuming:
+        out.truncate(int(frontier.meta("output_bytes")))
+        out.seek(0, os.SEEK_END)
+        counts = frontier.counts()
+        print(f"[♻️] Resuming {site_config['name']}: {counts['done']} pages done, {counts['queued']} queued")
+    else:
+        frontier.add(options["base_url"])
+    frontier.checkpoint(out.tell())
+
+    pages = int(frontier.meta("pages", 0))
+    visited = frontier.counts()["done"]
+    in_flight = popping = since_checkpoint = 0
+    progress = asyncio.Event()
+    # One thread, so frontier, cache and output calls stay serialized and in order.
+    io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crawl-io")
+
+    async def run_io(fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(io, fn, *args)
+
+    def checkpoint():
+        nonlocal since_checkpoint
+        out.flush()
+        os.fsync(out.fileno())
+        frontier.set_meta("pages", pages)
+        frontier.checkpoint(out.tell())
+        if cache is not None:
+            cache.commit()
+        since_checkpoint = 0
+
+    async def next_url():
+        """The next queued URL; waits while pages in flight may still add some, None once the crawl is done."""
+        nonlocal in_flight, popping
+        while True:
+            progress.clear()
+            popping += 1
+            try:
+                url = await run_io(frontier.pop)
+            finally:
+                popping -= 1
+            if url is not None:
+                in_flight += 1
+                return url
+            if progress.is_set():
+                # A page finished during the pop and may have queued links
+                continue
+            if not in_flight and not popping:
+                # Wakes the workers waiting on this one, so they see the crawl is over too
+                progress.set()
+                return None
+            await progress.wait()
+
+    async def visit(client, url):
+        """
+        Fetches and extracts one page; returns `(content, links, cache entry, cache write)`,
+        or None when it could not be fetched. The cache write is left to finish_page().
+        """
+        entry = await run_io(cache.get, url) if cache is not None else None
+        response = await fetch_page(client, limiter, url, HttpCache.validators(entry))
+        status = response.status_code if response is not None else None
+
+        if status == 200 and is_html(response):
+            etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+            digest = body_hash(response.content)
+            if entry is not None and entry["body_hash"] == digest:
+                return entry["content"], entry["links"], entry, lambda: cache.touch(url, etag, last_modified)
+            content, links = await asyncio.to_thread(extract_page, response.content, str(response.url), options)
+            write = None
+            if cache is not None:
+                def write():
+                    cache.put(url, etag, last_modified, digest, response.content, content, links)
+            return content, links, entry, write
+        if entry is not None and (status == 304 or status not in GONE_STATUSES):
+            # Not modified, or temporarily unreachable: keep the cached page rather than reporting it removed
+            if status != 304:
+                print(f"[⚠️] Using the cached copy of {url}")
+            return entry["content"], entry["links"], entry, lambda: cache.touch(url)
+        return None
+
+    def finish_page(url, result):
+        """Records one visited page on the I/O thread: cache write, output line, new links and done state, in one job."""
+        nonlocal since_checkpoint, visited, pages
+        change = None
+        try:
+            if result is not None:
+                content, links, entry, write = result
+                if write is not None:
+                    write()
+                if content:
+                    out.write((json.dumps({"url": url, "content": content}) + "\n").encode("utf-8"))
+                    pages += 1
+                change = page_change(entry, content)
+                for link in links:
+                    if max_pages is None or len(frontier) < max_pages:
+                        frontier.add(link)
+        except Exception as e:
+            print(f"[❌] Error processing {url}: {e}")
+        finally:
+            # The I/O thread runs one job at a time, so a checkpoint never splits a page
+            frontier.complete(url, change)
+            visited += 1
+            since_checkpoint += 1
+            if since_checkpoint >= CHECKPOINT_PAGES:
+                checkpoint()
+
+    async def worker(client):
+        nonlocal in_flight
+        while (url := await next_url()) is not None:
+            result = None
+            try:
+                result = await visit(client, url)
+            except Exception as e:
+                print(f"[❌] Error processing {url}: {e}")
+            try:
+                await run_io(finish_page, url, result)
+            finally:
+                in_flight -= 1
+                progress.set()
+            if visited % 100 == 0:
+                print(f"[🔍] {visited}/{len(frontier)} pages visited, {pages} with content")
+
+    start = time.perf_counter()
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(limits=limits, timeout=10, follow_redirects=True,
+                                     headers={"User-Agent": USER_AGENT}) as client:
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    finally:
+        # When interrupted, pages not started yet are dropped; a re-run resumes from the last checkpoint.
+        io.shutdown(cancel_futures=True)
+
+    checkpoint()
+    out.close()
+
+    if cache is not None:
+        changes = frontier.changes()
+        if max_pages is None:
+            changes["removed"].extend(cache.finish_crawl())
+        cache.close()
+        with open(manifest_path(out_path), "w") as f:
+            json.dump({"site": site_config["name"], "output": os.path.abspath(out_path), "complete": max_pages is None,
+                       **{name: urls for name, urls in changes.items() if name != "unchanged"},
+                       "unchanged": len(changes["unchanged"])}, f, indent=2)
+        print(f"[📦] {len(changes['added'])} added, {len(changes['changed'])} changed, "
+              f"{len(changes['removed'])} removed, {len(changes['unchanged'])} unchanged → {manifest_path(out_path)}")
+
+    frontier.close()
+    remove_frontier(frontier_path(out_path))
+    elapsed = time.perf_counter() - start
+    print(f"[✅] Scraped {pages} pages ({visited} visited) for {site_config['name']} "
+          f"in {elapsed:.1f}s → {out_path}")
+    return {"pages": pages, "visited": visited}
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg not in ("--no-cache", "--restart")]
+    asyncio.run(crawl(SITE_CONFIG[int(args[0])], *args[1:2], use_cache="--no-cache" not in sys.argv,
+                      restart="--restart" in sys.argv))
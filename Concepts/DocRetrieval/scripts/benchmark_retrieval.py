@@ -0,0 +1,260 @@
+"""
+Offline retrieval benchmark against a golden set of (error query → expected URLs).
+
+Each golden line is {"id", "library", "query", "expected_urls"}; the set is
+versioned by its file name (golden_queries_v1.jsonl → "v1") and its sha256.
+Every query goes through the same stages as the API, each timed on its own:
+  embed        the shared Embedder on the single query
+  search       FAISS (with exact re-scoring for quantized indexes), plus BM25 and RRF with hybrid=1
+  metadata     looking up the candidate rows in the metadata store
+  reconstruct  reading the candidates' stored vectors, only when the reranker asks for them
+  rerank       the APICall reranker (local or passthrough) over the candidates
+A chunk is relevant when its URL is one of the expected URLs. The JSON report has
+recall@k and MRR before and after reranking, p50/p95/p99 per stage and per-query ranks.
+All queries run on one event loop, as they would in the server.
+
+An index directory without faiss_index.bin (e.g. the checked-in data/tfkeras,
+which ships only faiss_metadata.npy) is benchmarked on an exact in-memory Flat
+index built from its metadata texts through the embedding cache.
+
+Usage: python benchmark_retrieval.py <index_dir> [golden.jsonl] [k=25] [reranker=local|passthrough] [hybrid=1] [out=report.json]
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+import faiss
+from config import LIB_PATH, EMBED_MODEL, EMBED_BATCH_SIZE, EMBED_CACHE_PATH
+from embedder import MANIFEST_KEYS, Embedder, read_manifest, check_manifest
+from embedding_cache import EmbeddingCache, embed_with_cache
+from metadata_store import load_metadata
+from index_builder import INDEX_CONFIG_FILENAME, apply_search_params, exact_index_for
+from bm25_index import BM25_DIRNAME, BM25Index, reciprocal_rank_fusion
+from rescore import RESCORE_FILENAME, rescore
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "APICall"))
+from rerankers import create_reranker
+
+GOLDEN_PATH = "../benchmarks/golden_queries_v1.jsonl"
+REPORT_FILENAME = "benchmark_report.json"
+RECALL_AT = (1, 5, 10, 25)
+STAGES = ("embed", "search", "metadata", "reconstruct", "rerank")
+
+
+def load_golden(path, library=None):
+    """Golden queries, restricted to `library` when given, plus the set's version and sha256."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    queries = [json.loads(line) for line in raw.decode("utf-8").splitlines() if line.strip()]
+    if library is not None:
+        queries = [q for q in queries if q["library"] == library]
+    match = re.search(r"_(v\d+)\.jsonl$", path)
+    return queries, {"path": os.path.basename(path), "version": match.group(1) if match else None,
+                     "sha256": hashlib.sha256(raw).hexdigest(), "queries": len(queries)}
+
+
+def library_of_dir(index_dir):
+    """The LIB_PATH library stored in `index_dir`, or None (e.g. for the unified index)."""
+    name = os.path.basename(os.path.normpath(index_dir))
+    return next((library for library, path in LIB_PATH.items() if path == name), None)
+
+
+def load_index(index_dir, metadata, embedder):
+    """The index with its search params and re-scoring applied, or an exact one built from the metadata texts."""
+    index_path = os.path.join(index_dir, "faiss_index.bin")
+    config_path = os.path.join(index_dir, INDEX_CONFIG_FILENAME)
+    config = {"factory": "Flat", "metric": "l2"}
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            config = json.load(f)
+
+    if not os.path.exists(index_path):
+        print(f"⚠️ No faiss_index.bin in {index_dir}, embedding its {len(metadata)} chunks into an exact index")
+        cache = EmbeddingCache(EMBED_CACHE_PATH)
+        vectors = embed_with_cache([metadata[i]["text"] for i in range(len(metadata))], cache, embedder,
+                                   batch_size=EMBED_BATCH_SIZE)
+        cache.close()
+        return exact_index_for(vectors, config), config, None
+
+    index = faiss.read_index(index_path)
+    manifest = read_manifest(index_dir)
+    if manifest is not None:
+        check_manifest(manifest, embedder, index.d)
+    apply_search_params(index, config)
+    rescore_path = os.path.join(index_dir, RESCORE_FILENAME)
+    rescore_vectors = np.load(rescore_path, mmap_mode="r") if config.get("rescore") and os.path.exists(rescore_path) else None
+    return index, config, rescore_vectors
+
+
+def latency_summary(timings):
+    return {
+        "p50": float(np.percentile(timings, 50)),
+        "p95": float(np.percentile(timings, 95)),
+        "p99": float(np.percentile(timings, 99)),
+        "mean": float(np.mean(timings)),
+    }
+
+
+def first_relevant_rank(urls, expected):
+    """1-based rank of the first chunk whose URL is expected, or None."""
+    return next((rank for rank, url in enumerate(urls, 1) if url in expected), None)
+
+
+def relevance_metrics(results, k):
+    """recall@n (share of expected URLs found in the top n chunks, averaged over queries) and MRR."""
+    metrics = {}
+    for n in sorted({n for n in RECALL_AT if n < k} | {k}):
+        metrics[f"recall@{n}"] = float(np.mean([len(set(r["urls"][:n]) & r["expected"]) / len(r["expected"])
+                                                for r in results]))
+    metrics["mrr"] = float(np.mean([1 / r["rank"] if r["rank"] else 0.0 for r in results]))
+    return metrics
+
+
+class RetrievalBenchmark:
+    def __init__(self, index_dir, k=25, reranker="local", hybrid=False):
+        self.index_dir = index_dir
+        self.k = k
+        # Queries are embedded the way the index was built; indexes without a complete manifest get the default embedder.
+        manifest = read_manifest(index_dir)
+        if manifest is not None and all(key in manifest for key in MANIFEST_KEYS):
+            self.embedder = Embedder.from_manifest(manifest)
+        else:
+            self.embedder = Embedder(EMBED_MODEL, pooling="mean", normalize=True)
+        self.metadata = load_metadata(index_dir)
+        self.index, self.config, self.rescore_vectors = load_index(index_dir, self.metadata, self.embedder)
+        self.embedder.load()
+        bm25_path = os.path.join(index_dir, BM25_DIRNAME)
+        self.bm25 = BM25Index(bm25_path) if hybrid and os.path.exists(os.path.join(bm25_path, "bm25.json")) else None
+        if hybrid and self.bm25 is None:
+            print(f"⚠️ No BM25 index in {bm25_path}, benchmarking vector search only")
+        self.reranker = create_reranker(reranker)
+
+    def search(self, query, query_vector):
+        q = query_vector.reshape(1, -1)
+        if self.rescore_vectors is not None:
+            _, I = self.index.search(q, self.k * self.config["rescore"])
+            D, I = rescore(q, I, self.rescore_vectors, self.config["metric"], self.k)
+        else:
+            D, I = self.index.search(q, self.k)
+        ids, scores = I[0], D[0]
+        if self.bm25 is not None:
+            lexical_ids, _ = self.bm25.search(query, self.k)
+            ids, scores = reciprocal_rank_fusion([ids, lexical_ids], self.k)
+        keep = ids >= 0
+        return ids[keep], scores[keep]
+
+    def candidate_vectors(self, ids):
+        try:
+            return self.index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+        except RuntimeError:
+            return None
+
+    async def run_query(self, golden):
+        timings, reconstruct_seconds = {}, []
+        start = time.perf_counter()
+        query_vector = self.embedder.embed([golden["query"]])[0]
+        timings["embed"] = time.perf_counter()
+
+        ids, scores = self.search(golden["query"], query_vector)
+        timings["search"] = time.perf_counter()
+
+        candidates = [{**self.metadata[int(i)], "score": float(s)} for i, s in zip(ids, scores)]
+        timings["metadata"] = time.perf_counter()
+
+        async def vectors():
+            # Read lazily, as the API does, so a reranker that needs no vectors pays nothing for them.
+            reconstruct_start = time.perf_counter()
+            stored = self.candidate_vectors(ids)
+            reconstruct_seconds.append(time.perf_counter() - reconstruct_start)
+            return stored
+
+        ranked = await self.reranker.rank(golden["query"], candidates, query_vector, vectors)
+        timings["rerank"] = time.perf_counter()
+
+        previous = start
+        for stage in ("embed", "search", "metadata", "rerank"):
+            timings[stage], previous = (timings[stage] - previous) * 1000, timings[stage]
+        timings["reconstruct"] = sum(reconstruct_seconds, 0.0) * 1000
+        timings["rerank"] -= timings["reconstruct"]
+
+        expected = set(golden["expected_urls"])
+        urls = [doc["url"] for doc in candidates]
+        reranked_urls = [candidates[position]["url"] for position, _ in ranked]
+        return (
+            {"urls": urls, "expected": expected, "rank": first_relevant_rank(urls, expected)},
+            {"urls": reranked_urls, "expected": expected, "rank": first_relevant_rank(reranked_urls, expected)},
+            timings,
+        )
+
+    def run(self, queries):
+        return asyncio.run(self.run_queries(queries))
+
+    async def run_queries(self, queries):
+        retrieved, reranked, per_query = [], [], []
+        timings = {stage: [] for stage in STAGES}
+        for golden in queries:
+            before, after, query_timings = await self.run_query(golden)
+            retrieved.append(before)
+            reranked.append(after)
+            for stage in STAGES:
+                timings[stage].append(query_timings[stage])
+            per_query.append({"id": golden.get("id"), "rank": before["rank"], "reranked_rank": after["rank"],
+                              "latency_ms": {stage: round(query_timings[stage], 3) for stage in STAGES}})
+
+        return {
+            "retrieval": relevance_metrics(retrieved, self.k),
+            "reranked": relevance_metrics(reranked, self.k),
+            "latency_ms": {stage: latency_summary(timings[stage]) for stage in STAGES},
+            "per_query": per_query,
+        }
+
+
+def benchmark(index_dir, golden_path=GOLDEN_PATH, k=25, reranker="local", hybrid=False, out=None):
+    queries, golden = load_golden(golden_path, library_of_dir(index_dir))
+    if not queries:
+        raise ValueError(f"No golden queries in {golden_path} for {index_dir}")
+
+    bench = RetrievalBenchmark(index_dir, k, reranker, hybrid)
+    results = bench.run(queries)
+    report = {
+        "golden": golden,
+        "index": {"dir": os.path.abspath(index_dir), "vectors": int(bench.index.ntotal), "config": bench.config,
+                  "manifest": read_manifest(index_dir), "embedder": bench.embedder.id},
+        "k": k,
+        "reranker": bench.reranker.name,
+        "hybrid": bench.bm25 is not None,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **results,
+    }
+
+    out = out or os.path.join(index_dir, REPORT_FILENAME)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    retrieval, reranked = report["retrieval"], report["reranked"]
+    print(f"📊 {golden['queries']} queries ({golden['path']}): "
+          f"recall@10 {retrieval['recall@10']:.3f} → {reranked['recall@10']:.3f} reranked, "
+          f"MRR {retrieval['mrr']:.3f} → {reranked['mrr']:.3f}")
+    for stage, latency in report["latency_ms"].items():
+        print(f"⏱️ {stage}: p50 {latency['p50']:.2f} ms, p95 {latency['p95']:.2f} ms, p99 {latency['p99']:.2f} ms")
+    print(f"💾 Report written to {out}")
+    return report
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if "=" not in arg]
+    options = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    benchmark(
+        args[0],
+        args[1] if len(args) > 1 else GOLDEN_PATH,
+        k=int(options.get("k", 25)),
+        reranker=options.get("reranker", "local"),
+        hybrid=options.get("hybrid") == "1",
+        out=options.get("out"),
+    )
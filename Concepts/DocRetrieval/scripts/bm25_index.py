@@ -0,0 +1,147 @@
+"""
+Compact BM25 inverted index over the chunk texts of a metadata store.
+Postings are stored CSR-style: `indptr[t]:indptr[t+1]` slices `doc_ids` and
+`tfs` for term t, with vocab.json mapping terms to t. Every array is
+memory-mapped at query time. Identifiers are kept whole, dotted paths included
+(`dataframe.loc`), and their parts are indexed as well, so exact API tokens
+such as `torch.cuda.is_available` or `SettingWithCopyWarning` match.
+
+Usage: python bm25_index.py <index_dir>   (builds <index_dir>/bm25 from its metadata store)
+"""
+
+import json
+import os
+import re
+import shutil
+import sys
+from array import array
+import numpy as np
+from metadata_store import STORE_DIRNAME, open_metadata_store, replace_dir
+
+BM25_VERSION = 1
+BM25_DIRNAME = "bm25"
+K1 = 1.2
+B = 0.75
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*|\d+")
+
+
+def tokenize(text):
+    """Lowercased identifiers and numbers; dotted paths yield the full path plus each part."""
+    tokens = []
+    for match in _IDENTIFIER.findall(text):
+        match = match.lower()
+        tokens.append(match)
+        if "." in match:
+            tokens.extend(match.split("."))
+    return tokens
+
+
+def build_bm25_index(texts, out_dir):
+    """
+    Builds the index from an iterable of chunk texts whose positions are the FAISS ids.
+    It is written to `<out_dir>.partial` and swapped in whole, like the metadata store.
+    """
+    staging = f"{out_dir}.partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    vocab = {}
+    term_ids, doc_ids, tfs, doc_lens = array("i"), array("i"), array("i"), array("i")
+
+    for doc_id, text in enumerate(texts):
+        counts = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            term_ids.append(vocab.setdefault(token, len(vocab)))
+            doc_ids.append(doc_id)
+            tfs.append(tf)
+        doc_lens.append(len(tokens))
+
+    term_ids = np.frombuffer(term_ids, dtype=np.int32)
+    order = np.argsort(term_ids, kind="stable")
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=indptr[1:])
+
+    np.save(os.path.join(staging, "indptr.npy"), indptr)
+    np.save(os.path.join(staging, "doc_ids.npy"), np.frombuffer(doc_ids, dtype=np.int32)[order])
+    np.save(os.path.join(staging, "tfs.npy"), np.minimum(np.frombuffer(tfs, dtype=np.int32)[order], 65535).astype(np.uint16))
+    np.save(os.path.join(staging, "doc_lens.npy"), np.frombuffer(doc_lens, dtype=np.int32))
+    with open(os.path.join(staging, "vocab.json"), "w") as f:
+        json.dump(vocab, f)
+    lengths = np.frombuffer(doc_lens, dtype=np.int32)
+    with open(os.path.join(staging, "bm25.json"), "w") as f:
+        json.dump({"version": BM25_VERSION, "docs": len(lengths), "terms": len(vocab),
+                   "avgdl": float(lengths.mean()) if len(lengths) else 0.0}, f)
+    replace_dir(staging, out_dir)
+    print(f"✅ BM25 index: {len(lengths)} chunks, {len(vocab)} terms → {out_dir}")
+    return out_dir
+
+
+def build_from_store(index_dir):
+    """Builds `<index_dir>/bm25` from the metadata store next to the FAISS index."""
+    store = open_metadata_store(os.path.join(index_dir, STORE_DIRNAME))
+    return build_bm25_index((store.text(i) for i in range(len(store))), os.path.join(index_dir, BM25_DIRNAME))
+
+
+class BM25Index:
+    def __init__(self, path, k1=K1, b=B):
+        with open(os.path.join(path, "bm25.json")) as f:
+            info = json.load(f)
+        if info.get("version") != BM25_VERSION:
+            raise ValueError(f"Unsupported BM25 index version {info.get('version')} in {path}")
+        with open(os.path.join(path, "vocab.json")) as f:
+            self.vocab = json.load(f)
+        self.indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.doc_lens = np.load(os.path.join(path, "doc_lens.npy"), mmap_mode="r")
+        self.docs = info["docs"]
+        self.avgdl = info["avgdl"] or 1.0
+        self.k1, self.b = k1, b
+
+    def __len__(self):
+        return self.docs
+
+    def search(self, query, k, ranges=None):
+        """Top-k `(ids, scores)` for `query`; `ranges` limits hits to [start, end) id ranges."""
+        scores = np.zeros(self.docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.indptr[t], self.indptr[t + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            idf = np.log(1 + (self.docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lens[docs] / self.avgdl)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if ranges is not None:
+            allowed = np.zeros(self.docs, dtype=bool)
+            for start, end in ranges:
+                allowed[start:end] = True
+            scores[~allowed] = 0
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return hits.astype(np.int64), scores[hits]
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """Fuses ranked id lists: score(id) = Σ 1 / (rrf_k + rank). Returns the top-k `(ids, scores)`."""
+    fused = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            if i >= 0:
+                fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+    return (np.array([i for i, _ in best], dtype=np.int64),
+            np.array([score for _, score in best], dtype=np.float32))
+
+
+if __name__ == "__main__":
+    build_from_store(sys.argv[1])
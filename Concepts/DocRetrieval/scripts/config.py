@@ -50,5 +50,38 @@ SITE_CONFIG = {
     }
 }
 
+# async_scraper.py: workers and requests in flight per host, and requests/sec per host.
+# A SITE_CONFIG entry may override them with "concurrency" / "rate".
+CRAWL_CONCURRENCY = 8
+CRAWL_RATE = 10
+# Per-site SQLite caches of validators, raw pages and extracted content for conditional re-crawls
+HTTP_CACHE_DIR = "../data/http_cache"
+# Bloom filter in front of the crawl frontier for very large sites, e.g. 10_000_000 URLs (~36 MB); None = exact dedup only
+CRAWL_BLOOM_CAPACITY = None
+
+# Library name (the Gemini `Library` enum) → its directory under data/
+LIB_PATH = {
+    "Python": "py", "Numpy": "np", "Pandas": "pd", "PyTorch": "pt",
+    "Scikit-Learn": "sklearn", "TensorFlow Keras": "tfkeras"
+}
+
 EMBED_MODEL = "nomic-ai/nomic-embed-text-v1"
 RERANK_MODEL = "nvidia/nv-rerankqa-mistral-4b-v3"
+
+# Index builds: chunks per forward pass, worker processes, and torch threads per worker (None = torch default)
+EMBED_BATCH_SIZE = 32
+EMBED_WORKERS = 1
+EMBED_THREADS_PER_WORKER = None
+
+# ANN index per library: a faiss.index_factory string plus search-time params (None = FAISS default).
+# Check index_report.json after a build to compare recall@25, latency and memory against "Flat".
+INDEX_CONFIG = {
+    "default": {"factory": "Flat", "nprobe": None, "efSearch": None},
+    # "Python": {"factory": "IVF1024,Flat", "nprobe": 16},
+    # "Pandas": {"factory": "HNSW32", "efSearch": 64},
+    # "PyTorch": {"factory": "IVF256,PQ64", "nprobe": 32},
+    # "Unified": {"factory": "IVF4096,Flat", "nprobe": 32},  # unified_index.py
+}
+
+# Content-addressed chunk/vector cache shared by every library's index build
+EMBED_CACHE_PATH = "../data/embedding_cache.sqlite"
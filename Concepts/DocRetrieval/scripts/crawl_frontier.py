@@ -0,0 +1,145 @@
+"""
+Persistent crawl frontier: every URL a crawl has discovered, in discovery order, in SQLite.
+
+URLs are normalized and deduplicated when they are queued, so a link found on
+thousands of pages is stored once, and the queue lives on disk rather than in
+memory. The crawler commits a checkpoint every few pages: the pages finished
+since the last one, the URLs they discovered, and the byte length of the JSONL
+output, all in one transaction. Resuming truncates the output to that length
+and re-queues every URL not committed as done, so an interrupted crawl carries
+on exactly from its last checkpoint.
+
+For very large crawls, `bloom_capacity` puts a Bloom filter in front of the
+store. Repeated links are then rejected from memory without a database lookup,
+at the cost of skipping a new URL with probability BLOOM_ERROR_RATE.
+"""
+
+import hashlib
+import math
+import re
+import sqlite3
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+import numpy as np
+
+QUEUED, DONE = 0, 1
+POP_BATCH = 256
+BLOOM_ERROR_RATE = 1e-6
+DEFAULT_PORTS = {"http": 80, "https": 443}
+_UNRESERVED = re.compile(r"[A-Za-z0-9\-._~]")
+_PERCENT = re.compile(r"%[0-9A-Fa-f]{2}")
+
+
+def _percent(match):
+    char = chr(int(match.group()[1:], 16))
+    return char if _UNRESERVED.fullmatch(char) else match.group().upper()
+
+
+def normalize_url(url):
+    """Lowercase scheme and host, no default port or fragment, "/" for an empty path, canonical %-escapes."""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{parts.port}"
+    if parts.username:
+        netloc = parts.username + (f":{parts.password}" if parts.password else "") + "@" + netloc
+    path = _PERCENT.sub(_percent, parts.path) or "/"
+    return urlunsplit((scheme, netloc, path, _PERCENT.sub(_percent, parts.query), ""))
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Adds `item`; returns False when it was (probably) present already."""
+        added = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] >> bit & 1:
+                self.bits[byte] |= 1 << bit
+                added = True
+        return added
+
+
+class Frontier:
+    def __init__(self, path, bloom_capacity=None):
+        self.path = path
+        # The crawler opens the frontier on the event loop and then uses it from its I/O thread, one call at a time.
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS urls (seq INTEGER PRIMARY KEY, url TEXT UNIQUE, state INTEGER, change TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        self._cursor = 0
+        self._buffer = deque()
+
+        self.bloom = None
+        if bloom_capacity:
+            self.bloom = BloomFilter(max(bloom_capacity, self._size))
+            for url, in self._db.execute("SELECT url FROM urls"):
+                self.bloom.add(url)
+
+    def __len__(self):
+        return self._size
+
+    def meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def add(self, url):
+        """Queues `url` unless an equivalent URL was queued before; returns whether it was new."""
+        url = normalize_url(url)
+        if self.bloom is not None and not self.bloom.add(url):
+            return False
+        added = self._db.execute("INSERT OR IGNORE INTO urls (url, state) VALUES (?, ?)", (url, QUEUED)).rowcount == 1
+        self._size += added
+        return added
+
+    def pop(self):
+        """The next queued URL in discovery order, or None when none is queued right now."""
+        if not self._buffer:
+            rows = self._db.execute("SELECT seq, url FROM urls WHERE seq > ? AND state = ? ORDER BY seq LIMIT ?",
+                                    (self._cursor, QUEUED, POP_BATCH)).fetchall()
+            if not rows:
+                return None
+            self._cursor = rows[-1][0]
+            self._buffer.extend(url for _, url in rows)
+        return self._buffer.popleft()
+
+    def complete(self, url, change=None):
+        """Marks a popped URL done, with how its content changed since the previous crawl (see async_scraper)."""
+        self._db.execute("UPDATE urls SET state = ?, change = ? WHERE url = ?", (DONE, change, url))
+
+    def checkpoint(self, output_bytes):
+        """Commits everything since the last checkpoint together with the length of the output file."""
+        self.set_meta("output_bytes", output_bytes)
+        self._db.commit()
+
+    def counts(self):
+        done, queued = self._db.execute("SELECT COALESCE(SUM(state = ?), 0), COALESCE(SUM(state = ?), 0) FROM urls",
+                                        (DONE, QUEUED)).fetchone()
+        return {"done": done, "queued": queued}
+
+    def changes(self):
+        """Finished URLs grouped by change, in discovery order."""
+        changes = {"added": [], "changed": [], "removed": [], "unchanged": []}
+        for url, change in self._db.execute("SELECT url, change FROM urls WHERE change IS NOT NULL ORDER BY seq"):
+            changes[change].append(url)
+        return changes
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
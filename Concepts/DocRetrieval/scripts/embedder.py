@@ -0,0 +1,202 @@
+"""
+The one embedder shared by the index builders, the query scripts and the API.
+`Embedder` owns the tokenizer, pooling, normalization and batching; its id and
+manifest record those choices so an index can be checked against the embedder
+that queries it.
+
+For index builds, chunks are sorted by token length and grouped so every batch
+is padded only to its own longest chunk, and batches can be spread over worker
+processes that each run torch with a fixed number of threads.
+"""
+
+import json
+import os
+import time
+import numpy as np
+from multiprocessing import get_context
+from config import EMBED_MODEL
+
+MAX_LENGTH = 512
+# Bump whenever tokenization or pooling code changes the vectors an embedder produces.
+EMBEDDER_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+# Fields that must match between an index and the embedder searching it.
+MANIFEST_KEYS = ("embedder_version", "model", "pooling", "normalize", "max_length")
+
+# Keyed by model name, so embedders of different models can share a process.
+_tokenizers = {}
+_models = {}
+
+
+def load_tokenizer(model_name=EMBED_MODEL):
+    if model_name not in _tokenizers:
+        from transformers import AutoTokenizer
+        _tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+    return _tokenizers[model_name]
+
+
+def load_model(model_name=EMBED_MODEL, num_threads=None):
+    if model_name not in _models:
+        import torch
+        from transformers import AutoModel
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        model.eval()
+        _models[model_name] = model
+    return load_tokenizer(model_name), _models[model_name]
+
+
+def pool(last_hidden, attention_mask, pooling):
+    """`mean` averages non-padding tokens, `cls` takes the first token."""
+    if pooling == "cls":
+        return last_hidden[:, 0, :]
+    mask = attention_mask.unsqueeze(-1).to(last_hidden.dtype)
+    return (last_hidden * mask).sum(dim=1) / mask.sum(dim=1)
+
+
+def embed_batch(texts, pooling="mean", normalize=True, max_length=MAX_LENGTH, model_name=EMBED_MODEL):
+    """Embeds one batch, padded to its longest text rather than to `max_length`."""
+    import torch
+    tokenizer, model = load_model(model_name)
+    inputs = tokenizer(texts, return_tensors="pt", truncation=True, max_length=max_length, padding="longest")
+    with torch.no_grad():
+        outputs = model(**inputs)
+        embeddings = pool(outputs.last_hidden_state, inputs["attention_mask"], pooling)
+        if normalize:
+            embeddings = embeddings / embeddings.norm(dim=-1, keepdim=True)
+    return embeddings.numpy().astype("float32")
+
+
+def length_sorted_batches(lengths, batch_size, max_batch_tokens=None):
+    """Groups indices of similar token length; a batch stops growing at `batch_size` or `max_batch_tokens` padded tokens."""
+    order = np.argsort(lengths, kind="stable")
+    batch = []
+    for i in order:
+        # Lengths are ascending, so the newest item sets the padded length of the batch.
+        if batch and (len(batch) == batch_size or
+                      (max_batch_tokens and (len(batch) + 1) * lengths[i] > max_batch_tokens)):
+            yield batch
+            batch = []
+        batch.append(int(i))
+    if batch:
+        yield batch
+
+
+def _init_worker(model_name, threads_per_worker):
+    load_model(model_name, threads_per_worker)
+
+
+def _embed_job(job):
+    batch_id, texts, pooling, normalize, max_length, model_name = job
+    return batch_id, embed_batch(texts, pooling, normalize, max_length, model_name)
+
+
+def embed_texts(texts, pooling="mean", normalize=True, batch_size=32, workers=1,
+                threads_per_worker=None, max_batch_tokens=16384, model_name=EMBED_MODEL, max_length=MAX_LENGTH):
+    """Embeds `texts` and returns a float32 matrix in the original order, reporting chunks/sec."""
+    if not texts:
+        return np.zeros((0, 0), dtype="float32")
+
+    tokenizer = load_tokenizer(model_name)
+    lengths = [len(ids) for ids in tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]]
+    batches = list(length_sorted_batches(lengths, batch_size, max_batch_tokens))
+    jobs = [(b, [texts[i] for i in batch], pooling, normalize, max_length, model_name)
+            for b, batch in enumerate(batches)]
+    print(f"🔹 Embedding {len(texts)} chunks in {len(batches)} batches with {workers} worker(s)")
+
+    vectors = None
+    done = 0
+    start = time.perf_counter()
+
+    def collect(batch_id, embeddings):
+        nonlocal vectors, done
+        if vectors is None:
+            vectors = np.zeros((len(texts), embeddings.shape[1]), dtype="float32")
+        vectors[batches[batch_id]] = embeddings
+        done += len(batches[batch_id])
+        if batch_id % 20 == 0 or done == len(texts):
+            rate = done / (time.perf_counter() - start)
+            print(f"✅ Embedded {done}/{len(texts)} chunks ({rate:.1f} chunks/sec)")
+
+    if workers > 1:
+        with get_context("spawn").Pool(workers, initializer=_init_worker,
+                                       initargs=(model_name, threads_per_worker)) as pool_:
+            for batch_id, embeddings in pool_.imap_unordered(_embed_job, jobs):
+                collect(batch_id, embeddings)
+    else:
+        load_model(model_name, threads_per_worker)
+        for job in jobs:
+            collect(*_embed_job(job))
+
+    elapsed = time.perf_counter() - start
+    print(f"⏱️ Embedded {len(texts)} chunks in {elapsed:.1f}s ({len(texts) / elapsed:.1f} chunks/sec)")
+    return vectors
+
+
+class Embedder:
+    """A model plus the pooling/normalization applied to it; identical settings give identical vectors."""
+
+    def __init__(self, model_name=EMBED_MODEL, pooling="mean", normalize=True, max_length=MAX_LENGTH):
+        self.model_name = model_name
+        self.pooling = pooling
+        self.normalize = normalize
+        self.max_length = max_length
+
+    @classmethod
+    def from_manifest(cls, manifest):
+        return cls(manifest["model"], manifest["pooling"], manifest["normalize"], manifest["max_length"])
+
+    @property
+    def id(self):
+        return f"{self.model_name}|{self.pooling}|{'norm' if self.normalize else 'raw'}|{self.max_length}|v{EMBEDDER_VERSION}"
+
+    def load(self, num_threads=None):
+        load_model(self.model_name, num_threads)
+        return self
+
+    def embed(self, texts):
+        """One padded forward pass over `texts`; use `embed_texts` for large inputs."""
+        return embed_batch(texts, self.pooling, self.normalize, self.max_length, self.model_name)
+
+    def embed_texts(self, texts, **batching):
+        """Length-bucketed, optionally multi-process embedding; see the module-level `embed_texts`."""
+        return embed_texts(texts, self.pooling, self.normalize, model_name=self.model_name,
+                           max_length=self.max_length, **batching)
+
+    def manifest(self, dim, metric, chunker=None):
+        return {
+            "embedder_version": EMBEDDER_VERSION,
+            "model": self.model_name,
+            "pooling": self.pooling,
+            "normalize": self.normalize,
+            "max_length": self.max_length,
+            "dim": int(dim),
+            "metric": metric,
+            "chunker": chunker,
+        }
+
+
+def write_manifest(index_dir, manifest):
+    with open(os.path.join(index_dir, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(index_dir):
+    """The index's manifest, or None for indexes built before manifests existed."""
+    path = os.path.join(index_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_manifest(manifest, embedder, dim=None):
+    """Raises ValueError when the index was built with a different embedder than the one querying it."""
+    expected = embedder.manifest(dim or manifest.get("dim", 0), manifest.get("metric"))
+    mismatches = [f"{key}: index {manifest.get(key)!r} != embedder {expected[key]!r}"
+                  for key in MANIFEST_KEYS if manifest.get(key) != expected[key]]
+    if dim is not None and manifest.get("dim") != dim:
+        mismatches.append(f"dim: manifest {manifest.get('dim')} != index {dim}")
+    if mismatches:
+        raise ValueError("Index/embedder mismatch (" + "; ".join(mismatches) + ")")
@@ -0,0 +1,129 @@
+"""
+Persistent, content-addressed cache for index builds.
+Chunk vectors are keyed by hash(embedder id, chunk text), where the embedder id
+covers model, pooling, normalization and truncation,
+and document chunkings by hash(chunker id, document content), so a rebuild only
+chunks and embeds documents that changed. Removed chunks simply stop being
+looked up and drop out of the rebuilt index; `prune()` reclaims their space.
+Lookups and writes are batched, and nothing is committed until `commit()` or
+`close()`, so a build commits once per shard rather than once per document.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+import numpy as np
+
+SQL_BATCH = 500
+
+
+def content_key(*parts):
+    return hashlib.sha256("\x00".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, used REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunks (key TEXT PRIMARY KEY, chunks TEXT, used REAL)")
+        self._db.commit()
+
+    def _get(self, table, column, keys):
+        found = {}
+        now = time.time()
+        for start in range(0, len(keys), SQL_BATCH):
+            batch = keys[start:start + SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            rows = self._db.execute(f"SELECT key, {column} FROM {table} WHERE key IN ({marks})", batch).fetchall()
+            found.update(rows)
+            self._db.execute(f"UPDATE {table} SET used = ? WHERE key IN ({marks})", [now, *batch])
+        return found
+
+    def get_vectors(self, keys):
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in self._get("embeddings", "vector", keys).items()}
+
+    def put_vectors(self, items):
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+            ((key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items),
+        )
+
+    def get_chunks(self, keys):
+        return {key: json.loads(chunks) for key, chunks in self._get("chunks", "chunks", keys).items()}
+
+    def put_chunks(self, items):
+        now = time.time()
+        self._db.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)",
+                             ((key, json.dumps(chunks), now) for key, chunks in items))
+
+    def commit(self):
+        self._db.commit()
+
+    def prune(self, older_than_days=30):
+        """Deletes entries no build has used in `older_than_days`."""
+        cutoff = time.time() - older_than_days * 86400
+        removed = 0
+        for table in ("embeddings", "chunks"):
+            removed += self._db.execute(f"DELETE FROM {table} WHERE used < ?", (cutoff,)).rowcount
+        self._db.commit()
+        self._db.execute("VACUUM")
+        return removed
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+
+def chunk_with_cache(contents, cache, chunker_id, chunk_fn):
+    """
+    Chunks of each of `contents`, in order, running `chunk_fn` only on contents this chunker has not chunked before.
+    An entry is None when `chunk_fn` raised for that content.
+    """
+    keys = [content_key(chunker_id, content) for content in contents]
+    cached = cache.get_chunks(list(set(keys)))
+    new = {}
+    for key, content in zip(keys, contents):
+        if key in cached or key in new:
+            continue
+        try:
+            new[key] = chunk_fn(content)
+        except Exception as e:
+            print(f"❌ Error chunking content: {e}")
+            cached[key] = None
+    cache.put_chunks(new.items())
+    cached.update(new)
+    return [cached[key] for key in keys]
+
+
+def embed_with_cache(texts, cache, embedder, **batching):
+    """Returns `embedder`'s vectors for `texts` in order, embedding only texts not already in the cache."""
+    keys = [content_key(embedder.id, text) for text in texts]
+    cached = cache.get_vectors(list(set(keys)))
+    missing = list(dict.fromkeys(key for key in keys if key not in cached))
+    hits = sum(key in cached for key in keys)
+    print(f"🔹 Embedding cache: {hits} hits, {len(missing)} chunks to embed")
+
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        vectors = embedder.embed_texts([text_by_key[key] for key in missing], **batching)
+        cache.put_vectors(zip(missing, vectors))
+        cached.update(zip(missing, vectors))
+
+    if not texts:
+        return np.zeros((0, 0), dtype="float32")
+    return np.stack([cached[key] for key in keys]).astype("float32")
+
+
+if __name__ == "__main__":
+    import sys
+    from config import EMBED_CACHE_PATH
+
+    # Usage: python embedding_cache.py [days]  — drops cache entries unused for `days` (default 30)
+    cache = EmbeddingCache(EMBED_CACHE_PATH)
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    print(f"🗑️ Pruned {cache.prune(days)} cache entries unused for {days:g} days")
+    cache.close()
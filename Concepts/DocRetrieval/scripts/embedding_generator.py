@@ -1,15 +1,18 @@
 """
 Processes scraped_docs.json → Generates FAISS embeddings & metadata → Builds FAISS index.
-Deletes embeddings.npy after indexing.
+Deletes embeddings.npy after indexing. Chunks and vectors are cached in EMBED_CACHE_PATH,
+so a rebuild only embeds documents that changed since the last build.
 """
 
 import json
 import numpy as np
-import faiss
 import os
-import torch
-from transformers import AutoTokenizer, AutoModel
-from config import EMBED_MODEL
+from config import EMBED_MODEL, EMBED_BATCH_SIZE, EMBED_WORKERS, EMBED_THREADS_PER_WORKER, EMBED_CACHE_PATH
+from embedder import Embedder, load_tokenizer, write_manifest
+from embedding_cache import EmbeddingCache, chunk_with_cache, embed_with_cache
+from index_builder import index_params, build_and_report
+from bm25_index import build_from_store
+from metadata_store import STORE_DIRNAME, write_metadata_store, open_metadata_store
 
 library = "Numpy"
 
@@ -25,14 +28,15 @@ LIB_PATH = {
 DATA_DIR = "../data"
 DOCS_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "scraped_docs.json")
 EMBED_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "embeddings.npy")
-META_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "faiss_metadata.npy")
+META_PATH = os.path.join(DATA_DIR, LIB_PATH[library], STORE_DIRNAME)
 FAISS_INDEX_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "faiss_index.bin")
 
 
-tokenizer = AutoTokenizer.from_pretrained(EMBED_MODEL, trust_remote_code=True)
-model = AutoModel.from_pretrained(EMBED_MODEL, trust_remote_code=True)
+tokenizer = load_tokenizer()
+embedder = Embedder(EMBED_MODEL, pooling="mean", normalize=True)
 
 MAX_TOKENS = 510 
+CHUNKER_ID = f"tokens:{EMBED_MODEL}:{MAX_TOKENS}"
 
 def chunk_text(text, max_tokens=MAX_TOKENS):
     """Chunks text into segments based on token limits."""
@@ -45,30 +49,6 @@ def chunk_text(text, max_tokens=MAX_TOKENS):
     return chunks
 
 
-def generate_embedding(text):
-    """Generates a pooled embedding with proper token limits and attention masking."""
-    inputs = tokenizer(
-        text,
-        return_tensors="pt",
-        truncation=True,
-        max_length=512,
-        padding="max_length"
-    )
-    
-    with torch.no_grad():
-        outputs = model(**inputs)
-        last_hidden = outputs.last_hidden_state 
-        attention_mask = inputs["attention_mask"].unsqueeze(-1) 
-
-        masked_hidden = last_hidden * attention_mask
-        summed = masked_hidden.sum(dim=1)
-        counts = attention_mask.sum(dim=1)
-        mean_pooled = summed / counts  
-        embedding = mean_pooled[0]
-        embedding = embedding / embedding.norm() 
-        return embedding.numpy().astype('float32')
-
-
 def process_json_and_generate_embeddings():
     """Processes the JSON file, generates embeddings, and saves metadata."""
     try:
@@ -79,61 +59,62 @@ def process_json_and_generate_embeddings():
         print(f"❌ Error loading {DOCS_PATH}: {e}")
         return
     
-    all_embeddings = []
+    cache = EmbeddingCache(EMBED_CACHE_PATH)
     all_metadata = []
+    all_chunks = chunk_with_cache([doc.get("content", "") for doc in docs], cache, CHUNKER_ID, chunk_text)
 
-    for i, doc in enumerate(docs):
+    for i, (doc, chunks) in enumerate(zip(docs, all_chunks)):
         doc_id = i  
         url = doc.get("url", "")
-        content = doc.get("content", "")
-
-        try:
-            chunks = chunk_text(content)
-            for idx, chunk in enumerate(chunks):
-                embedding = generate_embedding(chunk)
-                all_embeddings.append(embedding)
-                all_metadata.append({
-                    "doc_id": doc_id,  
-                    "url": url,
-                    "chunk_index": idx,
-                    "text": chunk  
-                })
-
-            if i == 0:
-                print("\n🔹 Sample Embedding Output (First 10 dimensions):")
-                print(embedding[:10])
-
-            if (i + 1) % 5 == 0:
-                print(f"✅ Processed {i + 1}/{len(docs)} documents")
-                
-        except Exception as e:
-            print(f"❌ Error processing document {i}: {e}")
+
+        if chunks is None:
+            print(f"❌ Error processing document {i}")
+            continue
+        for idx, chunk in enumerate(chunks):
+            all_metadata.append({
+                "doc_id": doc_id,  
+                "url": url,
+                "chunk_index": idx,
+                "text": chunk  
+            })
+
+    print(f"✅ Chunked {len(docs)} documents into {len(all_metadata)} chunks")
+
+    all_embeddings = embed_with_cache(
+        [meta["text"] for meta in all_metadata],
+        cache,
+        embedder,
+        batch_size=EMBED_BATCH_SIZE,
+        workers=EMBED_WORKERS,
+        threads_per_worker=EMBED_THREADS_PER_WORKER,
+    )
+    cache.close()
+    if len(all_embeddings):
+        print("\n🔹 Sample Embedding Output (First 10 dimensions):")
+        print(all_embeddings[0][:10])
 
     try:
-        np.save(EMBED_PATH, np.array(all_embeddings))
-        np.save(META_PATH, np.array(all_metadata, dtype=object))
+        np.save(EMBED_PATH, all_embeddings)
+        write_metadata_store(META_PATH, all_metadata)
         print(f"💾 Saved embeddings to {EMBED_PATH}")
         print(f"💾 Saved metadata to {META_PATH}")
     except Exception as e:
         print(f"❌ Error saving .npy files: {e}")
 
 def build_faiss_index():
-    """Builds FAISS index from embeddings and deletes `embeddings.npy` after indexing."""
+    """Builds the configured FAISS index from embeddings and deletes `embeddings.npy` after indexing."""
     try:
         embeddings = np.load(EMBED_PATH)
-        metadata = np.load(META_PATH, allow_pickle=True)
+        metadata = open_metadata_store(META_PATH)
         
         assert len(embeddings) == len(metadata), "❌ Embeddings and metadata count mismatch."
         embeddings = embeddings.astype('float32')
 
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-
-        index.add(embeddings)
+        index = build_and_report(embeddings, index_params(library, "l2"), os.path.dirname(FAISS_INDEX_PATH))
+        write_manifest(os.path.dirname(FAISS_INDEX_PATH), embedder.manifest(index.d, "l2", CHUNKER_ID))
         print(f"✅ FAISS index built with {index.ntotal} vectors.")
-
-        faiss.write_index(index, FAISS_INDEX_PATH)
         print(f"💾 FAISS index saved to {FAISS_INDEX_PATH}")
+        build_from_store(os.path.dirname(FAISS_INDEX_PATH))
         
         if os.path.exists(EMBED_PATH):
             os.remove(EMBED_PATH)
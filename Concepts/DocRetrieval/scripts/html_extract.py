@@ -0,0 +1,251 @@
+"""
+Single-pass page extraction on lxml's C parser, a drop-in for `scraper.extract_page`.
+
+One walk over the tree collects the links (including those inside excluded
+regions, as before), skips the `exclude_selectors` regions, finds the
+`content_selector` element and builds the text of every `content_tags` element.
+Each text node is stripped once and appended to every open content element,
+rather than calling `get_text` per element. On well-formed pages the output
+matches the BeautifulSoup extractor: the same deduplicated, newline-joined
+texts, with strings from <script>/<style>/<template> and comments left out.
+On malformed markup (e.g. a <div> inside a <p>) lxml applies HTML's implied
+end tags where html.parser does not; the benchmark reports how many pages match.
+
+`reextract` re-runs extraction over a site's cached raw pages (http_cache.py)
+in a process pool, e.g. after changing its SITE_CONFIG selectors.
+
+Usage: python html_extract.py <site number> [out.jsonl] [workers]         (re-extract from the cache)
+       python html_extract.py bench <site number> [pages_dir] [workers]   (pages/sec vs BeautifulSoup)
+"""
+
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+from multiprocessing import get_context
+from urllib.parse import urljoin, urldefrag
+import lxml.html
+from lxml import etree
+from config import SITE_CONFIG
+from scraper import site_options, is_valid_url
+from http_cache import HttpCache, cache_path
+
+# bs4's get_text() leaves out strings inside these tags
+SKIP_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+
+
+def _matches(el, selector):
+    """bs4 `find(name, attrs)` semantics for plain string attrs; `class` matches any one of the classes."""
+    if el.tag != selector["name"]:
+        return False
+    for attr, value in selector["attrs"].items():
+        actual = el.get(attr)
+        if actual is None or (actual != value and not (attr == "class" and value in actual.split())):
+            return False
+    return True
+
+
+def extract_page(html, url, options):
+    """Parses a page once and returns `(content, links)`, like `scraper.extract_page`."""
+    try:
+        root = lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        return "", []
+
+    prefixes = tuple(options["valid_link_prefix"])
+    content_tags = set(options["content_tags"])
+    content_selector = options["content_selector"]
+    exclude_selectors = options["exclude_selectors"]
+
+    links = {}
+    texts = []       # [inside main content, text] per content element, in document order
+    open_parts = []  # text parts of the content elements currently open
+    main = None
+    in_main = excluded = skipped = 0
+
+    def emit(text):
+        if text and open_parts and not excluded and not skipped:
+            text = text.strip()
+            if text:
+                for parts in open_parts:
+                    parts.append(text)
+
+    def enter(el):
+        """Opens an element; returns what `leave` has to undo."""
+        nonlocal main, in_main, excluded, skipped
+        tag = el.tag
+        if tag == "a":
+            href = el.get("href")
+            if href is not None:
+                link, _ = urldefrag(urljoin(url, href))
+                if link.startswith(prefixes) and is_valid_url(link):
+                    links[link] = None
+
+        state = []
+        if excluded or any(_matches(el, selector) for selector in exclude_selectors):
+            excluded += 1
+            state.append("excluded")
+        else:
+            if tag in content_tags:
+                texts.append([in_main > 0, None])
+                open_parts.append([])
+                state.append(len(texts) - 1)
+            if main is None and _matches(el, content_selector):
+                main = el
+                in_main += 1
+                state.append("main")
+        if tag in SKIP_TEXT_TAGS:
+            skipped += 1
+            state.append("skipped")
+        emit(el.text)
+        return state
+
+    def leave(state):
+        nonlocal in_main, excluded, skipped
+        for item in state:
+            if item == "excluded":
+                excluded -= 1
+            elif item == "main":
+                in_main -= 1
+            elif item == "skipped":
+                skipped -= 1
+            else:
+                texts[item][1] = " ".join(open_parts.pop())
+
+    # Explicit stack of (children, enter state, tail): iterwalk would skip comments and the text after them
+    stack = [(iter(root), enter(root), None)]
+    while stack:
+        children, state, tail = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            leave(state)
+            emit(tail)
+            continue
+        if not isinstance(child.tag, str):
+            # Comments and processing instructions: only their tail is text
+            emit(child.tail)
+            continue
+        stack.append((iter(child), enter(child), child.tail))
+
+    if main is None:
+        print(f"[⚠️] No specific content found for {url}, scraping entire page.")
+    texts = [text for inside, text in texts if text and (inside or main is None)]
+    content = "\n".join(list(dict.fromkeys(texts)))
+
+    if len(content.strip()) < 50:
+        print(f"[⚠️] Extracted content from {url} seems too short or generic.")
+        content = ""
+
+    return content, list(links)
+
+
+_worker = {}
+
+
+def _init_worker(options, cache_file):
+    _worker.update(options=options, cache=HttpCache(cache_file, read_only=True) if cache_file else None)
+
+
+def _extract_cached(url):
+    return (url, *extract_page(_worker["cache"].body(url), url, _worker["options"]))
+
+
+def _extract_body(item):
+    url, body = item
+    return extract_page(body, url, _worker["options"])
+
+
+def extraction_pool(options, workers=None, cache_file=None):
+    """Spawned extraction workers; with `cache_file` each opens it read-only, so only URLs cross process boundaries."""
+    return get_context("spawn").Pool(workers or os.cpu_count(), initializer=_init_worker, initargs=(options, cache_file))
+
+
+def reextract(site_config, out_path="py_scraped_data.jsonl", workers=None):
+    """Extracts every cached page of a site again, in parallel, streaming `{"url", "content"}` lines to `out_path`."""
+    cache = HttpCache(cache_path(site_config))
+    urls = cache.urls()
+    cache.close()
+
+    start = time.perf_counter()
+    pages = 0
+    with extraction_pool(site_options(site_config), workers, cache_path(site_config)) as pool, open(out_path, "w") as f:
+        for url, content, _ in pool.imap(_extract_cached, urls, chunksize=16):
+            if content:
+                f.write(json.dumps({"url": url, "content": content}) + "\n")
+                pages += 1
+
+    elapsed = time.perf_counter() - start
+    print(f"[✅] Re-extracted {pages}/{len(urls)} cached pages of {site_config['name']} "
+          f"in {elapsed:.1f}s ({len(urls) / elapsed:.1f} pages/sec).")
+    return pages
+
+
+def saved_pages(site_config, pages_dir=None):
+    """`(url, html)` pairs from a directory of saved .html files, or from the site's HTTP cache."""
+    if pages_dir:
+        paths = sorted(glob.glob(os.path.join(pages_dir, "**", "*.html"), recursive=True))
+        pages = []
+        for path in paths:
+            with open(path, "rb") as f:
+                pages.append((urljoin(site_config["base_url"], os.path.relpath(path, pages_dir).replace(os.sep, "/")), f.read()))
+        return pages
+    cache = HttpCache(cache_path(site_config))
+    pages = [(url, cache.body(url)) for url in cache.urls()]
+    cache.close()
+    return pages
+
+
+def _pages_per_sec(extract, pages, options):
+    results = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(None):
+        for url, html in pages:
+            results.append(extract(html, url, options))
+    return len(pages) / (time.perf_counter() - start), results
+
+
+def benchmark(site_config, pages_dir=None, workers=None):
+    """pages/sec of the BeautifulSoup extractor, this one, and this one in a process pool, on the same saved pages."""
+    from scraper import extract_page as bs4_extract_page
+
+    pages = saved_pages(site_config, pages_dir)
+    if not pages:
+        raise ValueError(f"No saved pages for {site_config['name']}; crawl it first or pass a directory of .html files")
+    options = site_options(site_config)
+
+    bs4_rate, expected = _pages_per_sec(bs4_extract_page, pages, options)
+    lxml_rate, found = _pages_per_sec(extract_page, pages, options)
+    identical = sum(a[0] == b[0] and set(a[1]) == set(b[1]) for a, b in zip(expected, found))
+
+    workers = workers or os.cpu_count()
+    with contextlib.redirect_stdout(None), extraction_pool(options, workers) as pool:
+        pool.map(_extract_body, pages[:workers])  # workers are spawned lazily; keep start-up out of the timing
+        start = time.perf_counter()
+        pool.map(_extract_body, pages, chunksize=16)
+        pool_rate = len(pages) / (time.perf_counter() - start)
+
+    report = {
+        "pages": len(pages),
+        "bytes": sum(len(html) for _, html in pages),
+        "bs4_pages_per_sec": bs4_rate,
+        "lxml_pages_per_sec": lxml_rate,
+        "pool_pages_per_sec": pool_rate,
+        "workers": workers,
+        "identical_output": identical / len(pages),
+    }
+    print(f"📊 {len(pages)} pages: BeautifulSoup {bs4_rate:.1f} pages/sec, lxml {lxml_rate:.1f} pages/sec "
+          f"({lxml_rate / bs4_rate:.1f}x), {workers} workers {pool_rate:.1f} pages/sec; "
+          f"{identical}/{len(pages)} identical")
+    print(json.dumps(report))
+    return report
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "bench":
+        benchmark(SITE_CONFIG[int(sys.argv[2])], sys.argv[3] if len(sys.argv) > 3 else None,
+                  int(sys.argv[4]) if len(sys.argv) > 4 else None)
+    else:
+        reextract(SITE_CONFIG[int(sys.argv[1])], *sys.argv[2:3], *[int(arg) for arg in sys.argv[3:4]])
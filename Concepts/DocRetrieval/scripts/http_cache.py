@@ -0,0 +1,125 @@
+"""
+On-disk HTTP cache for re-crawls, one SQLite file per SITE_CONFIG entry.
+For every page it keeps the validators (ETag, Last-Modified), a sha256 of the
+body, the zlib-compressed body, and the content and links extracted from it.
+A re-crawl sends If-None-Match / If-Modified-Since; on a 304, or a 200 whose
+body hash is unchanged, the stored content and links are reused without
+parsing. Each crawl stamps the pages it saw, so pages it no longer reaches can
+be reported as removed and dropped.
+
+Usage: python http_cache.py <site number>   (prints what the cache holds)
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import zlib
+from config import HTTP_CACHE_DIR
+
+
+def cache_path(site_config, cache_dir=HTTP_CACHE_DIR):
+    return os.path.join(cache_dir, re.sub(r"[^a-z0-9]+", "_", site_config["name"].lower()) + ".sqlite")
+
+
+def body_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+class HttpCache:
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.crawl = None
+        if read_only:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Like the frontier, written from async_scraper's I/O thread after being opened on the event loop.
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                         "body_hash TEXT, body BLOB, content TEXT, links TEXT, crawl INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS crawls (id INTEGER PRIMARY KEY AUTOINCREMENT, started REAL, finished REAL)")
+        self._db.commit()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def start_crawl(self, crawl=None):
+        """Starts a new crawl, or continues an interrupted one given its id."""
+        if crawl is not None and self._db.execute("SELECT 1 FROM crawls WHERE id = ?", (crawl,)).fetchone():
+            self.crawl = crawl
+            return crawl
+        self.crawl = self._db.execute("INSERT INTO crawls (started) VALUES (?)", (time.time(),)).lastrowid
+        self._db.commit()
+        return self.crawl
+
+    def get(self, url):
+        row = self._db.execute("SELECT etag, last_modified, body_hash, content, links FROM pages WHERE url = ?",
+                               (url,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, digest, content, links = row
+        return {"etag": etag, "last_modified": last_modified, "body_hash": digest,
+                "content": content, "links": json.loads(links)}
+
+    def body(self, url):
+        """The cached raw HTML of `url`, or None."""
+        row = self._db.execute("SELECT body FROM pages WHERE url = ?", (url,)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def urls(self):
+        return [url for url, in self._db.execute("SELECT url FROM pages ORDER BY url")]
+
+    @staticmethod
+    def validators(entry):
+        """Conditional request headers for a cached entry."""
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, etag, last_modified, digest, body, content, links):
+        self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (url, etag, last_modified, digest, zlib.compress(body), content,
+                          json.dumps(links), self.crawl))
+
+    def touch(self, url, etag=None, last_modified=None):
+        """Marks a cached page as seen by this crawl, refreshing its validators when new ones arrived."""
+        self._db.execute("UPDATE pages SET crawl = ?, etag = COALESCE(?, etag), "
+                         "last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                         (self.crawl, etag, last_modified, url))
+
+    def last_crawl(self):
+        """`(id, started, finished)` of the most recent crawl, or None."""
+        return self._db.execute("SELECT id, started, finished FROM crawls ORDER BY id DESC LIMIT 1").fetchone()
+
+    def commit(self):
+        self._db.commit()
+
+    def finish_crawl(self):
+        """Drops pages this crawl did not reach; returns the URLs among them that had content."""
+        stale = [url for url, in self._db.execute(
+            "SELECT url FROM pages WHERE (crawl IS NULL OR crawl < ?) AND content != ''", (self.crawl,))]
+        self._db.execute("DELETE FROM pages WHERE crawl IS NULL OR crawl < ?", (self.crawl,))
+        self._db.execute("UPDATE crawls SET finished = ? WHERE id = ?", (time.time(), self.crawl))
+        self._db.commit()
+        return stale
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+
+if __name__ == "__main__":
+    from config import SITE_CONFIG
+
+    path = cache_path(SITE_CONFIG[int(sys.argv[1])])
+    cache = HttpCache(path)
+    print(f"📦 {path}: {len(cache)} pages, {os.path.getsize(path) / 2**20:.1f} MB, last crawl {cache.last_crawl()}")
+    cache.close()
@@ -0,0 +1,182 @@
+"""
+Builds FAISS indexes from an `index_factory` string configured per library in
+`config.INDEX_CONFIG`, and measures them against the exact flat index.
+
+Next to `faiss_index.bin` a build writes:
+  index_config.json  factory, metric and search-time params the server applies on load
+  index_report.json  recall@25 vs exact search, per-query latency and serialized size
+
+Usage: python index_builder.py <embeddings.npy> <factory> [l2|ip] [nprobe=N] [efSearch=N]   (report only)
+"""
+
+import json
+import os
+import sys
+import time
+import numpy as np
+import faiss
+from config import INDEX_CONFIG
+
+INDEX_CONFIG_FILENAME = "index_config.json"
+INDEX_REPORT_FILENAME = "index_report.json"
+SEARCH_PARAMS = ("nprobe", "efSearch")
+MAX_TRAIN_VECTORS = 100_000
+HELD_OUT_QUERIES = 500
+REPORT_K = 25
+
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+
+
+def index_params(library, metric):
+    """Merges the library's INDEX_CONFIG entry over the defaults."""
+    params = {**INDEX_CONFIG["default"], **INDEX_CONFIG.get(library, {})}
+    params["metric"] = metric
+    return params
+
+
+def create_index(dim, params):
+    return faiss.index_factory(dim, params["factory"], METRICS[params["metric"]])
+
+
+def train_index(index, vectors, held_out=None, seed=0):
+    """Trains on up to MAX_TRAIN_VECTORS rows, never on the held-out query rows."""
+    if index.is_trained:
+        return index
+    candidates = np.setdiff1d(np.arange(len(vectors)), held_out if held_out is not None else [])
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(candidates, min(len(candidates), MAX_TRAIN_VECTORS), replace=False))
+    start = time.perf_counter()
+    index.train(np.ascontiguousarray(vectors[sample], dtype="float32"))
+    print(f"⏱️ Trained {type(index).__name__} on {len(sample)} vectors in {time.perf_counter() - start:.1f}s")
+    return index
+
+
+def apply_search_params(index, params):
+    """Sets `nprobe` / `efSearch` on any index type that has them; None keeps the FAISS default."""
+    space = faiss.ParameterSpace()
+    for name in SEARCH_PARAMS:
+        if params.get(name) is not None:
+            space.set_index_parameter(index, name, params[name])
+    return index
+
+
+def held_out_rows(n, count=HELD_OUT_QUERIES, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(n, min(n, count), replace=False))
+
+
+def build_index(vectors, params):
+    """Creates, trains and fills an index from a float32 matrix; returns `(index, held_out_rows)`."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    held_out = held_out_rows(len(vectors))
+    index = create_index(vectors.shape[1], params)
+    train_index(index, vectors, held_out)
+    index.add(vectors)
+    apply_search_params(index, params)
+    return index, held_out
+
+
+def search_latency_ms(search, queries, k):
+    """Single-query latency of `search(queries, k)`, matching how the server searches."""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query[None, :], k)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50": float(np.percentile(timings, 50)),
+        "p95": float(np.percentile(timings, 95)),
+        "mean": float(np.mean(timings)),
+    }
+
+
+def evaluate_index(index, exact_index, queries, k=REPORT_K, search=None):
+    """
+    recall@k of `index` against exact search, latency of both, and serialized sizes in bytes.
+    `search(queries, k)` overrides `index.search`, e.g. to add re-scoring.
+    """
+    search = search or index.search
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    _, truth = exact_index.search(queries, k)
+    _, found = search(queries, k)
+    recall = np.mean([len(set(f[f >= 0]) & set(t[t >= 0])) / max(1, (t >= 0).sum()) for f, t in zip(found, truth)])
+    return {
+        f"recall@{k}": float(recall),
+        "queries": len(queries),
+        "latency_ms": search_latency_ms(search, queries, k),
+        "exact_latency_ms": search_latency_ms(exact_index.search, queries, k),
+        "memory_bytes": len(faiss.serialize_index(index)),
+        "exact_memory_bytes": len(faiss.serialize_index(exact_index)),
+    }
+
+
+def evaluate_flat_index(index, queries, k=REPORT_K):
+    """The report for a `Flat` index, which is exact already: no second copy is built to measure recall against."""
+    latency = search_latency_ms(index.search, np.ascontiguousarray(queries, dtype="float32"), k)
+    size = index.ntotal * index.code_size
+    return {
+        f"recall@{k}": 1.0,
+        "queries": len(queries),
+        "latency_ms": latency,
+        "exact_latency_ms": latency,
+        "memory_bytes": size,
+        "exact_memory_bytes": size,
+    }
+
+
+def index_vectors(index):
+    """Stored vectors of an index; IVF indexes need a direct map to reconstruct."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def exact_index_for(vectors, params):
+    exact = faiss.IndexFlat(vectors.shape[1], METRICS[params["metric"]])
+    exact.add(np.ascontiguousarray(vectors, dtype="float32"))
+    return exact
+
+
+def write_index_files(out_dir, index, params, report=None):
+    faiss.write_index(index, os.path.join(out_dir, "faiss_index.bin"))
+    with open(os.path.join(out_dir, INDEX_CONFIG_FILENAME), "w") as f:
+        json.dump({"factory": params["factory"], "metric": params["metric"], "rescore": params.get("rescore"),
+                   **{name: params.get(name) for name in SEARCH_PARAMS}}, f, indent=2)
+    if report is not None:
+        with open(os.path.join(out_dir, INDEX_REPORT_FILENAME), "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def print_report(params, report):
+    latency, exact_latency = report["latency_ms"], report["exact_latency_ms"]
+    print(f"📊 {params['factory']}: recall@{REPORT_K} {report[f'recall@{REPORT_K}']:.3f}, "
+          f"p50 {latency['p50']:.2f} ms (exact {exact_latency['p50']:.2f} ms), "
+          f"{report['memory_bytes'] / 2**20:.1f} MB (exact {report['exact_memory_bytes'] / 2**20:.1f} MB)")
+
+
+def build_and_report(vectors, params, out_dir):
+    """Builds the configured index, evaluates it on held-out rows and writes index, config and report."""
+    index, held_out = build_index(vectors, params)
+    queries = np.asarray(vectors)[held_out]
+    if params["factory"] == "Flat":
+        report = evaluate_flat_index(index, queries)
+    else:
+        report = evaluate_index(index, exact_index_for(vectors, params), queries)
+    report.update(params)
+    write_index_files(out_dir, index, params, report)
+    print_report(params, report)
+    return index
+
+
+if __name__ == "__main__":
+    embeddings = np.load(sys.argv[1], mmap_mode="r")
+    params = {"factory": sys.argv[2], "metric": "l2"}
+    for arg in sys.argv[3:]:
+        if "=" in arg:
+            name, value = arg.split("=")
+            params[name] = int(value)
+        else:
+            params["metric"] = arg
+    index, held_out = build_index(embeddings, params)
+    print_report(params, evaluate_index(index, exact_index_for(embeddings, params), embeddings[held_out]))
@@ -0,0 +1,297 @@
+"""
+Streaming ingestion: scraped docs (JSONL, one {"url", "content"} object per line)
+→ chunks → embeddings → on-disk shards → FAISS index + metadata store.
+
+Docs are read line by line and flushed every SHARD_CHUNKS chunks to a vector
+shard and a metadata shard, followed by a checkpoint recording the byte offset
+of the next unread line. Re-running after a crash resumes from that checkpoint,
+so peak memory is bounded by the shard size instead of the corpus size.
+
+Usage: python ingest.py <library> [chunker] [--restart]
+       python ingest.py --convert <scraped_docs.json> [scraped_docs.jsonl]
+       python ingest.py --update <library> <crawl.manifest.json> [chunker]
+"""
+
+import contextlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import numpy as np
+from config import LIB_PATH, EMBED_MODEL, EMBED_BATCH_SIZE, EMBED_WORKERS, EMBED_THREADS_PER_WORKER, EMBED_CACHE_PATH
+from embedder import Embedder, write_manifest
+from embedding_cache import EmbeddingCache, chunk_with_cache, embed_with_cache
+from metadata_store import STORE_DIRNAME, MetadataStoreWriter, open_metadata_store
+from bm25_index import build_from_store
+from index_builder import (MAX_TRAIN_VECTORS, index_params, create_index, train_index, apply_search_params, held_out_rows,
+                           exact_index_for, evaluate_index, evaluate_flat_index, write_index_files, print_report)
+
+DATA_DIR = "../data"
+SHARD_CHUNKS = 2048
+# Docs read per embedding-cache lookup
+DOC_BATCH = 256
+
+# chunker name → (module defining it, chunk function, pooling, index metric), matching the two generators
+CHUNKERS = {
+    "tokens": ("embedding_generator", "chunk_text", "mean", "l2"),
+    "spacy": ("new_embedding_generator", "semantic_chunk_text", "cls", "ip"),
+}
+
+
+def convert_json_to_jsonl(json_path, jsonl_path=None):
+    """One-off conversion of a `scraped_docs.json` array into the JSONL the pipeline streams."""
+    jsonl_path = jsonl_path or os.path.splitext(json_path)[0] + ".jsonl"
+    with open(json_path, "r") as f:
+        docs = json.load(f)
+    with open(jsonl_path, "w") as f:
+        for doc in docs:
+            f.write(json.dumps(doc) + "\n")
+    print(f"💾 Wrote {len(docs)} docs to {jsonl_path}")
+    return jsonl_path
+
+
+def apply_crawl_manifest(jsonl_path, manifest_path):
+    """
+    Brings scraped_docs.jsonl up to date with a crawl manifest (async_scraper.py):
+    changed pages are rewritten in place, removed ones dropped and added ones
+    appended. Unchanged lines are copied as they are, so on the next ingest their
+    chunks and vectors come straight from the embedding cache. Returns whether anything changed.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if not os.path.exists(jsonl_path):
+        shutil.copyfile(manifest["output"], jsonl_path)
+        print(f"💾 Copied {manifest['output']} to {jsonl_path}")
+        return True
+
+    updated = manifest["added"] + manifest["changed"]
+    removed = set(manifest["removed"])
+    if not updated and not removed:
+        print(f"✅ No pages changed since the last crawl of {manifest['site']}")
+        return False
+
+    wanted = set(updated)
+    content = {}
+    with open(manifest["output"], "r") as f:
+        for line in f:
+            doc = json.loads(line) if line.strip() else {}
+            if doc.get("url") in wanted:
+                content[doc["url"]] = doc["content"]
+
+    tmp_path = jsonl_path + ".tmp"
+    with open(jsonl_path, "r") as src, open(tmp_path, "w") as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            url = json.loads(line).get("url")
+            if url in removed:
+                continue
+            if url in content:
+                line = json.dumps({"url": url, "content": content.pop(url)}) + "\n"
+            dst.write(line)
+        for url in updated:
+            if url in content:
+                dst.write(json.dumps({"url": url, "content": content.pop(url)}) + "\n")
+    os.replace(tmp_path, jsonl_path)
+    print(f"💾 {jsonl_path}: {len(manifest['added'])} added, {len(manifest['changed'])} changed, {len(removed)} removed")
+    return True
+
+
+def _write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class IngestPipeline:
+    def __init__(self, library, chunker="tokens", shard_chunks=SHARD_CHUNKS, data_dir=DATA_DIR):
+        self.lib_dir = os.path.join(data_dir, LIB_PATH[library])
+        self.docs_path = os.path.join(self.lib_dir, "scraped_docs.jsonl")
+        self.shard_dir = os.path.join(self.lib_dir, "ingest_shards")
+        self.checkpoint_path = os.path.join(self.shard_dir, "checkpoint.json")
+        self.meta_path = os.path.join(self.lib_dir, STORE_DIRNAME)
+        self.chunker = chunker
+        self.shard_chunks = shard_chunks
+
+        module, function, pooling, metric = CHUNKERS[chunker]
+        self.embedder = Embedder(EMBED_MODEL, pooling=pooling, normalize=True)
+        self.index_params = index_params(library, metric)
+        module = importlib.import_module(module)
+        self.chunk_fn = getattr(module, function)
+        self.chunker_id = module.CHUNKER_ID
+
+    def _shard_paths(self, shard):
+        return (os.path.join(self.shard_dir, f"vectors_{shard:05d}.npy"),
+                os.path.join(self.shard_dir, f"meta_{shard:05d}"))
+
+    def load_checkpoint(self, restart=False):
+        if restart and os.path.exists(self.shard_dir):
+            shutil.rmtree(self.shard_dir)
+        os.makedirs(self.shard_dir, exist_ok=True)
+
+        checkpoint = {"offset": 0, "docs": 0, "chunks": 0, "shards": 0, "chunker": self.chunker, "done": False}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            if checkpoint["chunker"] != self.chunker:
+                raise ValueError(f"Checkpoint was written with the '{checkpoint['chunker']}' chunker; pass --restart")
+            print(f"♻️ Resuming at doc {checkpoint['docs']} ({checkpoint['shards']} shards, {checkpoint['chunks']} chunks)")
+
+        # Anything past the last checkpointed shard is a partial write from the interrupted run.
+        for name in os.listdir(self.shard_dir):
+            if name.startswith(("vectors_", "meta_")) and int(name.split("_")[1][:5]) >= checkpoint["shards"]:
+                path = os.path.join(self.shard_dir, name)
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+        return checkpoint
+
+    def _flush(self, cache, pending, checkpoint, offset, docs):
+        if pending:
+            vectors = embed_with_cache(
+                [meta["text"] for meta in pending],
+                cache,
+                self.embedder,
+                batch_size=EMBED_BATCH_SIZE,
+                workers=EMBED_WORKERS,
+                threads_per_worker=EMBED_THREADS_PER_WORKER,
+            )
+            vector_path, meta_path = self._shard_paths(checkpoint["shards"])
+            np.save(vector_path, vectors)
+            with MetadataStoreWriter(meta_path) as writer:
+                writer.extend(pending)
+            checkpoint["shards"] += 1
+            checkpoint["chunks"] += len(pending)
+
+        # Cached chunks and vectors are committed once per shard, before the checkpoint that relies on them
+        cache.commit()
+        checkpoint.update(offset=offset, docs=docs)
+        _write_json_atomic(self.checkpoint_path, checkpoint)
+        print(f"💾 Checkpoint: {docs} docs, {checkpoint['chunks']} chunks in {checkpoint['shards']} shards")
+
+    @staticmethod
+    def _read_docs(f, count=DOC_BATCH):
+        """Up to `count` non-empty lines as `(doc, offset after its line)`; doc is None for a line that is not JSON."""
+        batch = []
+        while len(batch) < count:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                try:
+                    doc = json.loads(line)
+                except ValueError as e:
+                    print(f"❌ Error parsing line at offset {f.tell() - len(line)}: {e}")
+                    doc = None
+                batch.append((doc, f.tell()))
+        return batch
+
+    def ingest(self, restart=False):
+        """Streams the JSONL docs into shards, checkpointing after every shard."""
+        checkpoint = self.load_checkpoint(restart)
+        if checkpoint["done"]:
+            print("✅ All docs already ingested")
+            return checkpoint
+
+        cache = EmbeddingCache(EMBED_CACHE_PATH)
+        pending = []
+        docs = checkpoint["docs"]
+        # The cache is closed even when ingestion fails, so its write lock is not held against the resumed run.
+        with open(self.docs_path, "rb") as f, contextlib.closing(cache):
+            f.seek(checkpoint["offset"])
+            while batch := self._read_docs(f):
+                # One batched cache lookup for the whole read; a shard may still end mid-batch.
+                parsed = [doc for doc, _ in batch if doc is not None]
+                all_chunks = iter(chunk_with_cache([doc.get("content", "") for doc in parsed], cache,
+                                                   self.chunker_id, self.chunk_fn))
+                for doc, offset in batch:
+                    chunks = next(all_chunks) if doc is not None else None
+                    if chunks is None:
+                        print(f"❌ Error processing doc {docs}")
+                    else:
+                        pending.extend({"doc_id": docs, "url": doc.get("url", ""), "chunk_index": idx, "text": chunk}
+                                       for idx, chunk in enumerate(chunks))
+                    docs += 1
+
+                    if len(pending) >= self.shard_chunks:
+                        self._flush(cache, pending, checkpoint, offset, docs)
+                        pending = []
+
+            checkpoint["done"] = True
+            self._flush(cache, pending, checkpoint, f.tell(), docs)
+        return checkpoint
+
+    def _shard_vectors(self, checkpoint):
+        for shard in range(checkpoint["shards"]):
+            yield np.load(self._shard_paths(shard)[0], mmap_mode="r")
+
+    def _rows(self, checkpoint, rows):
+        """Gathers the given global rows from the vector shards."""
+        parts, start = [], 0
+        for vectors in self._shard_vectors(checkpoint):
+            local = rows[(rows >= start) & (rows < start + len(vectors))] - start
+            parts.append(np.asarray(vectors[local], dtype="float32"))
+            start += len(vectors)
+        return np.concatenate(parts)
+
+    def finalize(self):
+        """Merges the shards into the configured FAISS index and the metadata store, then removes them."""
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if not checkpoint["done"]:
+            raise RuntimeError("Ingestion has not finished; run ingest() first")
+        if not checkpoint["chunks"]:
+            print("⚠️ No chunks were ingested, nothing to index")
+            return None
+
+        params = self.index_params
+        held_out = held_out_rows(checkpoint["chunks"])
+        index = exact = None
+        with MetadataStoreWriter(self.meta_path) as writer:
+            for shard, vectors in enumerate(self._shard_vectors(checkpoint)):
+                vectors = np.ascontiguousarray(vectors, dtype="float32")
+                if index is None:
+                    index = create_index(vectors.shape[1], params)
+                    if not index.is_trained:
+                        # Sample training rows from every shard without loading them all at once.
+                        train_rows = np.setdiff1d(np.arange(checkpoint["chunks"]), held_out)
+                        train_index(index, self._rows(checkpoint, train_rows[:: max(1, len(train_rows) // MAX_TRAIN_VECTORS)]))
+                    # The exact reference for the report would double memory for a flat index, so skip it there.
+                    if params["factory"] != "Flat":
+                        exact = exact_index_for(vectors[:0], params)
+                index.add(vectors)
+                if exact is not None:
+                    exact.add(vectors)
+                writer.extend(open_metadata_store(self._shard_paths(shard)[1]))
+
+        assert index.ntotal == len(open_metadata_store(self.meta_path)), "❌ Embeddings and metadata count mismatch."
+        apply_search_params(index, params)
+        queries = self._rows(checkpoint, held_out)
+        report = evaluate_index(index, exact, queries) if exact is not None else evaluate_flat_index(index, queries)
+        report.update(params)
+        print_report(params, report)
+        write_index_files(self.lib_dir, index, params, report)
+        write_manifest(self.lib_dir, self.embedder.manifest(index.d, params["metric"], self.chunker_id))
+        print(f"✅ FAISS index built with {index.ntotal} vectors → {self.lib_dir}")
+        build_from_store(self.lib_dir)
+
+        shutil.rmtree(self.shard_dir)
+        print(f"🗑️ Deleted {self.shard_dir}")
+        return index
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "--convert":
+        convert_json_to_jsonl(*sys.argv[2:4])
+    elif sys.argv[1] == "--update":
+        pipeline = IngestPipeline(sys.argv[2], *sys.argv[4:5])
+        if apply_crawl_manifest(pipeline.docs_path, sys.argv[3]):
+            pipeline.ingest(restart=True)
+            pipeline.finalize()
+    else:
+        args = [arg for arg in sys.argv[1:] if arg != "--restart"]
+        pipeline = IngestPipeline(args[0], *args[1:2])
+        pipeline.ingest(restart="--restart" in sys.argv)
+        pipeline.finalize()
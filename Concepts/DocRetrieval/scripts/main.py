@@ -1,5 +1,6 @@
+import asyncio
 from config import SITE_CONFIG
-from scraper import bfs_scrape
+from async_scraper import crawl
 
 def main():
     print("Select the documentation to scrape:")
@@ -14,7 +15,7 @@ def main():
 
     site_config = SITE_CONFIG[choice]
     print(f"[🚀] Starting scrape for {site_config['name']} documentation...")
-    bfs_scrape(site_config)
+    asyncio.run(crawl(site_config))
 
 if __name__ == "__main__":
     main()
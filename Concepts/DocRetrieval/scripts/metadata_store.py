@@ -0,0 +1,203 @@
+"""
+Columnar, memory-mapped store for FAISS chunk metadata.
+Replaces the pickled `faiss_metadata.npy` object array: `doc_id`, `chunk_index`
+and `url_id` are fixed-width int32 columns, chunk texts and URLs live in single
+UTF-8 blobs addressed through int64 offset tables. Readers mmap every file and
+only decode the rows they are asked for.
+
+A store is written into a sibling `<dir>.partial` directory and swapped in
+whole once it is complete, so a server that has the previous store mmapped
+keeps reading it intact until it reloads.
+
+Usage: python metadata_store.py <faiss_metadata.npy> [output_dir]
+"""
+
+import json
+import os
+import shutil
+import sys
+from array import array
+import numpy as np
+
+STORE_VERSION = 1
+STORE_DIRNAME = "faiss_metadata"
+
+
+def replace_dir(staging, path):
+    """
+    Swaps the fully written directory `staging` in for `path`. The old files are
+    unlinked, not truncated, so existing memory maps of them stay valid.
+    """
+    if not os.path.exists(path):
+        os.replace(staging, path)
+        return
+    retired = f"{path}.old"
+    shutil.rmtree(retired, ignore_errors=True)
+    os.replace(path, retired)
+    os.replace(staging, path)
+    shutil.rmtree(retired)
+
+
+class MetadataStoreWriter:
+    """Appends metadata rows to an on-disk store without keeping chunk texts in memory."""
+
+    def __init__(self, path):
+        self.path = path
+        self.staging = f"{path}.partial"
+        shutil.rmtree(self.staging, ignore_errors=True)
+        os.makedirs(self.staging)
+        self.doc_ids = array("i")
+        self.chunk_indexes = array("i")
+        self.url_ids = array("i")
+        self.text_offsets = array("q", [0])
+        self.url_index = {}
+        self.url_offsets = array("q", [0])
+        self.text_file = open(os.path.join(self.staging, "text.bin"), "wb")
+        self.url_file = open(os.path.join(self.staging, "url.bin"), "wb")
+
+    def append(self, record):
+        url = record.get("url", "")
+        if url not in self.url_index:
+            self.url_index[url] = len(self.url_index)
+            encoded_url = url.encode("utf-8")
+            self.url_file.write(encoded_url)
+            self.url_offsets.append(self.url_offsets[-1] + len(encoded_url))
+
+        encoded_text = record.get("text", "").encode("utf-8")
+        self.text_file.write(encoded_text)
+        self.text_offsets.append(self.text_offsets[-1] + len(encoded_text))
+        self.doc_ids.append(int(record.get("doc_id", -1)))
+        self.chunk_indexes.append(int(record.get("chunk_index", -1)))
+        self.url_ids.append(self.url_index[url])
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def close(self):
+        self.text_file.close()
+        self.url_file.close()
+        np.save(os.path.join(self.staging, "doc_id.npy"), np.frombuffer(self.doc_ids, dtype=np.int32))
+        np.save(os.path.join(self.staging, "chunk_index.npy"), np.frombuffer(self.chunk_indexes, dtype=np.int32))
+        np.save(os.path.join(self.staging, "url_id.npy"), np.frombuffer(self.url_ids, dtype=np.int32))
+        np.save(os.path.join(self.staging, "text_offsets.npy"), np.frombuffer(self.text_offsets, dtype=np.int64))
+        np.save(os.path.join(self.staging, "url_offsets.npy"), np.frombuffer(self.url_offsets, dtype=np.int64))
+        with open(os.path.join(self.staging, "store.json"), "w") as f:
+            json.dump({"version": STORE_VERSION, "rows": len(self), "urls": len(self.url_index)}, f)
+        replace_dir(self.staging, self.path)
+
+    def abort(self):
+        """Closes the blobs and removes the partial store; an existing store at `path` is left as it was."""
+        self.text_file.close()
+        self.url_file.close()
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _map_blob(path):
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+class MetadataStore:
+    """Read-only view of a metadata store; rows are decoded lazily on access."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "store.json")) as f:
+            info = json.load(f)
+        if info.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported metadata store version {info.get('version')} in {path}")
+
+        self.path = path
+        self.doc_ids = np.load(os.path.join(path, "doc_id.npy"), mmap_mode="r")
+        self.chunk_indexes = np.load(os.path.join(path, "chunk_index.npy"), mmap_mode="r")
+        self.url_ids = np.load(os.path.join(path, "url_id.npy"), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        self.url_offsets = np.load(os.path.join(path, "url_offsets.npy"), mmap_mode="r")
+        self.text_blob = _map_blob(os.path.join(path, "text.bin"))
+        self.url_blob = _map_blob(os.path.join(path, "url.bin"))
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def text(self, i):
+        start, end = self.text_offsets[i], self.text_offsets[i + 1]
+        return self.text_blob[start:end].tobytes().decode("utf-8")
+
+    def url(self, i):
+        url_id = self.url_ids[i]
+        start, end = self.url_offsets[url_id], self.url_offsets[url_id + 1]
+        return self.url_blob[start:end].tobytes().decode("utf-8")
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Metadata row {i} out of range")
+        return {
+            "doc_id": int(self.doc_ids[i]),
+            "url": self.url(i),
+            "chunk_index": int(self.chunk_indexes[i]),
+            "text": self.text(i),
+        }
+
+    def rows(self, ids):
+        return [self[i] for i in ids]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def write_metadata_store(path, records):
+    """Writes an iterable of metadata dicts to a store at `path`."""
+    with MetadataStoreWriter(path) as writer:
+        writer.extend(records)
+    return path
+
+
+def open_metadata_store(path):
+    return MetadataStore(path)
+
+
+def has_metadata_store(path):
+    return os.path.exists(os.path.join(path, "store.json"))
+
+
+def load_metadata(index_dir):
+    """The metadata of the index in `index_dir`: its store, or the legacy pickled `faiss_metadata.npy`."""
+    store_path = os.path.join(index_dir, STORE_DIRNAME)
+    if has_metadata_store(store_path):
+        return open_metadata_store(store_path)
+    print(f"⚠️ No metadata store in {index_dir}, loading the legacy faiss_metadata.npy; "
+          f"convert it with `python metadata_store.py`")
+    return np.load(os.path.join(index_dir, "faiss_metadata.npy"), allow_pickle=True)
+
+
+def convert_npy_metadata(npy_path, out_dir=None):
+    """Converts a pickled `faiss_metadata.npy` object array into a metadata store."""
+    out_dir = out_dir or os.path.join(os.path.dirname(npy_path), STORE_DIRNAME)
+    metadata = np.load(npy_path, allow_pickle=True)
+    write_metadata_store(out_dir, metadata)
+    print(f"💾 Converted {len(metadata)} rows from {npy_path} to {out_dir}")
+    return out_dir
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    convert_npy_metadata(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
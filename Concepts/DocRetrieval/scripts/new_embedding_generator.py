@@ -1,12 +1,14 @@
 import json
 import numpy as np
-import faiss
 import os
-import torch
 from dotenv import load_dotenv
-from transformers import AutoTokenizer, AutoModel
 import spacy
-from config import EMBED_MODEL
+from config import EMBED_MODEL, EMBED_BATCH_SIZE, EMBED_WORKERS, EMBED_THREADS_PER_WORKER, EMBED_CACHE_PATH
+from embedder import Embedder, write_manifest
+from embedding_cache import EmbeddingCache, chunk_with_cache, embed_with_cache
+from index_builder import index_params, build_and_report
+from bm25_index import build_from_store
+from metadata_store import STORE_DIRNAME, write_metadata_store, open_metadata_store
 
 load_dotenv()
 NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY")
@@ -19,13 +21,12 @@ LIB_PATH = {
 DATA_DIR = "../data"
 DOCS_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "scraped_docs.json")
 EMBED_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "embeddings.npy")
-META_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "faiss_metadata.npy")
+META_PATH = os.path.join(DATA_DIR, LIB_PATH[library], STORE_DIRNAME)
 FAISS_INDEX_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "faiss_index.bin")
 
 nlp = spacy.load("en_core_web_sm")
-
-tokenizer = AutoTokenizer.from_pretrained(EMBED_MODEL, trust_remote_code=True)
-model = AutoModel.from_pretrained(EMBED_MODEL, trust_remote_code=True)
+embedder = Embedder(EMBED_MODEL, pooling="cls", normalize=True)
+CHUNKER_ID = f"spacy-sentences:{spacy.__version__}:1000"
 
 def semantic_chunk_text(text, max_chars=1000):
     """Chunks text semantically using spaCy sentence boundaries."""
@@ -42,14 +43,6 @@ def semantic_chunk_text(text, max_chars=1000):
     return chunks
 
 
-def generate_embedding(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512, padding="max_length")
-    with torch.no_grad():
-        outputs = model(**inputs)
-        cls = outputs.last_hidden_state[:, 0, :]
-        cls = cls / cls.norm(dim=-1, keepdim=True)
-        return cls[0].numpy().astype("float32")
-
 def process_json_and_generate_embeddings():
     try:
         with open(DOCS_PATH, 'r') as f:
@@ -59,43 +52,48 @@ def process_json_and_generate_embeddings():
         print(f"❌ Error loading JSON: {e}")
         return
 
-    all_embeddings, all_metadata = [], []
-    for i, doc in enumerate(docs):
-        doc_id, url, content = i, doc.get("url", ""), doc.get("content", "")
-        try:
-            chunks = semantic_chunk_text(content)
-            for idx, chunk in enumerate(chunks):
-                embedding = generate_embedding(chunk)
-                all_embeddings.append(embedding)
-                all_metadata.append({
-                    "doc_id": doc_id, "url": url,
-                    "chunk_index": idx, "text": chunk
-                })
-
-            if i == 0:
-                print("🔹 Sample Embedding:", embedding[:10])
-            if (i + 1) % 5 == 0:
-                print(f"✅ Processed {i + 1}/{len(docs)}")
-
-        except Exception as e:
-            print(f"❌ Error processing doc {i}: {e}")
-
-    np.save(EMBED_PATH, np.array(all_embeddings))
-    np.save(META_PATH, np.array(all_metadata, dtype=object))
+    cache = EmbeddingCache(EMBED_CACHE_PATH)
+    all_metadata = []
+    all_chunks = chunk_with_cache([doc.get("content", "") for doc in docs], cache, CHUNKER_ID, semantic_chunk_text)
+    for i, (doc, chunks) in enumerate(zip(docs, all_chunks)):
+        doc_id, url = i, doc.get("url", "")
+        if chunks is None:
+            print(f"❌ Error processing doc {i}")
+            continue
+        for idx, chunk in enumerate(chunks):
+            all_metadata.append({
+                "doc_id": doc_id, "url": url,
+                "chunk_index": idx, "text": chunk
+            })
+
+    print(f"✅ Chunked {len(docs)} docs into {len(all_metadata)} chunks")
+
+    all_embeddings = embed_with_cache(
+        [meta["text"] for meta in all_metadata],
+        cache,
+        embedder,
+        batch_size=EMBED_BATCH_SIZE,
+        workers=EMBED_WORKERS,
+        threads_per_worker=EMBED_THREADS_PER_WORKER,
+    )
+    cache.close()
+    if len(all_embeddings):
+        print("🔹 Sample Embedding:", all_embeddings[0][:10])
+
+    np.save(EMBED_PATH, all_embeddings)
+    write_metadata_store(META_PATH, all_metadata)
     print("💾 Embeddings and metadata saved.")
 
 def build_faiss_index():
     try:
         embeddings = np.load(EMBED_PATH)
-        metadata = np.load(META_PATH, allow_pickle=True)
+        metadata = open_metadata_store(META_PATH)
         assert len(embeddings) == len(metadata)
 
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dimension)
-        index.add(embeddings.astype('float32'))
-
-        faiss.write_index(index, FAISS_INDEX_PATH)
+        index = build_and_report(embeddings, index_params(library, "ip"), os.path.dirname(FAISS_INDEX_PATH))
+        write_manifest(os.path.dirname(FAISS_INDEX_PATH), embedder.manifest(index.d, "ip", CHUNKER_ID))
         print(f"✅ FAISS index built with {index.ntotal} vectors.")
+        build_from_store(os.path.dirname(FAISS_INDEX_PATH))
 
         if os.path.exists(EMBED_PATH):
             os.remove(EMBED_PATH)
@@ -3,10 +3,10 @@ import faiss
 import os
 import requests
 from dotenv import load_dotenv
-import torch
-from transformers import AutoTokenizer, AutoModel
 import json
-from config import RERANK_MODEL
+from config import EMBED_MODEL, RERANK_MODEL
+from embedder import Embedder, check_manifest, read_manifest
+from metadata_store import load_metadata
 
 load_dotenv()
 NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY")
@@ -17,24 +17,21 @@ LIB_PATH = {
     "Scikit-Learn": "sklearn", "TensorFlow Keras": "tfkeras"
 }
 DATA_DIR = "../data"
-FAISS_INDEX_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "faiss_index.bin")
-META_PATH = os.path.join(DATA_DIR, LIB_PATH[library], "faiss_metadata.npy")
+INDEX_DIR = os.path.join(DATA_DIR, LIB_PATH[library])
+FAISS_INDEX_PATH = os.path.join(INDEX_DIR, "faiss_index.bin")
 
-EMBED_MODEL = "nomic-ai/nomic-embed-text-v1"
-tokenizer = AutoTokenizer.from_pretrained(EMBED_MODEL, trust_remote_code=True)
-model = AutoModel.from_pretrained(EMBED_MODEL, trust_remote_code=True)
+embedder = Embedder(EMBED_MODEL, pooling="cls", normalize=True)
 
 def generate_embedding(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512, padding="max_length")
-    with torch.no_grad():
-        outputs = model(**inputs)
-        cls = outputs.last_hidden_state[:, 0, :]
-        cls = cls / cls.norm(dim=-1, keepdim=True)
-        return cls[0].numpy().astype("float32")
+    """Embeds the query exactly as new_embedding_generator.py embedded the chunks."""
+    return embedder.load().embed([text])[0]
 
 def search_and_rerank(query_text, top_k=25, rerank_k=2):
     index = faiss.read_index(FAISS_INDEX_PATH)
-    metadata = np.load(META_PATH, allow_pickle=True)
+    manifest = read_manifest(INDEX_DIR)
+    if manifest is not None:
+        check_manifest(manifest, embedder, index.d)
+    metadata = load_metadata(INDEX_DIR)
 
     query_embed = generate_embedding(query_text)
     D, I = index.search(query_embed.reshape(1, -1), top_k)
@@ -0,0 +1,112 @@
+"""
+Converts an existing `faiss_index.bin` to compressed vector storage and reports
+its size, recall@25 against the float32 original, and search latency.
+
+Modes:
+  fp16  SQfp16, 2 bytes per dimension (half of float32)
+  sq8   SQ8, 8-bit scalar quantization, 1 byte per dimension
+  pq    PQ<d/8>, 1 byte per 8 dimensions, plus exact re-scoring: search fetches
+        RESCORE_FACTOR x k candidates and re-ranks them by the float32 vectors
+        memory-mapped from rescore_vectors.npy, which stay on disk. A plain PQ
+        index takes no IDSelector, so a filtered unified search drops
+        out-of-scope hits before re-scoring instead
+Any other faiss factory string (e.g. `PQ48`, `IVF256,SQ8`) is accepted too.
+
+Usage: python quantize_index.py <index_dir> <fp16|sq8|pq|factory> [rescore_factor] [--apply]
+Without --apply only quantization_report.json is written. With it the quantized
+index replaces faiss_index.bin, and the original is kept as faiss_index.f32.bin.
+Re-running reads from that backup, so quantization never compounds.
+"""
+
+import json
+import os
+import sys
+import numpy as np
+import faiss
+from index_builder import (INDEX_CONFIG_FILENAME, SEARCH_PARAMS, create_index, train_index, held_out_rows,
+                           index_vectors, apply_search_params, evaluate_index, write_index_files, print_report)
+from rescore import RESCORE_FILENAME, rescore
+
+MODES = {"fp16": "SQfp16", "sq8": "SQ8"}
+RESCORE_FACTOR = 4
+BACKUP_FILENAME = "faiss_index.f32.bin"
+REPORT_FILENAME = "quantization_report.json"
+METRIC_NAMES = {faiss.METRIC_L2: "l2", faiss.METRIC_INNER_PRODUCT: "ip"}
+
+
+def quantizer_factory(mode, dim):
+    if mode == "pq":
+        if dim % 8:
+            raise ValueError(f"pq mode needs a dimension divisible by 8, got {dim}; pass e.g. PQ{dim // 4} explicitly")
+        return f"PQ{dim // 8}"
+    return MODES.get(mode, mode)
+
+
+def configured_search_params(index_dir, index):
+    """The nprobe / efSearch configured for the index being replaced, where they also apply to `index`."""
+    config_path = os.path.join(index_dir, INDEX_CONFIG_FILENAME)
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path) as f:
+        config = json.load(f)
+    params = {}
+    for name in SEARCH_PARAMS:
+        if config.get(name) is None:
+            continue
+        try:
+            apply_search_params(index, {name: config[name]})
+        except RuntimeError:
+            print(f"⚠️ {name}={config[name]} does not apply to {type(index).__name__}; dropped")
+            continue
+        params[name] = config[name]
+    return params
+
+
+def quantize(index_dir, mode, rescore_factor=None, apply=False):
+    backup_path = os.path.join(index_dir, BACKUP_FILENAME)
+    source_path = backup_path if os.path.exists(backup_path) else os.path.join(index_dir, "faiss_index.bin")
+    original = faiss.read_index(source_path)
+    vectors = index_vectors(original)
+
+    params = {"factory": quantizer_factory(mode, original.d), "metric": METRIC_NAMES[original.metric_type]}
+    if rescore_factor is None and "PQ" in params["factory"]:
+        rescore_factor = RESCORE_FACTOR
+    if rescore_factor:
+        params["rescore"] = rescore_factor
+
+    held_out = held_out_rows(len(vectors))
+    index = create_index(original.d, params)
+    train_index(index, vectors, held_out)
+    index.add(vectors)
+    # Evaluated and written with the configured search params, so --apply keeps them in index_config.json.
+    params.update(configured_search_params(index_dir, index))
+
+    search = None
+    if rescore_factor:
+        def search(queries, k):
+            _, I = index.search(queries, k * rescore_factor)
+            return rescore(queries, I, vectors, params["metric"], k)
+
+    report = evaluate_index(index, original, vectors[held_out], search=search)
+    report.update(params, source=os.path.basename(source_path),
+                  rescore_disk_bytes=int(vectors.nbytes) if rescore_factor else 0)
+    with open(os.path.join(index_dir, REPORT_FILENAME), "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(params, report)
+
+    if apply:
+        if source_path != backup_path:
+            os.replace(source_path, backup_path)
+        write_index_files(index_dir, index, params)
+        rescore_path = os.path.join(index_dir, RESCORE_FILENAME)
+        if rescore_factor:
+            np.save(rescore_path, vectors)
+        elif os.path.exists(rescore_path):
+            os.remove(rescore_path)
+        print(f"💾 Quantized index written to {index_dir} (float32 original kept as {BACKUP_FILENAME})")
+    return report
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--apply"]
+    quantize(args[0], args[1], int(args[2]) if len(args) > 2 else None, apply="--apply" in sys.argv)
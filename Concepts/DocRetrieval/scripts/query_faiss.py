@@ -1,9 +1,9 @@
 import numpy as np
 import faiss
-from transformers import AutoTokenizer, AutoModel
-import torch
 import os
 from config import EMBED_MODEL
+from embedder import Embedder, check_manifest, read_manifest
+from metadata_store import load_metadata
 
 library = "Pandas"
 
@@ -17,24 +17,20 @@ LIB_PATH = {
 }
 
 DATA_DIR = "../data"
-faiss_index_path = 'faiss_index.bin'
-faiss_index_path = os.path.join(DATA_DIR, LIB_PATH[library], faiss_index_path)
-index = faiss.read_index(faiss_index_path)
+index_dir = os.path.join(DATA_DIR, LIB_PATH[library])
+index = faiss.read_index(os.path.join(index_dir, 'faiss_index.bin'))
 
-meta_path = 'faiss_metadata.npy'
-meta_path = os.path.join(DATA_DIR, LIB_PATH[library], meta_path)
-metadata = np.load(meta_path, allow_pickle=True)
+metadata = load_metadata(index_dir)
 
-tokenizer = AutoTokenizer.from_pretrained(EMBED_MODEL, trust_remote_code=True)
-model = AutoModel.from_pretrained(EMBED_MODEL, trust_remote_code=True)
+embedder = Embedder(EMBED_MODEL, pooling="mean", normalize=True)
+manifest = read_manifest(index_dir)
+if manifest is not None:
+    check_manifest(manifest, embedder, index.d)
+embedder.load()
 
 def generate_embedding(text):
-    """Generates embeddings for input text using GraphCodeBERT."""
-    inputs = tokenizer(text, return_tensors="pt", add_special_tokens=True, truncation=True, max_length=512)
-    with torch.no_grad():
-        outputs = model(**inputs)
-        embeddings = outputs.last_hidden_state.mean(dim=1)
-    return embeddings[0].numpy().astype('float32')
+    """Embeds the query exactly as embedding_generator.py embedded the chunks."""
+    return embedder.embed([text])[0]
 
 query_text = """
 Access non-existent column in dataframe
@@ -0,0 +1,34 @@
+"""
+Exact re-scoring of approximate search hits. A quantized index over-fetches
+candidates, then their full float32 vectors are read from a memory-mapped
+`rescore_vectors.npy` and re-ranked by exact distance. The float32 copy stays
+on disk and is paged in only for the candidates touched.
+"""
+
+import numpy as np
+
+RESCORE_FILENAME = "rescore_vectors.npy"
+
+
+def rescore(queries, ids, vectors, metric, k):
+    """Re-ranks `ids` (queries x candidates, -1 = empty) by exact `metric` ("l2" or "ip"); returns `(D, I)` like FAISS."""
+    queries = np.atleast_2d(queries).astype(np.float32)
+    ids = np.atleast_2d(ids)
+    D = np.full((len(queries), k), np.inf if metric == "l2" else -np.inf, dtype=np.float32)
+    I = np.full((len(queries), k), -1, dtype=np.int64)
+    for row, (query, candidates) in enumerate(zip(queries, ids)):
+        candidates = candidates[candidates >= 0]
+        if not len(candidates):
+            continue
+        # Sorted ids make the memory-mapped reads sequential.
+        candidates = np.sort(candidates)
+        stored = np.asarray(vectors[candidates], dtype=np.float32)
+        if metric == "l2":
+            scores = ((stored - query) ** 2).sum(axis=1)
+            order = np.argsort(scores, kind="stable")[:k]
+        else:
+            scores = stored @ query
+            order = np.argsort(-scores, kind="stable")[:k]
+        D[row, :len(order)] = scores[order]
+        I[row, :len(order)] = candidates[order]
+    return D, I
@@ -5,29 +5,45 @@ from collections import deque
 import json
 import time
 
+DEFAULT_CONTENT_TAGS = ['h1', 'h2', 'h3', 'p', 'code', 'li', 'pre']
+
+session = requests.Session()
+
+def site_options(site_config):
+    """SITE_CONFIG entry with its optional keys filled in."""
+    return {
+        "base_url": site_config['base_url'],
+        "valid_link_prefix": site_config['valid_link_prefix'],
+        "content_selector": site_config['content_selector'],
+        "content_tags": site_config.get('content_tags', DEFAULT_CONTENT_TAGS),
+        "exclude_selectors": site_config.get('exclude_selectors', []),
+    }
+
 def is_valid_url(url):
     parsed = urlparse(url)
     return bool(parsed.netloc) and bool(parsed.scheme)
 
-def get_internal_links(base_url, page_url, valid_link_prefix):
-    """Extract valid internal documentation links from a page."""
+def fetch_page(url):
+    """Fetches a page once through the shared session; returns the response or None."""
     try:
-        response = requests.get(page_url, timeout=10)
+        response = session.get(url, timeout=10)
     except requests.exceptions.RequestException as e:
-        print(f"[❌] Error fetching {page_url}: {e}")
-        return []
+        print(f"[❌] Error fetching {url}: {e}")
+        return None
 
     if response.status_code != 200:
-        print(f"[❌] Failed to fetch {page_url}")
-        return []
+        print(f"[❌] Failed to fetch {url}")
+        return None
+    return response
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+def extract_links(soup, page_url, valid_link_prefix):
+    """Valid internal documentation links on a parsed page, resolved against the page URL."""
     links = set()
 
     for a_tag in soup.find_all("a", href=True):
         href = a_tag.attrs["href"]
-        full_url = urljoin(base_url, href)
-        full_url, _ = urldefrag(full_url) 
+        full_url = urljoin(page_url, href)
+        full_url, _ = urldefrag(full_url)
 
         for val_lin_pref in valid_link_prefix:
             if full_url.startswith(val_lin_pref) and is_valid_url(full_url):
@@ -36,20 +52,8 @@ def get_internal_links(base_url, page_url, valid_link_prefix):
 
     return list(links)
 
-def scrape_content(url, content_selector, content_tags, exclude_selectors):
-    """Extract main content from a documentation page."""
-    try:
-        response = requests.get(url, timeout=10)
-    except requests.exceptions.RequestException as e:
-        print(f"[❌] Error fetching content from {url}: {e}")
-        return ""
-
-    if response.status_code != 200:
-        print(f"[❌] Failed to fetch content from {url}")
-        return ""
-
-    soup = BeautifulSoup(response.content, 'html.parser')
-
+def extract_content(soup, url, content_selector, content_tags, exclude_selectors):
+    """Main text of a parsed page, or "" when it is too short to be useful. Removes the excluded regions from `soup`."""
     for selector in exclude_selectors:
         for tag in soup.find_all(selector['name'], selector['attrs']):
             tag.decompose()
@@ -67,7 +71,7 @@ def scrape_content(url, content_selector, content_tags, exclude_selectors):
         if text:
             texts.append(text)
 
-    content = "\n".join(list(dict.fromkeys(texts)))  
+    content = "\n".join(list(dict.fromkeys(texts)))
 
     if len(content.strip()) < 50:
         print(f"[⚠️] Extracted content from {url} seems too short or generic.")
@@ -75,37 +79,53 @@ def scrape_content(url, content_selector, content_tags, exclude_selectors):
 
     return content
 
+def extract_page(html, url, options):
+    """Parses a page once and returns `(content, links)`; links are collected before excluded regions are removed."""
+    soup = BeautifulSoup(html, 'html.parser')
+    links = extract_links(soup, url, options['valid_link_prefix'])
+    content = extract_content(soup, url, options['content_selector'], options['content_tags'], options['exclude_selectors'])
+    return content, links
+
+def get_internal_links(base_url, page_url, valid_link_prefix):
+    """Extract valid internal documentation links from a page."""
+    response = fetch_page(page_url)
+    if response is None:
+        return []
+    return extract_links(BeautifulSoup(response.content, 'html.parser'), page_url, valid_link_prefix)
+
+def scrape_content(url, content_selector, content_tags, exclude_selectors):
+    """Extract main content from a documentation page."""
+    response = fetch_page(url)
+    if response is None:
+        return ""
+    return extract_content(BeautifulSoup(response.content, 'html.parser'), url, content_selector, content_tags, exclude_selectors)
+
 def bfs_scrape(site_config):
-    """Perform BFS to scrape all documentation pages based on site config."""
-    base_url = site_config['base_url']
-    valid_link_prefix = site_config['valid_link_prefix']
-    content_selector = site_config['content_selector']
-    content_tags = site_config.get('content_tags', ['h1', 'h2', 'h3', 'p', 'code', 'li', 'pre'])
-    exclude_selectors = site_config.get('exclude_selectors', [])
-
-    queue = deque([base_url])
-    visited = set()
+    """Perform BFS to scrape all documentation pages based on site config; each page is fetched once."""
+    options = site_options(site_config)
+
+    queue = deque([options['base_url']])
+    # Marked when queued, so a link found on many pages is queued once
+    visited = {options['base_url']}
     scraped_data = []
 
     while queue:
         current_url = queue.popleft()
-        if current_url in visited:
-            continue
-
-        visited.add(current_url)
         print(f"[🔍] Visiting: {current_url}")
 
-        content = scrape_content(current_url, content_selector, content_tags, exclude_selectors)
-        if content:
-            scraped_data.append({
-                "url": current_url,
-                "content": content
-            })
-
-        child_links = get_internal_links(base_url, current_url, valid_link_prefix)
-        for link in child_links:
-            if link not in visited:
-                queue.append(link)
+        response = fetch_page(current_url)
+        if response is not None:
+            content, child_links = extract_page(response.content, response.url, options)
+            if content:
+                scraped_data.append({
+                    "url": current_url,
+                    "content": content
+                })
+
+            for link in child_links:
+                if link not in visited:
+                    visited.add(link)
+                    queue.append(link)
 
         time.sleep(0.3)
 
@@ -1,40 +1,132 @@
+"""
+Exact cosine-similarity search over an embedding matrix, usable as the
+ground-truth baseline for the ANN indexes.
+`ExactSearcher` memory-maps a pre-normalized float32 matrix, scores it one
+block at a time with a single matrix product per block, and keeps a running
+top-k per query with `argpartition`. Many queries can be searched at once.
+`get_searcher` prepares a raw embedding file on first use, into
+`<name>_normalized.npy` next to it.
+
+Usage: python sim_search.py prepare <embeddings.npy> <normalized.npy>
+"""
+
+import os
+import sys
 import numpy as np
-from transformers import AutoTokenizer, AutoModel
-import torch
 from config import EMBED_MODEL
+from embedder import Embedder
+
+BLOCK_ROWS = 65536
+
+embedder = Embedder(EMBED_MODEL, pooling="mean", normalize=True)
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / (np.linalg.norm(vectors, axis=-1, keepdims=True) + 1e-10)
+
+
+def prepare_matrix(embeddings_file, out_file, block_rows=BLOCK_ROWS):
+    """Writes an L2-normalized float32 copy of `embeddings_file`, block by block."""
+    source = np.load(embeddings_file, mmap_mode="r")
+    target = np.lib.format.open_memmap(out_file, mode="w+", dtype=np.float32, shape=source.shape)
+    for start in range(0, len(source), block_rows):
+        target[start:start + block_rows] = normalize_rows(source[start:start + block_rows])
+    target.flush()
+    return out_file
+
+
+def prepared_path(embeddings_file):
+    root, ext = os.path.splitext(embeddings_file)
+    return f"{root}_normalized{ext}"
+
+
+def is_prepared(matrix):
+    """Whether `matrix` is float32 and L2-normalized, judged on its first rows."""
+    if matrix.dtype != np.float32:
+        return False
+    sample_norms = np.linalg.norm(matrix[:min(len(matrix), 100)], axis=1)
+    return not len(sample_norms) or np.allclose(sample_norms, 1, atol=1e-3)
+
+
+def _top_k(scores, ids, k):
+    """Per-row top-k of `scores` (queries x candidates), sorted best first."""
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+class ExactSearcher:
+    def __init__(self, path, metadata_file=None, block_rows=BLOCK_ROWS):
+        self.matrix = np.load(path, mmap_mode="r")
+        if not is_prepared(self.matrix):
+            raise ValueError(f"{path} is not float32 and L2-normalized; run `python sim_search.py prepare` first")
+        # Row metadata, loaded once rather than per query
+        self.metadata = np.load(metadata_file, allow_pickle=True) if metadata_file else None
+        self.block_rows = block_rows
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def search(self, queries, k=10):
+        """Cosine top-k for one query (1-d) or a batch (2-d); returns `(scores, ids)` of shape (queries, k)."""
+        queries = normalize_rows(np.atleast_2d(queries))
+        k = min(k, len(self.matrix))
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+
+        for start in range(0, len(self.matrix), self.block_rows):
+            block = self.matrix[start:start + self.block_rows]
+            scores = queries @ block.T
+            ids = np.broadcast_to(np.arange(start, start + len(block), dtype=np.int64), scores.shape)
+            scores, ids = _top_k(scores, ids, k)
+            best_scores, best_ids = _top_k(np.hstack([best_scores, scores]), np.hstack([best_ids, ids]), k)
+
+        return best_scores, best_ids
+
+
+_searchers = {}
+
 
-tokenizer = AutoTokenizer.from_pretrained(EMBED_MODEL)
-model = AutoModel.from_pretrained(EMBED_MODEL)
+def get_searcher(embeddings_file, metadata_file=None):
+    """
+    One searcher per matrix, so repeated queries reuse the same memory map and metadata.
+    A matrix that is not yet normalized is prepared once and the prepared copy is searched.
+    """
+    key = (embeddings_file, metadata_file)
+    if key not in _searchers:
+        path = embeddings_file
+        if not is_prepared(np.load(embeddings_file, mmap_mode="r")):
+            path = prepared_path(embeddings_file)
+            if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(embeddings_file):
+                print(f"⏳ Normalizing {embeddings_file} into {path}")
+                prepare_matrix(embeddings_file, path)
+        _searchers[key] = ExactSearcher(path, metadata_file)
+    return _searchers[key]
 
-MAX_TOKENS = 510  
 
 def generate_embedding(text):
     """Generates embedding for the input text."""
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=MAX_TOKENS)
-    with torch.no_grad():
-        outputs = model(**inputs)
-        embeddings = outputs.last_hidden_state.mean(dim=1)
-    return embeddings[0].numpy()
+    return embedder.load().embed([text])[0]
 
-def cosine_similarity(a, b):
-    """Computes cosine similarity between two vectors."""
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-10)
 
 def search_similar_errors(error_message, embeddings_file="py_embeddings.npy", metadata_file="py_metadata.npy", top_k=10):
     """Finds top K similar errors from embeddings."""
-    embeddings = np.load(embeddings_file)
-    metadata = np.load(metadata_file, allow_pickle=True)
-    error_embedding = generate_embedding(error_message)
-    similarities = [cosine_similarity(error_embedding, emb) for emb in embeddings]
-    top_k_indices = np.argsort(similarities)[-top_k:][::-1]
+    searcher = get_searcher(embeddings_file, metadata_file)
+    scores, ids = searcher.search(generate_embedding(error_message), top_k)
 
     print(f"\n🔍 Top {top_k} Matches for Error: '{error_message}'\n")
-    for idx in top_k_indices:
-        score = similarities[idx]
-        meta = metadata[idx]
+    for score, idx in zip(scores[0], ids[0]):
+        meta = searcher.metadata[idx]
         print(f"\nScore: {score:.4f} | URL: {meta['url']}")
         print(f"\nFull Documentation:\n{meta.get('full_content', 'No content available.')}\n")
 
 if __name__ == "__main__":
-    error_msg = "KeyError: 'column_name' not found in DataFrame"
-    search_similar_errors(error_msg)
+    if len(sys.argv) == 4 and sys.argv[1] == "prepare":
+        prepare_matrix(sys.argv[2], sys.argv[3])
+    else:
+        error_msg = "KeyError: 'column_name' not found in DataFrame"
+        search_similar_errors(error_msg)
@@ -0,0 +1,78 @@
+"""
+Merges every per-library index under DATA_DIR into one index in DATA_DIR/unified.
+Libraries are laid out contiguously, so each one owns an id range recorded in
+library_ranges.json. The server filters a search to one library or a set of
+libraries with faiss.IDSelectorRange (or, for index types without selector
+support such as PQ, by dropping over-fetched hits outside the ranges), or
+searches all of them unfiltered. That
+means a single load and a single memory footprint for every library.
+
+Usage: python unified_index.py [data_dir]
+"""
+
+import json
+import os
+import sys
+import numpy as np
+import faiss
+from config import LIB_PATH
+from embedder import MANIFEST_KEYS, read_manifest, write_manifest
+from index_builder import index_params, build_and_report, index_vectors
+from bm25_index import build_from_store
+from metadata_store import STORE_DIRNAME, MetadataStoreWriter, load_metadata
+
+UNIFIED_DIRNAME = "unified"
+RANGES_FILENAME = "library_ranges.json"
+METRIC_NAMES = {faiss.METRIC_L2: "l2", faiss.METRIC_INNER_PRODUCT: "ip"}
+
+
+def build_unified_index(data_dir="../data"):
+    out_dir = os.path.join(data_dir, UNIFIED_DIRNAME)
+    os.makedirs(out_dir, exist_ok=True)
+
+    ranges, parts, metric, manifest = {}, [], None, None
+    with MetadataStoreWriter(os.path.join(out_dir, STORE_DIRNAME)) as writer:
+        for library, lib_dir in LIB_PATH.items():
+            base_path = os.path.join(data_dir, lib_dir)
+            if not os.path.exists(os.path.join(base_path, "faiss_index.bin")):
+                print(f"⚠️ No index for {library}, skipping")
+                continue
+
+            index = faiss.read_index(os.path.join(base_path, "faiss_index.bin"))
+            lib_metric = METRIC_NAMES[index.metric_type]
+            if metric not in (None, lib_metric):
+                raise ValueError(f"{library} uses {lib_metric} but earlier libraries use {metric}; rebuild with one metric")
+            metric = lib_metric
+
+            lib_manifest = read_manifest(base_path)
+            if lib_manifest is None:
+                raise ValueError(f"{library} has no manifest.json; rebuild it so its embedder is known")
+            if manifest is not None and any(lib_manifest[key] != manifest[key] for key in MANIFEST_KEYS):
+                raise ValueError(f"{library} was embedded differently from earlier libraries; rebuild with one embedder")
+            if manifest is not None and lib_manifest.get("chunker") != manifest.get("chunker"):
+                lib_manifest["chunker"] = "mixed"
+            manifest = lib_manifest
+
+            metadata = load_metadata(base_path)
+            assert index.ntotal == len(metadata), f"❌ {library}: embeddings and metadata count mismatch."
+            start = len(writer)
+            writer.extend(metadata)
+            parts.append(index_vectors(index))
+            ranges[library] = [start, len(writer)]
+            print(f"✅ {library}: ids {start}–{len(writer)}")
+
+    if not parts:
+        print("❌ No per-library indexes found")
+        return None
+
+    index = build_and_report(np.concatenate(parts), index_params("Unified", metric), out_dir)
+    with open(os.path.join(out_dir, RANGES_FILENAME), "w") as f:
+        json.dump(ranges, f, indent=2)
+    write_manifest(out_dir, {**manifest, "dim": index.d, "metric": metric})
+    build_from_store(out_dir)
+    print(f"💾 Unified index with {index.ntotal} vectors saved to {out_dir}")
+    return index
+
+
+if __name__ == "__main__":
+    build_unified_index(*sys.argv[1:2])
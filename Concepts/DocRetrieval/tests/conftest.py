@@ -0,0 +1,58 @@
+import functools
+import os
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+SITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "site")
+
+
+class SiteHandler(SimpleHTTPRequestHandler):
+    """Serves the fixture site after `server.delay` seconds, recording request start times and peak concurrency."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.starts.append(time.monotonic())
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            super().do_GET()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    """The static fixture site on a local server; yields the server, whose `url` is the docs root."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SiteHandler, directory=SITE_DIR))
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.starts, server.in_flight, server.max_in_flight, server.delay = [], 0, 0, 0.0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/docs/"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def site_config(site):
+    return {
+        "name": "Fixture",
+        "base_url": site.url + "index.html",
+        "content_selector": {"name": "article", "attrs": {}},
+        "valid_link_prefix": [site.url],
+        "content_tags": ['h1', 'h2', 'h3', 'p', 'pre', 'code', 'li', 'dt', 'dd'],
+        "exclude_selectors": [{'name': 'div', 'attrs': {'class': 'sphinxsidebar'}}],
+    }
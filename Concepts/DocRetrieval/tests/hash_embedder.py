@@ -0,0 +1,37 @@
+"""
+Model-free stand-ins for the ingest tests: a whitespace chunker in the shape of
+the CHUNKERS modules, and an Embedder whose vectors are derived from a hash of
+the text instead of a forward pass. Everything else (id, manifest) is the real Embedder's.
+"""
+
+import hashlib
+import numpy as np
+from embedder import Embedder
+
+CHUNKER_ID = "words-v1"
+DIM = 16
+
+
+def chunk_words(text, words=8):
+    tokens = text.split()
+    return [" ".join(tokens[i:i + words]) for i in range(0, len(tokens), words)]
+
+
+class HashEmbedder(Embedder):
+    """Fails with RuntimeError on call number `fail_on` of embed_texts, standing in for a crash mid-ingest."""
+
+    def __init__(self, *args, fail_on=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_on = fail_on
+        self.calls = 0
+
+    def embed_texts(self, texts, **batching):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise RuntimeError("embedding worker killed")
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+            vector = np.random.default_rng(seed).standard_normal(DIM).astype("float32")
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.stack(vectors)
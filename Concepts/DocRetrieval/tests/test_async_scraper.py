@@ -0,0 +1,135 @@
+"""
+async_scraper.crawl against the fixture site in tests/site, served locally: it must
+produce what the sequential scraper.bfs_scrape produces while keeping to the
+per-host concurrency and rate limits. A re-crawl through the HTTP cache must report
+every page unchanged.
+"""
+
+import asyncio
+import gc
+import json
+import os
+import types
+import httpx
+import async_scraper
+import scraper
+
+# index, arrays and the five routines pages; stub.html is fetched but too short to keep
+PAGES = 7
+FETCHED = 9  # plus stub.html and the broken link to routines/missing.html
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def crawl(site_config, out_path, **kwargs):
+    return asyncio.run(async_scraper.crawl(site_config, str(out_path), use_cache=False, **kwargs))
+
+
+def test_crawl_matches_bfs_scrape(site, site_config, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scraper, "time", types.SimpleNamespace(sleep=lambda seconds: None))
+    expected = scraper.bfs_scrape(site_config)
+
+    result = crawl(site_config, tmp_path / "out.jsonl", concurrency=4, rate=100)
+    pages = read_jsonl(tmp_path / "out.jsonl")
+    assert result == {"pages": PAGES, "visited": FETCHED}
+    assert len(expected) == PAGES
+    # Workers finish pages out of order; the set of pages and their content must be the same.
+    assert sorted(pages, key=lambda page: page["url"]) == sorted(expected, key=lambda page: page["url"])
+
+
+def test_crawl_keeps_to_the_host_concurrency(site, site_config, tmp_path):
+    site.delay = 0.2
+    crawl(site_config, tmp_path / "out.jsonl", concurrency=2, rate=1000)
+    assert site.max_in_flight == 2
+    assert len(site.starts) == FETCHED
+
+
+def test_crawl_keeps_to_the_host_rate(site, site_config, tmp_path):
+    rate = 20
+    crawl(site_config, tmp_path / "out.jsonl", concurrency=8, rate=rate)
+    starts = sorted(site.starts)
+    assert len(starts) == FETCHED
+    # Request starts are spaced 1 / rate apart, give or take scheduling jitter.
+    assert starts[-1] - starts[0] >= (FETCHED - 1) / rate * 0.9
+
+
+def test_recrawl_reports_unchanged_pages(site, site_config, tmp_path, monkeypatch):
+    monkeypatch.setattr(async_scraper, "cache_path", lambda config: str(tmp_path / "http_cache.sqlite"))
+    out_path = tmp_path / "out.jsonl"
+    manifests = []
+    for _ in range(2):
+        asyncio.run(async_scraper.crawl(site_config, str(out_path), concurrency=4, rate=1000))
+        with open(async_scraper.manifest_path(str(out_path))) as f:
+            manifests.append(json.load(f))
+
+    first, second = manifests
+    assert first["complete"] and second["complete"]
+    assert len(first["added"]) == PAGES
+    assert (first["changed"], first["removed"], first["unchanged"]) == ([], [], 0)
+    # The second crawl is answered from the cache: every page is unchanged and the output is the same.
+    assert (second["added"], second["changed"], second["removed"]) == ([], [], [])
+    assert second["unchanged"] == PAGES
+    assert sorted(page["url"] for page in read_jsonl(out_path)) == sorted(first["added"])
+
+
+def test_retry_after_is_capped(monkeypatch):
+    responses = iter([httpx.Response(429, headers={"Retry-After": "86400"}), httpx.Response(200, text="ok")])
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    async def fetch():
+        transport = httpx.MockTransport(lambda request: next(responses))
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await async_scraper.fetch_page(client, async_scraper.HostLimiter(1, None), "http://docs.test/")
+
+    monkeypatch.setattr(async_scraper.asyncio, "sleep", sleep)
+    response = asyncio.run(fetch())
+    assert response.status_code == 200
+    assert sleeps == [async_scraper.MAX_RETRY_AFTER]
+
+
+def test_interrupted_crawl_resumes_from_its_checkpoint(site, site_config, tmp_path, monkeypatch):
+    monkeypatch.setattr(async_scraper, "CHECKPOINT_PAGES", 2)
+    expected = crawl(site_config, tmp_path / "clean.jsonl", concurrency=1, rate=1000)
+    out_path = tmp_path / "out.jsonl"
+    site.starts.clear()
+    site.delay = 0.05
+
+    async def interrupted():
+        task = asyncio.create_task(async_scraper.crawl(site_config, str(out_path), concurrency=1, rate=1000,
+                                                       use_cache=False))
+        while len(site.starts) < 5:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(interrupted())
+    # Drops the interrupted crawl's connections, and with them its uncommitted pages, as a killed process would.
+    gc.collect()
+    assert os.path.exists(async_scraper.frontier_path(str(out_path)))
+    site.starts.clear()
+
+    result = crawl(site_config, out_path, concurrency=1, rate=1000)
+    assert result == expected
+    # Only the pages after the last checkpoint were fetched again, and none is written twice.
+    assert len(site.starts) < FETCHED
+    assert sorted(page["url"] for page in read_jsonl(out_path)) == \
+        sorted(page["url"] for page in read_jsonl(tmp_path / "clean.jsonl"))
+    assert not os.path.exists(async_scraper.frontier_path(str(out_path)))
+
+
+def test_bloom_filter_crawl_matches_the_database_dedup(site, site_config, tmp_path):
+    expected = crawl(site_config, tmp_path / "clean.jsonl", concurrency=4, rate=1000)
+    site.starts.clear()
+    result = crawl(site_config, tmp_path / "bloom.jsonl", concurrency=4, rate=1000, bloom_capacity=100)
+    assert result == expected
+    # Every page is fetched once: links seen before are rejected by the filter.
+    assert len(site.starts) == FETCHED
+    assert sorted(read_jsonl(tmp_path / "bloom.jsonl"), key=lambda page: page["url"]) == \
+        sorted(read_jsonl(tmp_path / "clean.jsonl"), key=lambda page: page["url"])
@@ -0,0 +1,32 @@
+"""
+crawl_frontier.Frontier deduplicates equivalent URLs, with or without the Bloom filter
+in front of the database, and keeps that state across a reopen.
+"""
+
+import pytest
+from crawl_frontier import BloomFilter, Frontier
+
+VARIANTS = ["HTTP://Docs.Test:80/a%7e/#top", "http://docs.test/a~/", "http://docs.test/a%7E/"]
+
+
+@pytest.mark.parametrize("bloom_capacity", [None, 100])
+def test_equivalent_urls_are_queued_once(tmp_path, bloom_capacity):
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"), bloom_capacity)
+    assert [frontier.add(url) for url in VARIANTS] == [True, False, False]
+    assert frontier.add("http://docs.test/b") is True
+    assert len(frontier) == 2
+    frontier.checkpoint(0)
+    frontier.close()
+
+    # A reopened frontier (a resumed crawl) refills the filter from the database.
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"), bloom_capacity)
+    assert frontier.add("http://docs.test/b") is False
+    assert [frontier.pop(), frontier.pop(), frontier.pop()] == ["http://docs.test/a~/", "http://docs.test/b", None]
+    frontier.close()
+
+
+def test_bloom_filter_rejects_repeats_without_false_negatives():
+    bloom = BloomFilter(1000)
+    urls = [f"http://docs.test/page/{i}" for i in range(1000)]
+    assert all(bloom.add(url) for url in urls)
+    assert not any(bloom.add(url) for url in urls)
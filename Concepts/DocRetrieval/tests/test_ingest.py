@@ -0,0 +1,64 @@
+"""
+ingest.IngestPipeline interrupted partway through and resumed from its checkpoint
+must build the same index and metadata store as an uninterrupted run.
+"""
+
+import json
+import os
+import faiss
+import pytest
+import ingest
+from hash_embedder import HashEmbedder
+from metadata_store import STORE_DIRNAME, open_metadata_store
+
+LIBRARY = "Numpy"
+DOCS = [{"url": f"https://numpy.org/doc/{n}", "content": " ".join(f"word{n}_{i}" for i in range(4 + 5 * (n % 4)))}
+        for n in range(30)]
+
+
+@pytest.fixture(autouse=True)
+def word_chunker(monkeypatch):
+    monkeypatch.setitem(ingest.CHUNKERS, "words", ("hash_embedder", "chunk_words", "mean", "ip"))
+    monkeypatch.setattr(ingest, "DOC_BATCH", 7)
+
+
+def pipeline(data_dir, fail_on=None):
+    """An IngestPipeline over DOCS in `data_dir` with its own embedding cache; small shards give several checkpoints."""
+    ingest.EMBED_CACHE_PATH = os.path.join(data_dir, "embedding_cache.sqlite")
+    lib_dir = os.path.join(data_dir, ingest.LIB_PATH[LIBRARY])
+    os.makedirs(lib_dir, exist_ok=True)
+    with open(os.path.join(lib_dir, "scraped_docs.jsonl"), "w") as f:
+        f.writelines(json.dumps(doc) + "\n" for doc in DOCS)
+    ingest_pipeline = ingest.IngestPipeline(LIBRARY, "words", shard_chunks=5, data_dir=str(data_dir))
+    ingest_pipeline.embedder = HashEmbedder(ingest_pipeline.embedder.model_name, pooling="mean", fail_on=fail_on)
+    return ingest_pipeline
+
+
+def built(data_dir):
+    lib_dir = os.path.join(data_dir, ingest.LIB_PATH[LIBRARY])
+    index = faiss.read_index(os.path.join(lib_dir, "faiss_index.bin"))
+    return index.reconstruct_n(0, index.ntotal), list(open_metadata_store(os.path.join(lib_dir, STORE_DIRNAME)))
+
+
+def test_resumed_ingest_matches_a_clean_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "EMBED_CACHE_PATH", ingest.EMBED_CACHE_PATH)
+    clean = pipeline(tmp_path / "clean")
+    clean.ingest()
+    clean.finalize()
+
+    interrupted = pipeline(tmp_path / "resumed", fail_on=4)
+    with pytest.raises(RuntimeError):
+        interrupted.ingest()
+    with open(interrupted.checkpoint_path) as f:
+        checkpoint = json.load(f)
+    assert 0 < checkpoint["docs"] < len(DOCS) and not checkpoint["done"]
+
+    resumed = pipeline(tmp_path / "resumed")
+    assert resumed.ingest()["docs"] == len(DOCS)
+    resumed.finalize()
+
+    clean_vectors, clean_rows = built(tmp_path / "clean")
+    resumed_vectors, resumed_rows = built(tmp_path / "resumed")
+    assert resumed_rows == clean_rows
+    assert (resumed_vectors == clean_vectors).all()
+    assert {row["doc_id"] for row in clean_rows} == set(range(len(DOCS)))